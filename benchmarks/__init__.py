@@ -0,0 +1,6 @@
+"""
+Throughput benchmarks against the `tests` app models
+
+    python -m benchmarks --scale 10000 --output bench.json
+    python -m benchmarks --compare before.json after.json
+"""
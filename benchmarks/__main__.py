@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {result['name']: result for result in json.load(f)['results']}
+    with open(after_path) as f:
+        after = {result['name']: result for result in json.load(f)['results']}
+    print('{:<24} {:>12} {:>12} {:>9} {:>10}'.format('scenario', 'before (s)', 'after (s)', 'change', 'queries'))
+    for name, result in after.items():
+        if name not in before:
+            continue
+        old, new = before[name]['seconds'], result['seconds']
+        change = '{:+.1%}'.format((new - old) / old) if old else '-'
+        queries = '{:+d}'.format(result['queries'] - before[name]['queries'])
+        print('{:<24} {:>12.3f} {:>12.3f} {:>9} {:>10}'.format(name, old, new, change, queries))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('--scale', type=int, default=10000, help='number of order items to generate (10k to 10M)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', type=int, default=1000, help='rows used by the per-row scenarios')
+    parser.add_argument('--scenarios', nargs='*', help='only run these scenarios (data is always generated)')
+    parser.add_argument('--database', help='sqlite file to run in, defaults to an in-memory database')
+    parser.add_argument('--no-trace-memory', dest='trace_memory', action='store_false',
+                        help='skip tracemalloc, peak memory is not reported but timings are not slowed down by it')
+    parser.add_argument('--output', help='write the results as json here')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files and exit')
+    options = parser.parse_args(argv)
+
+    if options.compare:
+        compare(*options.compare)
+        return
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+    import django
+    from django.conf import settings
+    django.setup()
+    from django.db import connection
+    from . import scenarios
+
+    if options.database:
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = options.database
+    old_name = settings.DATABASES['default']['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        results = scenarios.run(options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = {
+        'commit': _git_commit(),
+        'scale': options.scale,
+        'seed': options.seed,
+        'sample': options.sample,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'vendor': connection.vendor,
+        'results': results,
+    }
+    for result in results:
+        print('{name:<24} {seconds:>10.3f}s {queries:>9} queries {rows:>10} rows'.format(**result), file=sys.stderr)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Deterministic synthetic business data, the same seed and scale always produce the same rows
+"""
+import datetime
+import random
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from tests import models
+
+START = datetime.datetime(2018, 1, 1, tzinfo=timezone.utc)
+DAYS = 365
+
+
+def _chunks(make, count, batch_size):
+    batch = []
+    for i in range(count):
+        batch.append(make(i))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def sizes(scale):
+    """
+    `scale` is the number of order items, everything else is proportional to it
+    """
+    return {
+        'customers': max(1, scale // 50),
+        'products': max(1, scale // 100),
+        'orders': max(1, scale // 3),
+        'order_items': scale,
+    }
+
+
+def generate(scale, seed=0, batch_size=5000):
+    """
+    Bulk creates customers, products, orders and order items into an empty database (no signals are sent).
+    Returns the number of rows created per model.
+    """
+    rand = random.Random(seed)
+    counts = sizes(scale)
+
+    def _customer(i):
+        return models.TestCustomer(email='customer{}@example.com'.format(i), name='Customer {}'.format(i))
+
+    def _product(i):
+        return models.TestProduct(name='Product {}'.format(i), price=Decimal(rand.randint(100, 10000)) / 100)
+
+    with transaction.atomic():
+        for batch in _chunks(_customer, counts['customers'], batch_size):
+            models.TestCustomer.objects.bulk_create(batch)
+        for batch in _chunks(_product, counts['products'], batch_size):
+            models.TestProduct.objects.bulk_create(batch)
+
+    customer_ids = list(models.TestCustomer.objects.order_by('pk').values_list('pk', flat=True))
+    products = list(models.TestProduct.objects.order_by('pk').values_list('pk', 'price'))
+
+    def _order(i):
+        ordered_on = START + datetime.timedelta(minutes=rand.randint(0, DAYS * 24 * 60))
+        total = Decimal(rand.randint(100, 50000)) / 100
+        return models.TestOrder(customer_id=rand.choice(customer_ids), ordered_on=ordered_on, total=total, cancelled=rand.random() < 0.05)
+
+    with transaction.atomic():
+        for batch in _chunks(_order, counts['orders'], batch_size):
+            models.TestOrder.objects.bulk_create(batch)
+
+    order_ids = list(models.TestOrder.objects.order_by('pk').values_list('pk', flat=True))
+
+    def _order_item(i):
+        # every order gets at least one item, the rest are spread randomly
+        order_id = order_ids[i] if i < len(order_ids) else rand.choice(order_ids)
+        product_id, price = rand.choice(products)
+        quantity = rand.randint(1, 5)
+        return models.TestOrderItem(order_id=order_id, product_id=product_id, quantity=quantity, total=price * quantity)
+
+    with transaction.atomic():
+        for batch in _chunks(_order_item, counts['order_items'], batch_size):
+            models.TestOrderItem.objects.bulk_create(batch)
+    return counts
+
+
+def date_range():
+    """
+    Dates the DateDimension has to cover for the generated data (`created_on` is always now)
+    """
+    today = timezone.localdate()
+    start = min(START.date(), today) - datetime.timedelta(days=1)
+    end = max((START + datetime.timedelta(days=DAYS)).date(), today) + datetime.timedelta(days=1)
+    return start, end
@@ -0,0 +1,150 @@
+"""
+Timed scenarios, they run in order against the same database and build on each other
+"""
+import csv
+import io
+import time
+import tracemalloc
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from opinionated_reporting import models as opr_models
+from opinionated_reporting import exports, reports, signals, stats
+from tests import models
+from . import generator
+
+
+@contextmanager
+def measure(trace_memory=True):
+    """
+    Yields a dict that is filled in with seconds, queries and peak_memory when the block exits
+    """
+    result = {}
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with stats.count_queries() as counted:
+            yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+        result['queries'] = counted['queries']
+        if trace_memory:
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def generate_data(options):
+    return generator.generate(options.scale, seed=options.seed)['order_items']
+
+
+def seed_dimensions(options):
+    with transaction.atomic():
+        opr_models.HourDimension.init_dimension()
+        opr_models.DateDimension.init_dimension_by_range(*generator.date_range())
+        models.CustomerDimension.init_dimension()
+        models.ProductDimension.init_dimension()
+    customers = models.CustomerDimension.record_update_many(models.TestCustomer.objects.iterator(), force=True)
+    products = models.ProductDimension.record_update_many(models.TestProduct.objects.iterator(), force=True)
+    return len(customers) + len(products)
+
+
+def record_update_single(options):
+    items = models.TestOrderItem.objects.order_by('pk')[:options.sample]
+    count = 0
+    for item in items:
+        models.OrderedProductFact.record_update(item)
+        count += 1
+    return count
+
+
+def record_update_bulk(options):
+    items = models.TestOrderItem.objects.select_related('order', 'order__customer', 'product').order_by('pk')
+    facts = models.OrderedProductFact.record_update_many(items.iterator(), force=True)
+    orders = models.TestOrder.objects.select_related('customer').order_by('pk')
+    facts += models.OrderedFact.record_update_many(orders.iterator(), force=True)
+    return len(facts)
+
+
+def signal_overhead(options):
+    """
+    Saves the same orders with and without the reporting signal, `seconds` is the overhead only
+    """
+    orders = list(models.TestOrder.objects.order_by('pk')[:options.sample])
+    start = time.perf_counter()
+    for order in orders:
+        order.save()
+    without = time.perf_counter() - start
+    post_save.connect(signals.dirty_reporting_on_save, sender=models.TestOrder)
+    try:
+        start = time.perf_counter()
+        for order in orders:
+            order.save()
+        with_signals = time.perf_counter() - start
+    finally:
+        post_save.disconnect(signals.dirty_reporting_on_save, sender=models.TestOrder)
+    return len(orders), {'seconds_without_signals': without, 'seconds_with_signals': with_signals,
+                         'overhead_per_save': (with_signals - without) / max(1, len(orders))}
+
+
+def drain_dirty(options):
+    models.OrderedProductFact._default_manager.update(_is_dirty=True)
+    return models.OrderedProductFact.refresh_dirty()
+
+
+def report_aggregate(options):
+    by_customer = list(models.OrderedProductFact.objects.values('customer__name').annotate(total=Sum('total'), quantity=Sum('quantity')))
+    by_month = list(models.OrderedProductFact.objects.values('ordered_on__month_format').annotate(total=Sum('total')))
+    return len(by_customer) + len(by_month)
+
+
+def report_export(options):
+    meta = models.OrderedProductFact.ReportingMeta
+    facts = models.OrderedProductFact.objects.select_related(
+        'product', 'customer', 'created_on', 'hour_created_on', 'ordered_on', 'hour_ordered_on').order_by('pk')
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(meta.header_description)
+    count = 0
+    for fact in facts.iterator():
+        writer.writerow(meta.row_description(fact))
+        count += 1
+    return count
+
+
+def report_export_tuples(options):
+    return reports.write_csv(models.OrderedProductFact, io.StringIO())
+
+
+def report_export_memory_join(options):
+    return exports.FactExporter(models.OrderedProductFact).write_csv(io.StringIO())
+
+
+SCENARIOS = [
+    ('generate_data', generate_data),
+    ('seed_dimensions', seed_dimensions),
+    ('record_update_single', record_update_single),
+    ('record_update_bulk', record_update_bulk),
+    ('signal_overhead', signal_overhead),
+    ('drain_dirty', drain_dirty),
+    ('report_aggregate', report_aggregate),
+    ('report_export', report_export),
+    ('report_export_tuples', report_export_tuples),
+    ('report_export_memory_join', report_export_memory_join),
+]
+
+
+def run(options):
+    results = []
+    for name, scenario in SCENARIOS:
+        if options.scenarios and name not in options.scenarios and name != 'generate_data':
+            continue
+        with measure(trace_memory=options.trace_memory) as result:
+            returned = scenario(options)
+        rows, extra = returned if isinstance(returned, tuple) else (returned, {})
+        result.update(extra)
+        result.update({'name': name, 'rows': rows})
+        result['rows_per_second'] = rows / result['seconds'] if result['seconds'] else None
+        results.append(result)
+    return results
@@ -0,0 +1,139 @@
+"""
+Refreshing facts from asyncio code without blocking the event loop
+
+    await OrderedFact.arecord_update(order)
+    await OrderedFact.amark_dirty(order)
+
+ORM work runs on a bounded pool of threads. Requests for the same fact that arrive while
+one is still queued are coalesced into it, and when the queue is full `QueueFull` is raised
+right away, so a request handler can fall back to `amark_dirty` (or drop the refresh) instead of waiting.
+
+    OPINIONATED_REPORTING_ASYNC_WORKERS = 4  # threads
+    OPINIONATED_REPORTING_ASYNC_QUEUE = 1000  # jobs queued or running before QueueFull
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+
+_lock = threading.Lock()
+_executor = None
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job(object):
+
+    def __init__(self, fn, args, lock):
+        self.fn = fn
+        self.args = args
+        self.lock = lock
+        self.started = False
+        self.future = None
+
+    def run(self):
+        with self.lock:
+            self.started = True  # from now on, new requests need a run of their own
+            args = self.args
+        try:
+            return self.fn(*args)
+        finally:
+            close_old_connections()
+
+
+class RefreshExecutor(object):
+    """
+    A thread pool for ORM work, with at most `max_pending` jobs queued or running
+    """
+
+    def __init__(self, max_workers=4, max_pending=1000):
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='opinionated-reporting')
+
+    async def submit(self, key, fn, *args, merge=None):
+        """
+        Runs `fn(*args)` on the pool. While a job with the same `key` is queued and hasn't started,
+        it is joined instead, with its arguments replaced by these (newer) ones, or by
+        `merge(queued args, these args)`.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            job = self._jobs.get(key) if key is not None else None
+            if job is not None and not job.started:
+                job.args = merge(job.args, args) if merge is not None else args
+            else:
+                if self.pending >= self.max_pending:
+                    raise QueueFull('{} refreshes are already queued'.format(self.pending))
+                job = Job(fn, args, self._lock)
+                job.future = loop.run_in_executor(self._pool, job.run)
+                job.future.add_done_callback(lambda future, key=key, job=job: self._done(key, job))
+                self.pending += 1
+                if key is not None:
+                    self._jobs[key] = job
+        return await asyncio.shield(job.future)
+
+    def _done(self, key, job):
+        with self._lock:
+            self.pending -= 1
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = RefreshExecutor(
+                max_workers=getattr(settings, 'OPINIONATED_REPORTING_ASYNC_WORKERS', 4),
+                max_pending=getattr(settings, 'OPINIONATED_REPORTING_ASYNC_QUEUE', 1000))
+        return _executor
+
+
+def set_executor(executor):
+    """
+    Swaps the shared executor, e.g. for one with a single thread in tests. Returns the previous one.
+    """
+    global _executor
+    with _lock:
+        previous, _executor = _executor, executor
+        return previous
+
+
+def _key(model, operation, unique_id):
+    return (model._meta.label, operation, unique_id)
+
+
+def _merge_record_update(queued, args):
+    # the newer instance, forced if either request was
+    (instance, force), (queued_instance, queued_force) = args, queued
+    return instance, force or queued_force
+
+
+async def arecord_update(model, instance, force=False):
+    key = _key(model, 'record_update', model.get_reporting_fact_id(instance))
+    return await get_executor().submit(key, model.record_update, instance, force, merge=_merge_record_update)
+
+
+def _record_update_latest(model, instances, force, batch_size):
+    # within the batch the last instance of each fact wins. On the pool, `instances` may be a queryset.
+    latest = {model.get_reporting_fact_id(instance): instance for instance in instances}
+    return model.record_update_many(list(latest.values()), force, batch_size)
+
+
+async def arecord_update_many(model, instances, force=False, batch_size=500):
+    # the batch is one job
+    return await get_executor().submit(None, _record_update_latest, model, instances, force, batch_size)
+
+
+async def amark_dirty(model, instance):
+    key = _key(model, 'mark_dirty', model.get_reporting_fact_id(instance))
+    return await get_executor().submit(key, model.mark_dirty, instance)
@@ -0,0 +1,118 @@
+"""
+Bitmap indexes over the low cardinality attributes of a cube's dimensions
+
+Every attribute value maps to a python int whose bit N is set when the fact at
+cube position N has that value, so AND/OR filter combinations are bitwise ops.
+"""
+from .cube import FactCube, NULL_CODE, assert_numpy, np
+
+
+def bits_from_mask(mask):
+    """
+    Pack a boolean array into a python int, bit N is mask[N]
+    """
+    if not len(mask):
+        return 0
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def mask_from_bits(bits, length):
+    """
+    Unpack a python int back into a boolean array for the cube
+    """
+    data = np.frombuffer(bits.to_bytes((length + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(data, bitorder='little', count=length).astype(bool)
+
+
+class BitmapIndex(object):
+    """
+    Usage:
+        weekday = BitmapIndex(cube, 'created_on', 'day_of_week')
+        quarter = BitmapIndex(cube, 'created_on', 'quarter_format')
+        bits = weekday.get(DateDimension.DAY_SATURDAY) & quarter.get('Q4 18')
+        cube.group_by('customer', measure='total', mask=cube_mask(cube, bits))
+
+    Attach it to a cube and `cube.refresh()` only rewrites the bits of the facts that changed.
+    An index keyed by an attribute is rebuilt whole when the dimension's rows changed, since
+    renaming a customer moves facts between values without the facts changing.
+    """
+
+    def __init__(self, cube, field_name, attribute=None):
+        assert_numpy()
+        assert isinstance(cube, FactCube), "{} is not a FactCube".format(cube)
+        self.cube = cube
+        self.field_name = field_name
+        self.attribute = attribute
+        self.bitmaps = {}
+        cube.indexes.append(self)
+        self.build()
+
+    def __contains__(self, value):
+        return value in self.bitmaps
+
+    def values(self):
+        return list(self.bitmaps.keys())
+
+    def _groups(self):
+        """
+        The value of every dimension row, and the row (code) of every fact
+        """
+        lookup = self.cube.lookup(self.field_name)
+        if self.attribute:
+            keys = lookup.columns[self.attribute].tolist()
+        else:
+            keys = lookup.pks.tolist()
+        return keys, self.cube.codes[self.field_name]
+
+    def is_stale(self, changed_lookups):
+        return self.attribute is not None and self.cube.lookup(self.field_name).model in changed_lookups
+
+    def build(self):
+        self.bitmaps = {}
+        self._set(np.arange(len(self.cube.pks)))
+        return self
+
+    def update(self, positions):
+        """
+        Clear then re-set the bits for only the given cube positions
+        """
+        if not len(positions):
+            return self
+        length = len(self.cube.pks)
+        changed = np.zeros(length, dtype=bool)
+        changed[positions] = True
+        clear = ~bits_from_mask(changed)
+        for key in list(self.bitmaps.keys()):
+            self.bitmaps[key] &= clear
+            if not self.bitmaps[key]:
+                del self.bitmaps[key]
+
+        self._set(np.asarray(positions))
+        return self
+
+    def _set(self, positions):
+        keys, codes = self._groups()
+        length = len(self.cube.pks)
+        positions = positions[self.cube.alive[positions] & (codes[positions] != NULL_CODE)]
+        for code in np.unique(codes[positions]).tolist():
+            mask = np.zeros(length, dtype=bool)
+            mask[positions[codes[positions] == code]] = True
+            key = keys[code]
+            self.bitmaps[key] = self.bitmaps.get(key, 0) | bits_from_mask(mask)
+
+    def get(self, value):
+        return self.bitmaps.get(value, 0)
+
+    def any_of(self, values):
+        bits = 0
+        for value in values:
+            bits |= self.get(value)
+        return bits
+
+
+def cube_mask(cube, bits):
+    return mask_from_bits(bits, len(cube.pks)) & cube.alive
+
+
+def count(bits):
+    return bin(bits).count('1')
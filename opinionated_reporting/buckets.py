@@ -0,0 +1,76 @@
+"""
+Local date and hour of a whole column of aware datetimes at once, for batch refreshes.
+
+Instead of `astimezone()` per value, the UTC offsets of the timezone are looked up from pytz's
+transition table for the range the column covers, and every value is shifted by its offset in one
+pass (with numpy when it is installed). The results are the same as `get_date_from_datetime`
+and `get_time_from`, DST transitions included.
+"""
+import bisect
+import datetime
+import pytz
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_UTC = pytz.utc.localize(EPOCH)
+EPOCH_ORDINAL = EPOCH.toordinal()
+BEFORE_ALL = -2 ** 62  # epoch seconds before any transition
+
+
+def epoch_seconds(value):
+    """
+    Whole seconds since the epoch of an aware (or naive UTC) datetime, floored like its local hour would be
+    """
+    delta = value - (EPOCH if value.tzinfo is None else EPOCH_UTC)
+    return delta.days * 86400 + delta.seconds
+
+
+def transition_table(tz, start, end):
+    """
+    (starts, offsets): from `starts[i]` (epoch seconds) the offset from UTC is `offsets[i]` seconds,
+    covering `start` to `end` (epoch seconds). None when `tz` isn't a pytz timezone.
+    """
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if transitions:
+        start_dt = EPOCH + datetime.timedelta(seconds=start)
+        end_dt = EPOCH + datetime.timedelta(seconds=end)
+        first = max(bisect.bisect_right(transitions, start_dt) - 1, 0)
+        last = bisect.bisect_right(transitions, end_dt)
+        starts = [BEFORE_ALL] + [epoch_seconds(when) for when in transitions[first + 1:last]]
+        offsets = [int(info[0].total_seconds()) for info in tz._transition_info[first:last]]
+        return starts, offsets
+    elif isinstance(tz, pytz.tzinfo.StaticTzInfo) or tz is pytz.utc:
+        return [BEFORE_ALL], [int(tz.utcoffset(EPOCH).total_seconds())]
+    return None
+
+
+def local_buckets(values, tz):
+    """
+    The local dates and hours of a list of aware datetimes in `tz`
+    """
+    if not values:
+        return [], []
+    seconds = [epoch_seconds(value) for value in values]
+    table = transition_table(tz, min(seconds), max(seconds))
+    if table is None:
+        local = [value.astimezone(tz) for value in values]
+        return [value.date() for value in local], [value.hour for value in local]
+    starts, offsets = table
+
+    if np is not None:
+        seconds = np.array(seconds, dtype=np.int64)
+        local = seconds + np.array(offsets, dtype=np.int64)[np.searchsorted(np.array(starts, dtype=np.int64), seconds, side='right') - 1]
+        days, remainder = np.divmod(local, 86400)
+        return [datetime.date.fromordinal(EPOCH_ORDINAL + day) for day in days.tolist()], (remainder // 3600).tolist()
+
+    dates, hours = [], []
+    for second in seconds:
+        local = second + offsets[bisect.bisect_right(starts, second) - 1]
+        day, remainder = divmod(local, 86400)
+        dates.append(datetime.date.fromordinal(EPOCH_ORDINAL + day))
+        hours.append(remainder // 3600)
+    return dates, hours
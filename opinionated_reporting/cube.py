@@ -0,0 +1,307 @@
+"""
+An in-process, column oriented copy of a fact table
+
+Dimension foreign keys are stored as int32 codes into small dimension
+lookup tables that are loaded alongside, measures as int64/float64 arrays.
+Report variants (filter, group by, aggregate) then run as numpy operations
+instead of hitting the database.
+"""
+from django.db import models
+from . import fields
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the cube
+    np = None
+
+
+NULL_CODE = -1
+
+
+def assert_numpy():
+    if np is None:
+        raise Exception('numpy is required to build an in-memory cube, `pip install numpy`')
+
+
+def column_from_values(field, values):
+    """
+    Turn a list of python values for a model field into a numpy array
+    """
+    if isinstance(field, (models.DecimalField, models.FloatField, fields.ScaledDecimalField)):
+        return np.array([float('nan') if v is None else float(v) for v in values], dtype=np.float64)
+    elif isinstance(field, (models.IntegerField, models.BooleanField, models.AutoField)):
+        return np.array([0 if v is None else int(v) for v in values], dtype=np.int64)
+    elif isinstance(field, models.DateField) and not isinstance(field, models.DateTimeField):
+        return np.array(values, dtype='datetime64[D]')
+    return np.array(['' if v is None else str(v) for v in values], dtype=str)
+
+
+def writable(array):
+    """
+    Arrays mapped read only from a snapshot are copied before they're changed
+    """
+    return array if array.flags.writeable else np.array(array)
+
+
+def is_measure(field):
+    return isinstance(field, (models.DecimalField, models.FloatField, models.IntegerField)) and not field.primary_key
+
+
+class DimensionLookup(object):
+    """
+    A whole dimension table, one array per attribute, rows ordered by pk.
+    The position of a row is its code.
+    """
+
+    def __init__(self, model, attributes=None):
+        assert_numpy()
+        self.model = model
+        if attributes is None:
+            attributes = [field.name for field in model._meta.fields
+                          if not field.primary_key and not field.name.startswith('_') and not field.is_relation]
+        self.attributes = list(attributes)
+        self.pks = np.array([], dtype=np.int64)
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.pks)
+
+    def load(self):
+        rows = list(self.model._default_manager.order_by('pk').values_list('pk', *self.attributes))
+        self.pks = np.array([row[0] for row in rows], dtype=np.int64)
+        self.columns = {}
+        for i, attribute in enumerate(self.attributes, 1):
+            field = self.model._meta.get_field(attribute)
+            self.columns[attribute] = column_from_values(field, [row[i] for row in rows])
+        return self
+
+    def codes_for(self, pks):
+        """
+        Map dimension pks (NULL_CODE for no dimension) onto row codes
+        """
+        pks = np.asarray(pks, dtype=np.int64)
+        if not len(self.pks):
+            return np.full(len(pks), NULL_CODE, dtype=np.int32)
+        codes = np.searchsorted(self.pks, pks)
+        codes = np.minimum(codes, len(self.pks) - 1)
+        found = self.pks[codes] == pks
+        return np.where(found, codes, NULL_CODE).astype(np.int32)
+
+    def factorize(self, attribute):
+        """
+        Returns the distinct values of an attribute, and the group of every dimension row
+        """
+        values, groups = np.unique(self.columns[attribute], return_inverse=True)
+        return values, groups.astype(np.int32)
+
+
+class FactCube(object):
+    """
+    Usage:
+        cube = FactCube(OrderedProductFact, measures=('quantity', 'total')).load()
+        saturdays = cube.mask(created_on__day_of_week=DateDimension.DAY_SATURDAY)
+        cube.group_by('customer', attribute='name', measure='total', mask=saturdays)
+        cube.refresh()  # only re-reads the facts saved since the last load
+    """
+
+    def __init__(self, fact_class, dimensions=None, measures=None):
+        assert_numpy()
+        self.fact_class = fact_class
+        self.dimension_fields = [field for field in fact_class._meta.fields
+                                 if isinstance(field, fields.DimensionForeignKey) and (dimensions is None or field.name in dimensions)]
+        self.measure_fields = [field for field in fact_class._meta.fields
+                               if not field.name.startswith('_') and not field.is_relation and is_measure(field) and
+                               (measures is None or field.name in measures)]
+        # dimensions are shared, i.e. `created_on` and `ordered_on` both use the one DateDimension lookup
+        self.lookups = {}
+        for field in self.dimension_fields:
+            if field.related_model not in self.lookups:
+                self.lookups[field.related_model] = DimensionLookup(field.related_model)
+        self.pks = np.array([], dtype=np.int64)
+        self.alive = np.array([], dtype=bool)
+        self.codes = {field.name: np.array([], dtype=np.int32) for field in self.dimension_fields}
+        self.measures = {field.name: column_from_values(field, []) for field in self.measure_fields}
+        self._positions = None
+        self.loaded_until = None
+        self.indexes = []
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    @property
+    def positions(self):
+        # built lazily, a cube loaded from a snapshot may never need it
+        if self._positions is None:
+            self._positions = {pk: position for position, pk in enumerate(self.pks.tolist())}
+        return self._positions
+
+    def lookup(self, field_name):
+        return self.lookups[self.fact_class._meta.get_field(field_name).related_model]
+
+    def get_queryset(self):
+        return self.fact_class._default_manager.order_by('pk')
+
+    def _read(self, queryset):
+        columns = ['pk', '_updated_on'] + [field.attname for field in self.dimension_fields] + [field.name for field in self.measure_fields]
+        rows = list(queryset.values_list(*columns))
+        for row in rows:
+            if row[1] and (self.loaded_until is None or row[1] > self.loaded_until):
+                self.loaded_until = row[1]
+        offset = 2
+        pks = np.array([row[0] for row in rows], dtype=np.int64)
+        codes = {}
+        for i, field in enumerate(self.dimension_fields, offset):
+            dimension_pks = [NULL_CODE if row[i] is None else row[i] for row in rows]
+            codes[field.name] = self.lookups[field.related_model].codes_for(dimension_pks)
+        offset += len(self.dimension_fields)
+        measures = {}
+        for i, field in enumerate(self.measure_fields, offset):
+            measures[field.name] = column_from_values(field, [row[i] for row in rows])
+        return pks, codes, measures
+
+    def load(self):
+        for lookup in self.lookups.values():
+            lookup.load()
+        self.loaded_until = None
+        self.pks, self.codes, self.measures = self._read(self.get_queryset())
+        self.alive = np.ones(len(self.pks), dtype=bool)
+        self._positions = None
+        for index in self.indexes:
+            index.build()
+        return self
+
+    def refresh(self):
+        """
+        Re-read only the facts saved since the last load, and drop the facts that have been removed.
+        Row positions never move, removed facts are masked out, so indexes over positions stay valid.
+        Returns the positions that changed.
+        """
+        if self.loaded_until is None:
+            self.load()
+            return np.arange(len(self.pks))
+        remapped, changed_lookups = self._reload_lookups()
+
+        current = np.array(list(self.get_queryset().values_list('pk', flat=True)), dtype=np.int64)
+        removed = np.flatnonzero(self.alive & ~np.isin(self.pks, current))
+        self.alive = writable(self.alive)
+        self.alive[removed] = False
+
+        pks, codes, measures = self._read(self.get_queryset().filter(_updated_on__gte=self.loaded_until))
+        existing = np.array([self.positions.get(pk, NULL_CODE) for pk in pks.tolist()], dtype=np.int64)
+        is_new = existing == NULL_CODE
+        updated = existing[~is_new]
+        for name in self.codes:
+            self.codes[name] = writable(self.codes[name])
+            self.codes[name][updated] = codes[name][~is_new]
+            self.codes[name] = np.concatenate([self.codes[name], codes[name][is_new]])
+        for name in self.measures:
+            self.measures[name] = writable(self.measures[name])
+            self.measures[name][updated] = measures[name][~is_new]
+            self.measures[name] = np.concatenate([self.measures[name], measures[name][is_new]])
+        self.alive[updated] = True
+        start = len(self.pks)
+        self.pks = np.concatenate([self.pks, pks[is_new]])
+        self.alive = np.concatenate([self.alive, np.ones(int(is_new.sum()), dtype=bool)])
+        added = np.arange(start, len(self.pks))
+        for position, pk in zip(added.tolist(), self.pks[start:].tolist()):
+            self.positions[pk] = position
+
+        changed = np.unique(np.concatenate([removed, updated, added, remapped]))
+        for index in self.indexes:
+            if index.is_stale(changed_lookups):
+                index.build()
+            else:
+                index.update(changed)
+        return changed
+
+    def _reload_lookups(self):
+        """
+        Reloads the dimensions. Codes are positions in the pk ordered rows, so when rows were deleted (or a pk
+        came in below the last one) the codes of every fact on that dimension are moved to the rows' new positions.
+        Returns the positions of the facts whose codes moved, and the dimension models whose rows changed.
+        """
+        remapped = np.array([], dtype=np.int64)
+        changed_lookups = set()
+        for model, lookup in self.lookups.items():
+            old_pks, old_columns = lookup.pks, lookup.columns
+            lookup.load()
+            if not np.array_equal(lookup.pks, old_pks) or any(
+                    not np.array_equal(column, old_columns.get(attribute)) for attribute, column in lookup.columns.items()):
+                changed_lookups.add(model)
+            if len(lookup.pks) >= len(old_pks) and np.array_equal(lookup.pks[:len(old_pks)], old_pks):
+                continue  # only rows appended, every code still points at the same row
+            for field in self.dimension_fields:
+                if field.related_model is not model:
+                    continue
+                codes = writable(self.codes[field.name])
+                pks = np.where(codes == NULL_CODE, NULL_CODE, old_pks[np.maximum(codes, 0)] if len(old_pks) else NULL_CODE)
+                moved = lookup.codes_for(pks)
+                remapped = np.concatenate([remapped, np.flatnonzero(moved != codes)])
+                self.codes[field.name] = moved
+        return remapped, changed_lookups
+
+    def attribute_codes(self, field_name, attribute):
+        """
+        Group of each fact row on a dimension attribute, NULL_CODE when the fact has no dimension
+        """
+        values, groups = self.lookup(field_name).factorize(attribute)
+        codes = self.codes[field_name]
+        return values, np.where(codes == NULL_CODE, NULL_CODE, groups[codes] if len(groups) else NULL_CODE).astype(np.int32)
+
+    def mask(self, **filters):
+        """
+        Filters look like the ORM, against the dimension pk or a dimension attribute:
+            cube.mask(customer=1, created_on__day_of_week=5, created_on__month_format__in=['Sep 2018'])
+        """
+        mask = self.alive.copy()
+        for key, value in filters.items():
+            parts = key.split('__')
+            many = parts[-1] == 'in'
+            if many:
+                parts = parts[:-1]
+            wanted = list(value) if many else [value]
+            if len(parts) == 1:
+                codes = self.codes[parts[0]]
+                wanted_codes = self.lookup(parts[0]).codes_for([NULL_CODE if v is None else getattr(v, 'pk', v) for v in wanted])
+                mask &= np.isin(codes, wanted_codes[wanted_codes != NULL_CODE])
+            elif len(parts) == 2:
+                lookup = self.lookup(parts[0])
+                column = lookup.columns[parts[1]]
+                if column.dtype.kind in 'US':  # a fixed width would cut a longer value down to a stored prefix
+                    matching = np.isin(column.astype(object), np.array(wanted, dtype=object))
+                else:
+                    matching = np.isin(column, np.array(wanted, dtype=column.dtype))
+                codes = self.codes[parts[0]]
+                mask &= np.where(codes == NULL_CODE, False, matching[codes] if len(matching) else False)
+            else:
+                raise Exception('Cannot filter a cube on {}'.format(key))
+        return mask
+
+    def group_by(self, field_name, attribute=None, measure=None, mask=None, aggregate='sum'):
+        """
+        Returns {dimension pk or attribute value: aggregate}, aggregate is one of sum, count or mean
+        """
+        if attribute:
+            keys, groups = self.attribute_codes(field_name, attribute)
+        else:
+            keys, groups = self.lookup(field_name).pks, self.codes[field_name]
+        selected = self.alive if mask is None else mask & self.alive
+        selected = selected & (groups != NULL_CODE)
+        groups = groups[selected]
+        counts = np.bincount(groups, minlength=len(keys))
+        if aggregate == 'count':
+            totals = counts
+        else:
+            if not measure:
+                raise Exception('`{}` needs a measure'.format(aggregate))
+            totals = np.bincount(groups, weights=self.measures[measure][selected], minlength=len(keys))
+            if aggregate == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    totals = totals / counts
+            elif aggregate != 'sum':
+                raise Exception('Unknown aggregate {}'.format(aggregate))
+        return {key: total for key, total, count in zip(keys.tolist(), totals.tolist(), counts.tolist()) if count}
+
+    def total(self, measure, mask=None):
+        selected = self.alive if mask is None else mask & self.alive
+        return self.measures[measure][selected].sum().item()
@@ -0,0 +1,115 @@
+"""
+Which facts read a business row through a relation, so changing it dirties exactly those facts.
+
+The paths come from `get_row_paths` (fields, string `dimension_aliases`, dimensions and
+`ReportingMeta.related_paths`), lambdas are only followed as far as `related_paths` lists them.
+An OrderedProductFact reading 'order__customer' depends on TestOrder's `customer` through 'order'.
+
+What a fact's dimensions copy from a row is the dimension's, not the fact's: the fact only stores
+the dimension key, so renaming a customer refreshes its CustomerDimension row and dirties no fact.
+A fact that copies such a field itself (with a lambda) has to read it through another dimension-less path.
+
+    post_save.connect(signals.dirty_dependents_on_save, sender=TestCustomer)
+"""
+from collections import OrderedDict
+from django.db import router
+
+_dependencies = None
+
+
+def relation_prefixes(model, path):
+    """
+    (related model, path to it, the field read on it) for every relation along `path`
+    """
+    prefixes = []
+    parts = path.split('__')
+    for i, part in enumerate(parts):
+        field = model._meta.get_field(part)
+        if not field.is_relation:
+            break
+        model = field.related_model
+        read = parts[i + 1] if i + 1 < len(parts) else model._meta.pk.name
+        prefixes.append((model, '__'.join(parts[:i + 1]), read))
+    return prefixes
+
+
+def get_dimension_fields(fact_class):
+    """
+    {business model: names of its fields that the fact's dimensions copy}
+    """
+    from .models import BaseDimension
+    copied = {}
+    for field in fact_class.get_reporting_fields():
+        dimension = field.related_model if field.is_relation else None
+        if dimension is None or not issubclass(dimension, BaseDimension):
+            continue
+        model = dimension.ReportingMeta.business_model
+        names = set(path.split('__')[0] for path in dimension.get_row_paths())
+        names.discard(dimension.ReportingMeta.unique_identifier)  # the fact's key is looked up by it
+        copied.setdefault(model, set()).update(names)
+    return copied
+
+
+def build_dependency_map():
+    """
+    {model: [(fact class, path from the fact's business model to it, names of the fields the fact reads), ...]}
+    """
+    from .models import BaseFact, get_reporting_models
+    reads = OrderedDict()
+    for fact_class in get_reporting_models(BaseFact):
+        business_model = fact_class.ReportingMeta.business_model
+        copied = get_dimension_fields(fact_class)
+        for path in fact_class.get_row_paths():
+            for model, prefix, name in relation_prefixes(business_model, path):
+                if name == model._meta.pk.name or name in copied.get(model, ()):
+                    continue  # a primary key doesn't change, the dimension refreshes what it copies
+                reads.setdefault((model, fact_class, prefix), set()).add(name)
+    dependencies = OrderedDict()
+    for (model, fact_class, prefix), names in reads.items():
+        dependencies.setdefault(model, []).append((fact_class, prefix, frozenset(names)))
+    return dependencies
+
+
+def get_dependents(model):
+    global _dependencies
+    if _dependencies is None:
+        _dependencies = build_dependency_map()
+    return _dependencies.get(model, [])
+
+
+def reset():
+    global _dependencies
+    _dependencies = None
+
+
+def get_dimensions(model):
+    from .models import BaseDimension, get_reporting_models
+    return [dimension for dimension in get_reporting_models(BaseDimension) if dimension.ReportingMeta.business_model is model]
+
+
+def invalidate(instance, changed=None):
+    """
+    Refreshes the dimension rows of `instance`, and marks dirty every fact that reads one of its `changed`
+    fields (all of them when None) through a relation, one UPDATE per fact class and path.
+    Returns {fact class: rows marked}.
+    """
+    from .models import ChangeJournal
+    for dimension in get_dimensions(instance.__class__):
+        dimension.record_update(instance, force=True)  # only written when its fingerprint changed
+    marked = OrderedDict()
+    for fact_class, path, names in get_dependents(instance.__class__):
+        if changed is not None and not names & set(changed):
+            continue
+        meta = fact_class.ReportingMeta
+        unique_ids = meta.business_model._default_manager.filter(**{path: instance.pk}).values(meta.unique_identifier)
+        if ChangeJournal.is_journaled(fact_class):
+            entries = [ChangeJournal(fact=fact_class._meta.label, unique_identifier=unique_id)
+                       for unique_id in unique_ids.values_list(meta.unique_identifier, flat=True)]
+            ChangeJournal.objects.bulk_create(entries)
+            marked[fact_class] = marked.get(fact_class, 0) + len(entries)
+            continue
+        if unique_ids.db != router.db_for_write(fact_class):
+            unique_ids = list(unique_ids.values_list(meta.unique_identifier, flat=True))  # no subqueries across databases
+        count = fact_class._base_manager.filter(_unique_identifier__in=unique_ids, _is_frozen=False).update(**fact_class.dirty_values())
+        marked[fact_class] = marked.get(fact_class, 0) + count
+    return marked
@@ -0,0 +1,316 @@
+"""
+Query plans of the queries the library runs against a fact: listings, totals, every filter,
+date ranges with each dimension, sampled totals, leaderboards, exports and the refresh queue.
+
+Each one is run through EXPLAIN (EXPLAIN QUERY PLAN on SQLite). Full scans of the fact table and
+temporary B-trees (sorts) are flagged, with the index that would avoid them as a `ReportingMeta.indexes`
+entry and its size estimated from the table's row count.
+
+    for plan in explain_fact(OrderedProductFact):
+        plan.label, plan.scans, plan.temp_btrees, plan.suggestion, plan.size
+
+Flags are understood for SQLite and PostgreSQL, other databases only print their plans.
+"""
+import re
+from collections import OrderedDict
+from django.db import connections, models
+from django.db.models import Count
+from django.utils import timezone
+from . import exports, fields, filters, leaderboards, reports, sampling
+
+EQUALITY_LOOKUPS = ('exact', 'iexact', 'in', 'isnull')
+RANGE_LOOKUPS = ('gt', 'gte', 'lt', 'lte', 'range', 'year', 'month', 'day')
+WIDTHS = {  # bytes per value in an index entry, roughly
+    'BooleanField': 1, 'SmallIntegerField': 2, 'PositiveSmallIntegerField': 2, 'IntegerField': 4,
+    'PositiveIntegerField': 4, 'AutoField': 4, 'BigIntegerField': 8, 'BigAutoField': 8, 'FloatField': 8,
+    'DecimalField': 8, 'DateField': 4, 'DateTimeField': 8, 'TimeField': 8,
+}
+ENTRY_OVERHEAD = 16  # the row pointer and the entry's header
+FILL_FACTOR = 0.7  # how full B-tree pages are after random inserts
+
+
+class ReportQuery(object):
+    """
+    A queryset the library runs, or, with `aggregates`, its aggregate() over the queryset
+    """
+
+    def __init__(self, label, queryset, aggregates=None):
+        self.label = label
+        self.queryset = queryset
+        self.aggregates = aggregates
+
+    def get_sql(self):
+        query = self.queryset.query.chain()
+        if self.aggregates:  # like `get_aggregation` does, without running it
+            for alias, aggregate in self.aggregates.items():
+                query.add_annotation(aggregate, alias, is_summary=True)
+            query.select = ()
+            query.default_cols = False
+            query.clear_ordering(True)
+        return query.get_compiler(self.queryset.db).as_sql()
+
+    def get_columns(self):
+        """
+        (equality, range, ordering) field names of the query's own table, in the order the query uses them
+        """
+        query = self.queryset.query
+        model = self.queryset.model
+        equality, ranges, ordering = [], [], []
+
+        def walk(node):
+            for child in node.children:
+                if hasattr(child, 'children'):
+                    walk(child)
+                    continue
+                target = getattr(getattr(child, 'lhs', None), 'target', None)
+                if target is None or child.lhs.alias != query.base_table or target.model is not model:
+                    continue  # a joined dimension, it's filtered on its own table
+                if child.lookup_name in EQUALITY_LOOKUPS:
+                    equality.append(target.name)
+                elif child.lookup_name in RANGE_LOOKUPS:
+                    ranges.append(target.name)
+        walk(query.where)
+
+        if isinstance(query.group_by, tuple):
+            ordering += [expression.target.name for expression in query.group_by
+                         if getattr(expression, 'target', None) is not None and expression.target.model is model]
+        if not self.aggregates:
+            for name in query.order_by:
+                name = name.lstrip('-')
+                if name == 'pk' or name in query.annotations or '__' in name:
+                    continue
+                ordering.append(model._meta.get_field(name).name)
+        return unique(equality), unique(ranges), unique(ordering)
+
+
+def unique(names):
+    return list(OrderedDict.fromkeys(names))
+
+
+def explain_lines(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute('{} {}'.format(connection.ops.explain_query_prefix(), sql), params)
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        return [row[-1] for row in rows]  # (id, parent, notused, detail)
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def find_problems(vendor, lines):
+    """
+    (tables scanned in full, lines that sort into a temporary B-tree)
+    """
+    scans, temp_btrees = [], []
+    for line in lines:
+        if vendor == 'sqlite':
+            match = re.match(r'\s*SCAN (?:TABLE )?(\w+)(.*)', line)
+            if match and 'USING' not in match.group(2):
+                scans.append(match.group(1))
+            if 'USE TEMP B-TREE' in line:
+                temp_btrees.append(line.strip())
+        elif vendor == 'postgresql':
+            match = re.search(r'Seq Scan on (\w+)', line)
+            if match:
+                scans.append(match.group(1))
+            if re.match(r'\s*(->\s*)?Sort\b', line):
+                temp_btrees.append(line.strip())
+    return scans, temp_btrees
+
+
+def get_index_columns(model):
+    """
+    The column lists (field names) of every index `model` already has
+    """
+    indexes = [list(index.fields) for index in model._meta.indexes]
+    indexes += [list(together) for together in model._meta.index_together]
+    indexes += [list(together) for together in model._meta.unique_together]
+    indexes += [[field.name] for field in model._meta.fields if field.db_index or field.unique]
+    return [[name.lstrip('-') for name in index] for index in indexes]
+
+
+def is_covered(model, columns):
+    return any(index[:len(columns)] == list(columns) for index in get_index_columns(model))
+
+
+def suggest_index(report_query):
+    """
+    Equality columns, then the ordering, then one range column, i.e. ('_is_deleted', 'customer', 'ordered_on').
+    None when there is nothing to index or an index already starts with it.
+    """
+    equality, ranges, ordering = report_query.get_columns()
+    columns = unique(equality + ordering + ranges[:1])
+    if not columns or is_covered(report_query.queryset.model, columns):
+        return None
+    return tuple(columns)
+
+
+def table_rows(model, using):
+    """
+    The row count from the database's statistics (ANALYZE), or a COUNT(*) when it has none
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone():
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])  # starts with the row count
+                row = cursor.fetchone()
+                if row and row[0]:
+                    return int(row[0].split()[0])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            if row and row[0] > 0:
+                return int(row[0])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s', [table])
+            row = cursor.fetchone()
+            if row and row[0]:
+                return int(row[0])
+    return model._base_manager.using(using).count()
+
+
+def column_width(field):
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, fields.ScaledDecimalField):
+        return 8
+    if isinstance(field, models.CharField):
+        return (field.max_length or 32) // 2  # most strings don't use the whole length
+    return WIDTHS.get(field.get_internal_type(), 8)
+
+
+def estimate_index_size(model, columns, rows):
+    """
+    Bytes an index on `columns` takes for `rows` rows
+    """
+    width = sum(column_width(model._meta.get_field(name)) for name in columns) + ENTRY_OVERHEAD
+    return int(rows * width / FILL_FACTOR)
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return '{:.0f} {}'.format(size, unit) if unit == 'B' else '{:.1f} {}'.format(size, unit)
+        size /= 1024
+
+
+def sample_value(filter):
+    if filter.parse is filters.parse_date_value:
+        value = timezone.localdate()
+    elif filter.parse is int:
+        value = 1
+    else:
+        value = 'a'
+    return [value] if filter.many else value
+
+
+def listing(facts):
+    """
+    A page's queryset without its window aggregates. SQLite computes those in a co-routine over every
+    filtered fact and always sorts it into a temporary B-tree, whatever the indexes, so it's left out.
+    """
+    return facts.qs.order_by('pk')
+
+
+def report_queries(fact_class):
+    """
+    Every ReportQuery the library runs against `fact_class`
+    """
+    facts = filters.FactFilter(fact_class)
+    queries = [ReportQuery('listing', listing(facts))]
+    total = facts.get_total()
+    if isinstance(total, dict):
+        queries.append(ReportQuery('totals', facts.qs, total))
+
+    by_name = OrderedDict((filter.name, filter) for filter in facts.filters)
+    for filter in by_name.values():
+        data = {filter.name: sample_value(filter)}
+        queries.append(ReportQuery('listing by {}'.format(filter.name), listing(filters.FactFilter(fact_class, data))))
+    dimensions = [name for name in by_name if '__' not in name]  # by the dimension's pk
+    for name in by_name:
+        if not name.endswith('__after') or name.replace('__after', '__before') not in by_name:
+            continue
+        date_range = {name: sample_value(by_name[name]), name.replace('__after', '__before'): sample_value(by_name[name])}
+        queries.append(ReportQuery('listing by {} range'.format(name[:-len('__after')]),
+                                   listing(filters.FactFilter(fact_class, date_range))))
+        for dimension in dimensions:
+            data = dict(date_range, **{dimension: sample_value(by_name[dimension])})
+            queries.append(ReportQuery('listing by {} range and {}'.format(name[:-len('__after')], dimension),
+                                       listing(filters.FactFilter(fact_class, data))))
+
+    queries.append(ReportQuery('sampled totals', sampling.sampled(facts.qs, 0.01), {'count': Count('pk')}))
+    for board in leaderboards.get_leaderboards(fact_class):
+        label = '{} by {} per {}'.format(board.measure, board.dimension, board.grain)
+        queries.append(ReportQuery('leaderboard {} rebuild'.format(label), board.get_sums()))
+        queries.append(ReportQuery('leaderboard {} top'.format(label),
+                                   board.get_entries().filter(period='').exclude(value=0).order_by('-value', 'member')))
+    try:
+        selected, builders = exports.FactExporter(fact_class).plan()
+        queries.append(ReportQuery('export', fact_class._default_manager.order_by('pk').values_list(*selected)))
+    except reports.NotTraceable:
+        pass  # exported from instances, which is the listing
+
+    queries.append(ReportQuery('dirty facts', fact_class._base_manager.filter(_is_dirty=True, _is_frozen=False)
+                               .values_list('_unique_identifier', flat=True)))
+    if hasattr(fact_class, 'purge_deleted'):
+        queries.append(ReportQuery('soft deleted facts', fact_class._base_manager.filter(_is_deleted=True, _is_frozen=False)
+                                   .values_list('pk', flat=True)))
+    return queries
+
+
+class Plan(object):
+
+    def __init__(self, report_query, lines, scans, temp_btrees, suggestion=None, size=None):
+        self.report_query = report_query
+        self.label = report_query.label
+        self.lines = lines
+        self.scans = scans
+        self.temp_btrees = temp_btrees
+        self.suggestion = suggestion
+        self.size = size
+
+    @property
+    def flagged(self):
+        return bool(self.scans or self.temp_btrees)
+
+
+def explain(report_query, rows=None):
+    """
+    The Plan of one ReportQuery, with an index suggestion when it scans its table or sorts
+    """
+    queryset = report_query.queryset
+    connection = connections[queryset.db]
+    sql, params = report_query.get_sql()
+    lines = explain_lines(connection, sql, params)
+    scans, temp_btrees = find_problems(connection.vendor, lines)
+    plan = Plan(report_query, lines, scans, temp_btrees)
+    if queryset.model._meta.db_table in scans or temp_btrees:
+        plan.suggestion = suggest_index(report_query)
+        if plan.suggestion is not None:
+            if rows is None:
+                rows = table_rows(queryset.model, queryset.db)
+            plan.size = estimate_index_size(queryset.model, plan.suggestion, rows)
+    return plan
+
+
+def explain_fact(fact_class):
+    rows = table_rows(fact_class, fact_class._default_manager.db)
+    plans = []
+    for report_query in report_queries(fact_class):
+        model_rows = rows if report_query.queryset.model is fact_class else None
+        plans.append(explain(report_query, rows=model_rows))
+    return plans
+
+
+def get_suggestions(plans, fact_class):
+    """
+    {index columns: estimated size} of the fact's own suggestions, leaving out those another one starts with
+    """
+    suggestions = OrderedDict()
+    for plan in plans:
+        if plan.suggestion is not None and plan.report_query.queryset.model is fact_class:
+            suggestions[plan.suggestion] = plan.size
+    return OrderedDict((columns, size) for columns, size in suggestions.items()
+                       if not any(other != columns and other[:len(columns)] == columns for other in suggestions))
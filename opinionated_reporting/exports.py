@@ -0,0 +1,252 @@
+"""
+Exports that join small dimensions in python instead of in SQL.
+
+Each dimension an export reads from is either joined in the query, or, when it has at most
+`threshold` rows (like DateDimension and HourDimension), loaded once into a dict keyed by pk,
+so the fact query only reads its own narrow columns.
+
+    OPINIONATED_REPORTING_MEMORY_JOIN_ROWS = 10000  # the default threshold
+
+    with open('orders.csv', 'w') as output:
+        FactExporter(OrderedProductFact).write_csv(output)
+
+`write_csv_parallel` splits the facts into ranges of `_unique_identifier` (or of a DateDimension's date)
+and writes each range in its own process, then joins the parts. The file is byte for byte what `write_csv`
+writes from `ordered()`, the facts ordered by that key and then pk.
+
+    FactExporter(OrderedProductFact).write_csv_parallel('orders.csv', partition_by='ordered_on', partitions=8)
+"""
+import csv
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Q
+from . import reports
+
+
+def get_threshold():
+    return getattr(settings, 'OPINIONATED_REPORTING_MEMORY_JOIN_ROWS', 10000)
+
+
+class DimensionTable(object):
+    """
+    The `attributes` (paths on the dimension) of every row of a dimension, by pk
+    """
+
+    def __init__(self, model, attributes):
+        self.model = model
+        self.attributes = attributes
+        self.rows = {}
+        self.empty = ()
+
+    def load(self):
+        self.empty = (None,) * len(self.attributes)
+        self.rows = {values[0]: values[1:] for values in self.model._default_manager.values_list('pk', *self.attributes).iterator()}
+        return self
+
+    def get(self, pk):
+        return self.rows.get(pk, self.empty)
+
+
+class FactExporter(object):
+    """
+    `columns` are paths on the fact, by default the ones `row_description` reads.
+    `in_memory` / `in_sql` force dimension fields one way, the rest are decided by `threshold`.
+    """
+
+    def __init__(self, fact_class, columns=None, threshold=None, in_memory=(), in_sql=()):
+        self.fact_class = fact_class
+        self.columns = list(columns) if columns is not None else reports.trace_row_description(fact_class)
+        self.threshold = get_threshold() if threshold is None else threshold
+        self.in_memory = set(in_memory)
+        self.in_sql = set(in_sql)
+        self.tables = {}
+
+    def get_dimension_fields(self):
+        """
+        The foreign keys on the fact that columns read through, with the attributes read on each
+        """
+        dimensions = {}
+        for column in self.columns:
+            name, _, attribute = column.partition('__')
+            if not attribute:
+                continue
+            field = self.fact_class._meta.get_field(name)
+            if field.is_relation:
+                dimensions.setdefault(field, [])
+                if attribute not in dimensions[field]:
+                    dimensions[field].append(attribute)
+        return dimensions
+
+    def joins_in_memory(self, field, sizes):
+        if field.name in self.in_memory:
+            return True
+        elif field.name in self.in_sql:
+            return False
+        if field.related_model not in sizes:
+            sizes[field.related_model] = field.related_model._default_manager.count()
+        return sizes[field.related_model] <= self.threshold
+
+    def plan(self):
+        """
+        Loads the dimensions joined in python, and returns the fact query's columns
+        and how to build each export column from them
+        """
+        self.tables = {}
+        sizes = {}
+        tables = {}  # one per dimension model, `created_on` and `ordered_on` share the dates
+        for field, attributes in self.get_dimension_fields().items():
+            if self.joins_in_memory(field, sizes):
+                table = tables.setdefault(field.related_model, DimensionTable(field.related_model, []))
+                table.attributes += [attribute for attribute in attributes if attribute not in table.attributes]
+                self.tables[field.name] = (field, table)
+        for table in tables.values():
+            table.load()
+        selected = []
+        builders = []  # (position in the fact query, None or (table, index of the attribute))
+        for column in self.columns:
+            name, _, attribute = column.partition('__')
+            if attribute and name in self.tables:
+                field, table = self.tables[name]
+                path, lookup = field.attname, (table, table.attributes.index(attribute))  # the fact's own `customer_id`, no join
+            else:
+                path, lookup = column, None
+            if path not in selected:
+                selected.append(path)
+            builders.append((selected.index(path), lookup))
+        return selected, builders
+
+    def rows(self, queryset=None, chunk_size=2000):
+        if queryset is None:
+            queryset = self.fact_class._default_manager.order_by('pk')
+        selected, builders = self.plan()
+        for values in queryset.values_list(*selected).iterator(chunk_size=chunk_size):
+            yield tuple(values[position] if lookup is None else lookup[0].get(values[position])[lookup[1]]
+                        for position, lookup in builders)
+
+    def write_csv(self, output, queryset=None, chunk_size=2000, header=True):
+        writer = csv.writer(output)
+        if header:
+            writer.writerow(self.fact_class.ReportingMeta.header_description)
+        count = 0
+        for row in self.rows(queryset, chunk_size=chunk_size):
+            writer.writerow(row)
+            count += 1
+        return count
+
+    def get_options(self):
+        return {'columns': self.columns, 'threshold': self.threshold, 'in_memory': sorted(self.in_memory), 'in_sql': sorted(self.in_sql)}
+
+    def get_partition_key(self, partition_by):
+        """
+        The path ranges are taken on, `_unique_identifier` or the date of a DateDimension field
+        """
+        from .models import DateDimension
+        if partition_by == '_unique_identifier':
+            return partition_by
+        field = self.fact_class._meta.get_field(partition_by)
+        if not field.is_relation or not issubclass(field.related_model, DateDimension):
+            raise Exception('Partition by `_unique_identifier` or a DateDimension field, not {}'.format(partition_by))
+        return '{}__date'.format(partition_by)
+
+    def ordered(self, partition_by='_unique_identifier'):
+        """
+        The facts in the order `write_csv_parallel` writes them
+        """
+        key = self.get_partition_key(partition_by)
+        return self.fact_class._default_manager.order_by(F(key).asc(nulls_first=True), 'pk')
+
+    def get_ranges(self, partition_by='_unique_identifier', partitions=4):
+        """
+        [(low, high), ...] splitting the facts into `partitions` ranges of about the same size, None is open ended
+        """
+        key = self.get_partition_key(partition_by)
+        keys = self.fact_class._default_manager.filter(**{'{}__isnull'.format(key): False}).order_by(key).values_list(key, flat=True)
+        count = keys.count()
+        boundaries = []
+        for i in range(1, partitions):
+            if count:
+                boundary = keys[count * i // partitions]
+                if not boundaries or boundary > boundaries[-1]:  # a date many facts share is one boundary
+                    boundaries.append(boundary)
+        edges = [None] + boundaries + [None]
+        return list(zip(edges[:-1], edges[1:]))
+
+    def get_partition(self, partition_by, low, high):
+        """
+        The facts of one range, in order. The first range has the facts without a key too, they're ordered first.
+        """
+        key = self.get_partition_key(partition_by)
+        condition = Q()
+        if low is not None:
+            condition &= Q(**{'{}__gte'.format(key): low})
+        if high is not None:
+            condition &= Q(**{'{}__lt'.format(key): high})
+        if low is None and high is not None:  # with no bounds at all `condition` is empty and already matches them
+            condition |= Q(**{'{}__isnull'.format(key): True})
+        return self.ordered(partition_by).filter(condition)
+
+    def write_csv_parallel(self, path, partition_by='_unique_identifier', partitions=4, workers=None, manifest=False,
+                           chunk_size=2000, executor=None):
+        """
+        Writes `path` from `partitions` part files written by `workers` processes. With `manifest` the parts are kept
+        and `path` is a json list of them instead. `executor` replaces the process pool, e.g. with threads.
+        Returns the number of rows.
+        """
+        ranges = self.get_ranges(partition_by, partitions)
+        part_paths = ['{}.part{:04d}'.format(path, i) for i in range(len(ranges))]
+        arguments = [(self.fact_class._meta.label, self.get_options(), partition_by, low, high, part_path, chunk_size)
+                     for (low, high), part_path in zip(ranges, part_paths)]
+        if executor is None:
+            if any(connection.in_atomic_block for connection in connections.all()):
+                raise Exception('write_csv_parallel can not fork inside a transaction, its workers would not see its rows')
+            connections.close_all()  # the workers open their own, a forked connection can't be shared
+            with ProcessPoolExecutor(max_workers=workers or len(ranges), initializer=setup_worker) as executor:
+                counts = list(executor.map(export_part, *zip(*arguments)))
+        else:  # the caller's to shut down
+            counts = list(executor.map(export_part, *zip(*arguments)))
+
+        if manifest:
+            parts = [{'path': os.path.basename(part_path), 'rows': count, 'low': format_key(low), 'high': format_key(high)}
+                     for part_path, count, (low, high) in zip(part_paths, counts, ranges)]
+            with open(path, 'w') as output:
+                json.dump({'header': self.fact_class.ReportingMeta.header_description, 'partition_by': partition_by,
+                           'rows': sum(counts), 'parts': parts}, output, indent=2)
+            return sum(counts)
+
+        with open(path, 'w', newline='') as output:
+            csv.writer(output).writerow(self.fact_class.ReportingMeta.header_description)
+            for part_path in part_paths:
+                with open(part_path, newline='') as part:
+                    shutil.copyfileobj(part, output)
+                os.remove(part_path)
+        return sum(counts)
+
+
+def format_key(value):
+    return value if value is None or isinstance(value, (int, str)) else str(value)
+
+
+def setup_worker():
+    """
+    Spawned workers (the default on macOS and Windows) start without django
+    """
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def export_part(label, options, partition_by, low, high, path, chunk_size):
+    """
+    Writes the facts of one range to `path` without a header, in a worker
+    """
+    exporter = FactExporter(apps.get_model(label), **options)
+    try:
+        with open(path, 'w', newline='') as output:
+            return exporter.write_csv(output, exporter.get_partition(partition_by, low, high), chunk_size=chunk_size, header=False)
+    finally:
+        connections.close_all()
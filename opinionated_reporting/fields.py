@@ -1,3 +1,5 @@
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from django.core import exceptions
 from django.db import models
 
 
@@ -99,3 +101,63 @@ class DimensionForeignKey(models.ForeignKey):
         if not kwargs.get('null', False):
             raise Exception('You must pass null=True for {}'.format(self))
         super().__init__(*args, **kwargs)
+
+
+class ScaledDecimalField(models.BigIntegerField):
+    """
+    A decimal stored as a whole number of its smallest unit, i.e. cents for `decimal_places=2`, so sums run on integers.
+    Reads back, and Sum, Min and Max, as a Decimal. A plain `models.Avg` is a float of the smallest units, 100 times
+    too big for cents: use `Avg` below (`ReportingMeta.total` averages are swapped for it, see `filters.scaled_averages`).
+    Set `ReportingMeta.scaled_decimals` to use it for measures.
+    """
+    description = 'Decimal number stored as a scaled integer'
+
+    def __init__(self, *args, decimal_places=2, max_digits=None, **kwargs):
+        self.decimal_places = decimal_places
+        self.max_digits = max_digits
+        self.scale = 10 ** decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['decimal_places'] = self.decimal_places
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        return name, path, args, kwargs
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            return Decimal(repr(value) if isinstance(value, float) else value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError('"{}" value must be a decimal number.'.format(value), code='invalid')
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return int((self.to_python(value) * self.scale).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.to_python(value).scaleb(-self.decimal_places)
+
+
+class Avg(models.Avg):
+    """
+    Avg that is a Decimal over a ScaledDecimalField (a plain Avg is a float of the smallest units)
+    """
+
+    def _resolve_output_field(self):
+        source_fields = self.get_source_fields()
+        if source_fields and isinstance(source_fields[0], ScaledDecimalField):
+            return source_fields[0]
+        return super()._resolve_output_field()
+
+    @property
+    def convert_value(self):
+        if isinstance(self.output_field, ScaledDecimalField):
+            return self._convert_value_noop  # not int(), the average of whole cents can have a fraction
+        return super().convert_value
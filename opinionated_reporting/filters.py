@@ -0,0 +1,340 @@
+"""
+Filters generated from a fact's dimensions, and listing pages that come back with their
+total count and `ReportingMeta.total` measures from the same query.
+
+    facts = FactFilter(OrderedProductFact, request.GET)  # e.g. ?created_on__after=2018-09-01&customer=3
+    page = facts.page(offset=0, limit=50)
+    page.rows, page.count, page.totals
+
+`ReportingMeta.total` can be a dict of aggregates, which are computed as window aggregates next to
+the page rows, or a lambda taking the filter (the old way), which is one more query.
+
+    total = {'total': Sum('total'), 'quantity': Sum('quantity')}
+
+For a quick look at a lot of facts, `facts.estimate(sample=0.01)` scales up the count and sums from 1% of them.
+
+With django-filter installed, `get_filterset_class(OrderedProductFact)` is a FilterSet with the same filters.
+"""
+import datetime
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import models
+from django.db.models import Count, F, Sum, Window
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_date
+from . import fields, sampling
+
+try:
+    import django_filters
+except ImportError:  # pragma: no cover
+    django_filters = None
+
+COUNT = '_opr_count'
+TOTAL_PREFIX = '_opr_total_'
+
+
+class Filter(object):
+    """
+    `name` in the query string filters on `path`, after `parse` turns the value into python
+    """
+
+    def __init__(self, name, path, parse=str, many=False):
+        self.name = name
+        self.path = path
+        self.parse = parse
+        self.many = many
+
+    def lookup(self, value):
+        """
+        Raises ValidationError when `parse` can't read the value
+        """
+        try:
+            if self.many:
+                return {self.path: [self.parse(item) for item in value]}
+            return {self.path: self.parse(value)}
+        except (TypeError, ValueError):
+            raise ValidationError('{!r} is not a valid value'.format(value), code='invalid')
+
+
+class WindowSafe(object):
+    """
+    Django 2.2 wraps decimal aggregates in a CAST on SQLite, which SQLite doesn't allow in front of OVER (),
+    so the CAST is left out (the converter still makes a Decimal)
+    """
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, **extra_context)
+
+
+class WindowSum(WindowSafe, Sum):
+    pass
+
+
+class WindowAvg(WindowSafe, models.Avg):
+    pass
+
+
+class WindowScaledAvg(WindowSafe, fields.Avg):
+    pass
+
+
+WINDOW_AGGREGATES = {Sum: WindowSum, models.Avg: WindowAvg, fields.Avg: WindowScaledAvg}
+
+
+class AggregateWindow(Window):
+    """
+    Converts like its aggregate, a plain Window would int() the average of a ScaledDecimalField
+    """
+
+    @property
+    def convert_value(self):
+        return self.source_expression.convert_value
+
+
+def window(aggregate):
+    """
+    The aggregate over every row of the query, those without a CAST on SQLite (Count, Min, Max) are used as they are
+    """
+    window_class = WINDOW_AGGREGATES.get(aggregate.__class__)
+    if window_class is not None:
+        extra = {'distinct': True} if aggregate.distinct else {}
+        if 'output_field' in aggregate.__dict__:  # given, not resolved yet
+            extra['output_field'] = aggregate.output_field
+        aggregate = window_class(*aggregate.source_expressions, filter=aggregate.filter, **extra)
+    return AggregateWindow(aggregate)
+
+
+def get_path_field(model, path):
+    """
+    The field at the end of a `customer__name` path, None when there isn't one
+    """
+    field = None
+    for name in path.split(LOOKUP_SEP):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def scaled_averages(fact_class, total):
+    """
+    `total` with a `fields.Avg` for every plain Avg of a ScaledDecimalField, which would be a float of the smallest units
+    """
+    averages = OrderedDict()
+    for name, aggregate in total.items():
+        source = aggregate.source_expressions[0] if aggregate.__class__ is models.Avg else None
+        if isinstance(source, F) and isinstance(get_path_field(fact_class, source.name), fields.ScaledDecimalField):
+            extra = {'output_field': aggregate.output_field} if 'output_field' in aggregate.__dict__ else {}
+            aggregate = fields.Avg(*aggregate.source_expressions, distinct=aggregate.distinct, filter=aggregate.filter, **extra)
+        averages[name] = aggregate
+    return averages
+
+
+def parse_date_value(value):
+    if isinstance(value, datetime.date):
+        return value
+    date = parse_date(value)
+    if date is None:
+        raise ValueError('{} is not a date'.format(value))
+    return date
+
+
+def get_filters(fact_class):
+    """
+    The filters of every dimension on the fact: date ranges, months, quarters and week days on dates,
+    hours on times, and the pk and char fields of the other dimensions
+    """
+    from .models import DateDimension, HourDimension
+    filters = []
+    for field in fact_class._meta.fields:
+        if not isinstance(field, fields.DimensionForeignKey):
+            continue
+        name = field.name
+        dimension = field.related_model
+        if issubclass(dimension, DateDimension):
+            filters += [
+                Filter('{}__after'.format(name), '{}__date__gte'.format(name), parse_date_value),
+                Filter('{}__before'.format(name), '{}__date__lte'.format(name), parse_date_value),
+                Filter('{}__month_format'.format(name), '{}__month_format__in'.format(name), many=True),
+                Filter('{}__quarter_format'.format(name), '{}__quarter_format__in'.format(name), many=True),
+                Filter('{}__day_of_week'.format(name), '{}__day_of_week__in'.format(name), int, many=True),
+            ]
+        elif issubclass(dimension, HourDimension):
+            filters += [
+                Filter('{}__hour'.format(name), '{}__time__hour__in'.format(name), int, many=True),
+            ]
+        else:
+            filters.append(Filter(name, '{}__in'.format(name), int, many=True))
+            for attribute in dimension.get_reporting_fields():
+                if isinstance(attribute, models.CharField):
+                    filters.append(Filter('{}__{}'.format(name, attribute.name), '{}__{}__icontains'.format(name, attribute.name)))
+    return filters
+
+
+class FactFilter(object):
+    """
+    `data` is a dict like request.GET, values of the filters that take many can be lists
+    """
+
+    def __init__(self, fact_class, data=None, queryset=None):
+        self.fact_class = fact_class
+        self.data = data or {}
+        self.queryset = queryset if queryset is not None else fact_class._default_manager.all()
+        self.filters = get_filters(fact_class)
+
+    def get_value(self, filter):
+        if filter.many and hasattr(self.data, 'getlist'):
+            return self.data.getlist(filter.name)
+        value = self.data.get(filter.name)
+        if filter.many and value is not None and not isinstance(value, (list, tuple)):
+            value = [value]
+        return value
+
+    def get_lookups(self):
+        """
+        The ORM lookups of the filters in `data`, and {filter name: [messages]} for the values that don't parse
+        """
+        lookups, errors = {}, {}
+        for filter in self.filters:
+            value = self.get_value(filter)
+            if value in (None, '', []):
+                continue
+            try:
+                lookups.update(filter.lookup(value))
+            except ValidationError as e:
+                errors[filter.name] = e.messages
+        return lookups, errors
+
+    @property
+    def errors(self):
+        return self.get_lookups()[1]
+
+    def is_valid(self):
+        return not self.errors
+
+    @property
+    def qs(self):
+        """
+        The filtered facts, raises ValidationError (with `errors` as its message dict) when a value doesn't parse,
+        check `is_valid()` first to answer with a 400
+        """
+        lookups, errors = self.get_lookups()
+        if errors:
+            raise ValidationError(errors)
+        return self.queryset.filter(**lookups)
+
+    def get_total(self):
+        """
+        `ReportingMeta.total`, with `fields.Avg` for the averages of scaled decimals, see `scaled_averages`
+        """
+        total = getattr(self.fact_class.ReportingMeta, 'total', None)
+        if isinstance(total, dict):
+            return scaled_averages(self.fact_class, total)
+        return total
+
+    def totals(self):
+        """
+        The `ReportingMeta.total` measures over every filtered fact
+        """
+        total = self.get_total()
+        if total is None:
+            return {}
+        elif callable(total):
+            return total(self)
+        return self.qs.aggregate(**total)
+
+    def estimate(self, sample=0.01, measures=None, confidence=0.95):
+        """
+        The count and sums over the filtered facts from `sample` of them, see `sampling.estimate`.
+        `measures` are the fields summed in `ReportingMeta.total` by default.
+        """
+        if measures is None:
+            total = self.get_total()
+            measures = [aggregate.source_expressions[0].name for aggregate in total.values()
+                        if isinstance(aggregate, Sum)] if isinstance(total, dict) else []
+        return sampling.estimate(self.qs, sample, measures=measures, confidence=confidence)
+
+    def get_windows(self):
+        """
+        {annotation name: window aggregate} of the count and the `ReportingMeta.total` measures
+        """
+        total = self.get_total()
+        windows = OrderedDict([(COUNT, window(Count('pk')))])
+        if isinstance(total, dict):
+            windows.update((TOTAL_PREFIX + name, window(aggregate)) for name, aggregate in total.items())
+        return windows
+
+    def page_queryset(self, order_by=('pk',)):
+        """
+        The filtered facts with the count and totals annotated as window aggregates
+        """
+        return self.qs.annotate(**self.get_windows()).order_by(*order_by)
+
+    def page(self, offset=0, limit=50, order_by=('pk',), columns=None):
+        """
+        One page of facts (or of `columns` tuples) with the count and totals over every filtered fact,
+        all from one query. Only a page past the end needs a second query for them.
+        """
+        total = self.get_total()
+        queryset = self.page_queryset(order_by)
+        names = list(self.get_windows())  # not the annotations the queryset had already
+        if columns is not None:
+            rows = list(queryset.values_list(*(list(columns) + names))[offset:offset + limit])
+            summary = rows[0][len(columns):] if rows else None
+            rows = [row[:len(columns)] for row in rows]
+            summary = dict(zip(names, summary)) if summary else None
+        else:
+            related = [field.name for field in self.fact_class._meta.fields if isinstance(field, fields.DimensionForeignKey)]
+            rows = list(queryset.select_related(*related)[offset:offset + limit])
+            summary = {name: getattr(rows[0], name) for name in names} if rows else None
+
+        if summary is None:  # past the last page, there were no rows to carry the windows
+            count = self.qs.count()
+            totals = self.totals()
+        else:
+            count = summary[COUNT]
+            totals = {name[len(TOTAL_PREFIX):]: value for name, value in summary.items() if name.startswith(TOTAL_PREFIX)}
+            if callable(total):
+                totals = total(self)
+        return Page(rows, count, totals, offset, limit)
+
+
+class Page(object):
+
+    def __init__(self, rows, count, totals, offset, limit):
+        self.rows = rows
+        self.count = count
+        self.totals = totals
+        self.offset = offset
+        self.limit = limit
+
+    @property
+    def has_next(self):
+        return self.offset + self.limit < self.count
+
+
+def get_filterset_class(fact_class):
+    """
+    A django-filter FilterSet with the filters of `get_filters`
+    """
+    if django_filters is None:
+        raise Exception('get_filterset_class requires django-filter, `pip install django-filter`')
+    attrs = {}
+    for filter in get_filters(fact_class):
+        path, _, lookup_expr = filter.path.rpartition('__')
+        if filter.many:
+            attrs[filter.name] = django_filters.BaseInFilter(field_name=path, lookup_expr=lookup_expr)
+        elif filter.parse is parse_date_value:
+            attrs[filter.name] = django_filters.DateFilter(field_name=path, lookup_expr=lookup_expr)
+        else:
+            attrs[filter.name] = django_filters.CharFilter(field_name=path, lookup_expr=lookup_expr)
+
+    class Meta:
+        model = fact_class
+        fields = []
+    attrs['Meta'] = Meta
+    return type('{}FilterSet'.format(fact_class.__name__), (django_filters.FilterSet,), attrs)
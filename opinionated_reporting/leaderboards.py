@@ -0,0 +1,198 @@
+"""
+Top-N of a dimension by a measure per period, e.g. the top 20 customers by revenue this quarter,
+read from a small table of per-period sums that refreshes keep up to date.
+
+    class ReportingMeta:
+        leaderboards = (
+            Leaderboard('total', 'customer', date='ordered_on', grain='quarter'),
+            Leaderboard('quantity', 'product', date='ordered_on', grain='month'),
+        )
+
+    OrderedProductFact.top('total', 'customer', grain='quarter', n=20)
+
+Every refresh, delete and soft delete moves the fact's old contribution out of its old period
+and member and adds the new one, so facts can move between periods. Facts deleted or changed
+outside of the refresh methods (or `rebuild` with SQL) need `rebuild_leaderboards`.
+"""
+from collections import OrderedDict
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from . import fields
+
+GRAINS = ('day', 'month', 'quarter', 'year', 'all')
+
+
+def period_of(date, grain):
+    if date is None:
+        return None
+    elif grain == 'day':
+        return date.isoformat()
+    elif grain == 'month':
+        return date.strftime('%Y-%m')
+    elif grain == 'quarter':
+        return '{}-Q{}'.format(date.year, (date.month - 1) // 3 + 1)
+    elif grain == 'year':
+        return str(date.year)
+    return ''
+
+
+class Leaderboard(object):
+
+    def __init__(self, measure, dimension, date, grain='month'):
+        if grain not in GRAINS:
+            raise Exception('grain must be one of {}'.format(', '.join(GRAINS)))
+        self.measure = measure
+        self.dimension = dimension
+        self.date = date
+        self.grain = grain
+        self.fact_class = None
+
+    def contribute_to_class(self, fact_class):
+        self.fact_class = fact_class
+        self.label = fact_class._meta.label
+        self.measure_field = fact_class._meta.get_field(self.measure)
+        self.dimension_attname = fact_class._meta.get_field(self.dimension).attname
+        self.date_attname = fact_class._meta.get_field(self.date).attname
+        return self
+
+    def contribution(self, fact):
+        """
+        (date pk, member, value) the fact adds to this board, None when it adds nothing
+        """
+        member = getattr(fact, self.dimension_attname)
+        value = getattr(fact, self.measure)
+        if isinstance(value, fields.DescriptionFieldOperations):
+            value = value.to_python()
+        if member is None or value is None:
+            return None
+        # as it will be stored, i.e. a float total that is a Decimal once it's read back
+        return getattr(fact, self.date_attname), member, self.measure_field.to_python(value)
+
+    def get_entries(self):
+        from .models import LeaderboardEntry
+        return LeaderboardEntry.objects.filter(
+            fact=self.label, measure=self.measure, dimension=self.dimension, date=self.date, grain=self.grain)
+
+    def get_periods(self, date_pks):
+        from .models import DateDimension
+        if self.grain == 'all':
+            return {pk: '' for pk in date_pks}
+        return {pk: period_of(date, self.grain) for pk, date in DateDimension.objects.filter(pk__in=date_pks).values_list('pk', 'date')}
+
+    def apply(self, deltas):
+        """
+        Adds `deltas` ({(date pk, member): value}) to the entries
+        """
+        from .models import LeaderboardEntry
+        periods = self.get_periods(set(date_pk for date_pk, member in deltas if date_pk is not None))
+        by_period = OrderedDict()
+        for (date_pk, member), delta in deltas.items():
+            period = periods.get(date_pk, '' if self.grain == 'all' else None)
+            if period is None:
+                continue
+            by_period[(period, member)] = by_period.get((period, member), 0) + delta
+        entries = self.get_entries()
+        for (period, member), delta in by_period.items():
+            if not delta:
+                continue
+            if entries.filter(period=period, member=member).update(value=F('value') + delta):
+                continue
+            try:
+                with transaction.atomic(using=router.db_for_write(LeaderboardEntry)):
+                    LeaderboardEntry.objects.create(fact=self.label, measure=self.measure, dimension=self.dimension,
+                                                    date=self.date, grain=self.grain, period=period, member=member, value=delta)
+            except IntegrityError:  # created by someone else in the meantime
+                entries.filter(period=period, member=member).update(value=F('value') + delta)
+
+    def get_sums(self):
+        """
+        (date pk, member, sum) of every member on every date, from the facts
+        """
+        return self.fact_class._default_manager.filter(**{'{}__isnull'.format(self.dimension_attname): False}).values_list(
+            self.date_attname, self.dimension_attname).annotate(value=Sum(self.measure)).order_by()
+
+    def rebuild(self):
+        """
+        Recomputes every entry from the facts
+        """
+        deltas = OrderedDict()
+        for date_pk, member, value in self.get_sums():
+            deltas[(date_pk, member)] = value
+        self.get_entries().delete()
+        self.apply(deltas)
+
+    def top(self, period, n=20):
+        """
+        [(member pk, value), ...] of the `n` largest members of `period`
+        """
+        return list(self.get_entries().filter(period=period).exclude(value=0).order_by('-value', 'member')
+                    .values_list('member', 'value')[:n])
+
+
+class Tracker(object):
+    """
+    Collects how the facts of a refresh move between periods and members, and applies it with `flush`
+    """
+
+    def __init__(self, fact_class):
+        self.boards = get_leaderboards(fact_class)
+        self.deltas = [OrderedDict() for board in self.boards]
+
+    def _contributes(self, fact):
+        contributes = fact.__dict__.get('_leaderboard_contributes')
+        if contributes is None:  # as read from the database
+            return bool(fact.pk) and not getattr(fact, '_is_deleted', False)
+        return contributes
+
+    def _move(self, fact, sign):
+        for board, deltas in zip(self.boards, self.deltas):
+            contribution = board.contribution(fact)
+            if contribution is not None:
+                date_pk, member, value = contribution
+                deltas[(date_pk, member)] = deltas.get((date_pk, member), 0) + sign * value
+        fact.__dict__['_leaderboard_contributes'] = sign > 0
+
+    def remove(self, fact):
+        if self.boards and self._contributes(fact):
+            self._move(fact, -1)
+
+    def add(self, fact):
+        if self.boards and not self._contributes(fact):
+            self._move(fact, 1)
+
+    def flush(self):
+        for board, deltas in zip(self.boards, self.deltas):
+            if deltas:
+                board.apply(deltas)
+        self.deltas = [OrderedDict() for board in self.boards]
+
+
+def get_leaderboards(fact_class):
+    boards = fact_class.__dict__.get('_leaderboards')
+    if boards is None:
+        boards = [board.contribute_to_class(fact_class) for board in getattr(fact_class.ReportingMeta, 'leaderboards', ())]
+        fact_class._leaderboards = boards
+    return boards
+
+
+def get_leaderboard(fact_class, measure, dimension, grain, date=None):
+    for board in get_leaderboards(fact_class):
+        if (board.measure, board.dimension, board.grain) == (measure, dimension, grain) and date in (None, board.date):
+            return board
+    raise Exception('{} has no leaderboard of {} by {} per {}, add it to `ReportingMeta.leaderboards`'.format(
+        fact_class.__name__, measure, dimension, grain))
+
+
+def top(fact_class, measure, dimension, grain='month', period=None, n=20, date=None):
+    """
+    [(dimension row, value), ...], `period` is today's by default, e.g. '2018-Q3' for a quarter
+    """
+    board = get_leaderboard(fact_class, measure, dimension, grain, date)
+    if period is None:  # in settings.TIME_ZONE like the DateDimension rows, not the request's timezone
+        from .models import local_tz
+        period = period_of(timezone.localtime(timezone.now(), local_tz).date(), grain)
+    leaders = board.top(period, n=n)
+    dimension_model = fact_class._meta.get_field(dimension).related_model
+    rows = dimension_model._default_manager.in_bulk([member for member, value in leaders])
+    return [(rows.get(member), value) for member, value in leaders]
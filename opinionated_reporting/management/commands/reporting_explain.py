@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from opinionated_reporting import explain, models
+
+
+class Command(BaseCommand):
+    help = "Explains the report queries run against each fact, flags full scans and sorts, and suggests `ReportingMeta.indexes`"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', default=[], help='app_label.Model to explain, every fact when left out')
+        parser.add_argument('--verbose-plans', action='store_true', help='print the plan of every query, not only the flagged ones')
+
+    def handle(self, *args, **options):
+        for model in models.get_reporting_models(models.BaseFact):
+            if options['model'] and model._meta.label not in options['model']:
+                continue
+            plans = explain.explain_fact(model)
+            self.stdout.write(model._meta.label)
+            for plan in plans:
+                problems = ['full scan of {}'.format(table) for table in plan.scans] + plan.temp_btrees
+                self.stdout.write('  {:<50} {}'.format(plan.label, '; '.join(problems) or 'ok'))
+                if plan.flagged or options['verbose_plans']:
+                    for line in plan.lines:
+                        self.stdout.write('      {}'.format(line))
+
+            suggestions = explain.get_suggestions(plans, model)
+            if suggestions:
+                self.stdout.write('  suggested, in {}.ReportingMeta:'.format(model.__name__))
+                self.stdout.write('    indexes = (')
+                for columns, size in suggestions.items():
+                    self.stdout.write('        {!r},  # ~{}'.format(columns, explain.format_size(size)))
+                self.stdout.write('    )')
+            self.stdout.write('')
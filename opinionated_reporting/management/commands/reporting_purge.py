@@ -0,0 +1,21 @@
+import datetime
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from opinionated_reporting import models
+
+
+class Command(BaseCommand):
+    help = "Deletes the facts soft deleted by `delete_when`, in batches, e.g. from an off-peak cron"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='facts deleted per statement')
+        parser.add_argument('--older-than', type=int, default=0, help='only purge facts deleted more than this many minutes ago')
+        parser.add_argument('--model', action='append', default=[], help='app_label.Model to purge, every fact when left out')
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - datetime.timedelta(minutes=options['older_than']) if options['older_than'] else None
+        for model in models.get_reporting_models(models.BaseFact):
+            if options['model'] and model._meta.label not in options['model']:
+                continue
+            count = model.purge_deleted(batch_size=options['batch_size'], older_than=older_than)
+            self.stdout.write('{:<40} {:>10}'.format(model._meta.label, count))
@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand
+from opinionated_reporting import models
+
+
+class Command(BaseCommand):
+    help = "Prints how many facts and dimensions are dirty and how far behind reporting is"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='print json instead of a table')
+
+    def handle(self, *args, **options):
+        rows = []
+        for model in models.get_reporting_models():
+            backlog = model.backlog()
+            rows.append({
+                'model': model._meta.label,
+                'dirty': backlog['dirty'],
+                'oldest_dirty': backlog['oldest'].isoformat() if backlog['oldest'] else None,
+                'lag_seconds': backlog['lag'],
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps({'backlog': rows}, indent=2))  # refresh stats live in the refreshing processes, see the hooks
+            return
+
+        self.stdout.write('{:<40} {:>10} {:>12}  {}'.format('model', 'dirty', 'lag (s)', 'oldest dirty'))
+        for row in rows:
+            self.stdout.write('{model:<40} {dirty:>10} {lag_seconds:>12.1f}  {oldest}'.format(oldest=row['oldest_dirty'] or '-', **row))
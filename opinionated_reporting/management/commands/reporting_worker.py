@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from opinionated_reporting import models
+
+
+class Command(BaseCommand):
+    help = "Refreshes dirty facts and dimensions, run as many of these side by side as you like"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='facts claimed at a time')
+        parser.add_argument('--lease', type=int, default=300, help='seconds before a claim from a crashed worker is taken over')
+        parser.add_argument('--sleep', type=float, default=5, help='seconds to wait when there is nothing to do')
+        parser.add_argument('--once', action='store_true', help='stop when there is nothing left to do')
+
+    def handle(self, *args, **options):
+        reporting_models = models.get_reporting_models()
+        while True:
+            claimed = 0
+            for model in reporting_models:
+                if models.ChangeJournal.is_journaled(model):
+                    claimed += models.ChangeJournal.consume(model, batch_size=options['batch_size'])
+                else:
+                    claimed += model.refresh_claimed(batch_size=options['batch_size'], lease=options['lease'])
+            if claimed:
+                continue
+            elif options['once']:
+                break
+            time.sleep(options['sleep'])
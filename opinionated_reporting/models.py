@@ -1,10 +1,16 @@
 import datetime
+import hashlib
+import itertools
+import uuid
 from contextlib import contextmanager
-from django.db import models
+from django.db import connections, models, router, transaction
 from django.apps import apps
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.db import IntegrityError
-from . import fields
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import aio, buckets, fields, leaderboards, rows, sampling, sql, stats
 import pytz
 
 
@@ -36,12 +42,13 @@ class UpdatingModelMeta(models.base.ModelBase):
                 reporting_model = apps.get_model(reporting_model)
 
             reporting_fields = getattr(reporting_meta, 'fields', [])
+            scaled_decimals = getattr(reporting_meta, 'scaled_decimals', False)
             fields_to_create = list(filter(None, [field_name for field_name in reporting_fields if not hasattr(new_class, field_name)]))
 
             # add the fields defined in the metaclass
             for model_field in reporting_model._meta.fields:
                 field_name = model_field.name
-                handler = FieldHandler(model_field)
+                handler = FieldHandler(model_field, scaled=scaled_decimals is True or field_name in (scaled_decimals or ()))
                 if isinstance(model_field, models.ForeignKey):
                     continue  # FKs have to be manually linked with DimensionFK classes
                 # add the unique identifer based on the type
@@ -54,13 +61,24 @@ class UpdatingModelMeta(models.base.ModelBase):
                 else:
                     if handler.is_valid_field_type:
                         new_class.add_to_class(field_name, handler.model_field_class(**handler.field_kwargs))
+
+            # field name tuples (or Index()es) that makemigrations creates like `Meta.indexes`, see `reporting_explain`
+            indexes = [index if isinstance(index, models.Index) else models.Index(fields=list(index))
+                       for index in getattr(reporting_meta, 'indexes', ())]
+            for index in indexes:
+                if not index.name:
+                    index.set_name_with_model(new_class)
+            if indexes:
+                new_class._meta.indexes = list(new_class._meta.indexes) + indexes
+                new_class._meta.original_attrs['indexes'] = new_class._meta.indexes  # what migrations read
         return new_class
 
 
 class FieldHandler(object):
 
-    def __init__(self, model_field):
+    def __init__(self, model_field, scaled=False):
         self.model_field = model_field
+        self.scaled = scaled  # decimals are stored as whole numbers of their smallest unit, see `fields.ScaledDecimalField`
 
     @property
     def is_valid_field_type(self):
@@ -80,6 +98,8 @@ class FieldHandler(object):
         """
         Cannot have two AutoFields on a model, so turn any AutoField into a PositiveIntegerField
         """
+        if isinstance(self.model_field, models.DecimalField) and self.scaled:
+            return fields.ScaledDecimalField
         return models.PositiveIntegerField if isinstance(self.model_field, models.AutoField) else self.model_field.__class__
 
     @property
@@ -103,14 +123,35 @@ class FieldHandler(object):
         return kwargs
 
 
+def get_reporting_models(base=None):
+    """
+    Every installed, concrete fact and dimension (or only the subclasses of `base`)
+    """
+    base = base or UpdatingModel
+    return [model for model in apps.get_models() if issubclass(model, base)]
+
+
 def assert_instance(fn):
     # actually, cls is a class or instance
-    def wrapped(cls, instance):
-        assert isinstance(instance, cls.ReportingMeta.business_model), "{} is not a {}".format(instance, cls.ReportingMeta.business_model)
-        return fn(cls, instance)
+    def wrapped(cls, instance, *args, **kwargs):
+        business_model = cls.ReportingMeta.business_model
+        assert isinstance(instance, business_model) or (isinstance(instance, rows.Row) and instance.business_model is business_model), \
+            "{} is not a {}".format(instance, business_model)
+        return fn(cls, instance, *args, **kwargs)
     return wrapped
 
 
+def resolve_path(instance, path):
+    """
+    Follows an ORM style path (`order__customer`) across instances, None along the way is None
+    """
+    for name in path.split('__'):
+        if instance is None:
+            return None
+        instance = getattr(instance, name)
+    return instance
+
+
 def datetime_is_naive(d):
     return True if d.tzinfo is None or d.tzinfo.utcoffset(d) is None else False
 
@@ -147,6 +188,7 @@ def get_related_record_from(val, field):
             try:
                 yield field.related_model._default_manager.get(_unique_identifier=dim_unique_id)
             except field.related_model.DoesNotExist:  # dimension doesnt exist, need to create it
+                stats.record(field.related_model, stats.EVENT_DIMENSION_CREATED)
                 yield field.related_model.record_update(val)
         else:
             yield field.related_model._default_manager.get(_unique_identifier=0)
@@ -158,6 +200,10 @@ class UpdatingModel(models.Model, metaclass=UpdatingModelMeta):  # NOQA
     # note: there is an implicit `_unique_identifier` field here that comes from the metaclass
     _is_dirty = models.BooleanField(default=False)  # updated via signals from the originating model
     _is_frozen = models.BooleanField(default=False)  # will not allow changes or deletions (e.g. archived if underlying data changes)
+    _updated_on = models.DateTimeField(auto_now=True, null=True, db_index=True)  # lets in-memory copies refresh only what changed
+    _dirty_since = models.DateTimeField(null=True, blank=True)  # when it first went dirty, for measuring how far behind reporting is
+    _lease_token = models.CharField(max_length=32, null=True, blank=True)  # the worker refreshing it, see `claim_dirty`
+    _leased_until = models.DateTimeField(null=True, blank=True)  # after which a crashed worker's claim can be taken over
 
     @classmethod
     def freeze(cls, instance):
@@ -168,25 +214,398 @@ class UpdatingModel(models.Model, metaclass=UpdatingModelMeta):  # NOQA
     @classmethod
     def mark_dirty(cls, instance):
         unique_id = cls.get_reporting_fact_id(instance)
-        cls._default_manager.filter(_unique_identifier=unique_id).update(_is_dirty=True)
+        cls._base_manager.filter(_unique_identifier=unique_id).update(**cls.dirty_values())
+
+    @classmethod
+    def dirty_values(cls):
+        """
+        What marking a row dirty updates. `_dirty_since` keeps the first time it went dirty, unless a worker
+        holds it (see `claim_dirty`): that refresh may have read the record already, so this is a new change
+        and the moved `_dirty_since` keeps the worker from clearing it.
+        """
+        now = models.Value(timezone.now(), output_field=models.DateTimeField())
+        return {
+            '_is_dirty': True,
+            '_dirty_since': models.Case(models.When(_lease_token__isnull=False, then=now),
+                                        default=Coalesce(models.F('_dirty_since'), now)),
+        }
 
     @classmethod
     def record_update(cls, instance, force=False):
-        fact = cls.get_reporting_fact(instance)
+        return cls._apply_update(cls.get_reporting_fact(instance), instance, force=force)
+
+    @classmethod
+    async def arecord_update(cls, instance, force=False):
+        """
+        `record_update` for asyncio code, see `aio`
+        """
+        return await aio.arecord_update(cls, instance, force=force)
+
+    @classmethod
+    async def arecord_update_many(cls, instances, force=False, batch_size=500):
+        return await aio.arecord_update_many(cls, instances, force=force, batch_size=batch_size)
+
+    @classmethod
+    async def amark_dirty(cls, instance):
+        return await aio.amark_dirty(cls, instance)
+
+    @classmethod
+    def record_update_many(cls, instances, force=False, batch_size=500):
+        """
+        `record_update` for many business records, the existing facts of each batch are fetched in one query
+        and written back with one bulk insert and one bulk update
+        """
+        return list(cls._update_many(instances, force=force, batch_size=batch_size))
+
+    @classmethod
+    def _update_many(cls, instances, force=False, batch_size=500, facts=None):
+        """
+        `facts` are the existing facts by `_unique_identifier`, when the caller read them before the records
+        """
+        instances = iter(instances)
+        while True:
+            batch = list(itertools.islice(instances, batch_size))
+            if not batch:
+                break
+            unique_ids = [cls.get_reporting_fact_id(instance) for instance in batch]
+            if facts is None:
+                existing = {fact._unique_identifier: fact for fact in cls._base_manager.filter(_unique_identifier__in=unique_ids)}
+            else:
+                existing = {unique_id: facts[unique_id] for unique_id in unique_ids if unique_id in facts}
+            pending = []
+            facts = []
+            prepared = cls._prepare_batch(batch)
+            tracker = leaderboards.Tracker(cls)
+            using = router.db_for_write(cls)
+            with stats.timed_batch(cls) as timed, transaction.atomic(using=using):  # the bulk write is timed too
+                for instance, unique_id, dimensions in zip(batch, unique_ids, prepared):
+                    fact = existing.get(unique_id)
+                    if not fact:
+                        fact = existing[unique_id] = cls.new_reporting_fact(unique_id)
+                    facts.append(cls._apply_update(fact, instance, force=force, pending=pending, prepared=dimensions,
+                                                   tracker=tracker, batch=timed))
+                cls._write_many(pending, using=using, batch_size=batch_size)
+                tracker.flush()
+            yield from facts
+
+    @classmethod
+    def _prepare_batch(cls, instances):
+        """
+        The dimension rows of a whole batch, fetched with one query per field. Dates and hours are bucketed
+        at once with `buckets.local_buckets`, other dimensions are found by their `_unique_identifier`
+        (those missing are left to `_update_field`, which creates them). A dict per instance, by field name.
+        """
+        prepared = [{} for instance in instances]
+        for field in cls.get_reporting_fields():
+            if not isinstance(field, fields.DimensionForeignKey):
+                continue
+            values = [cls._get_dimension_source(field, instance) for instance in instances]
+            if not issubclass(field.related_model, (DateDimension, HourDimension)):
+                cls._prepare_dimension(field, values, prepared)
+                continue
+            # naive datetimes, dates and times are already local, `_update_field` takes care of them
+            aware = [i for i, value in enumerate(values) if isinstance(value, datetime.datetime) and not datetime_is_naive(value)]
+            if not aware:
+                continue
+            dates, hours = buckets.local_buckets([values[i] for i in aware], local_tz)
+            manager = field.related_model._default_manager
+            if issubclass(field.related_model, DateDimension):
+                keys = dates
+                table = {dimension.date: dimension for dimension in manager.filter(date__in=set(dates))}
+            else:
+                keys = hours
+                table = {dimension.time.hour: dimension for dimension in manager.all()}
+            for i, key in zip(aware, keys):
+                if key in table:
+                    prepared[i][field.name] = table[key]
+        return prepared
+
+    @classmethod
+    def _prepare_dimension(cls, field, values, prepared):
+        unique_field_name = field.related_model.ReportingMeta.unique_identifier
+        # like `get_related_record_from`, no record or no id is the empty row
+        keys = [(getattr(value, unique_field_name) or 0) if value else 0 for value in values]
+        table = {dimension._unique_identifier: dimension
+                 for dimension in field.related_model._default_manager.filter(_unique_identifier__in=set(keys))}
+        for i, key in enumerate(keys):
+            if key in table:
+                prepared[i][field.name] = table[key]
+
+    @classmethod
+    def rebuild(cls, queryset=None):
+        """
+        Refreshes every fact (or the facts of the business records in `queryset`) from scratch.
+        When the whole fact compiles to SQL it is a single INSERT ... SELECT, otherwise it falls back
+        to `record_update_many`, see `get_compile_blockers` for why.
+        Returns the number of facts written.
+        """
+        compiled = sql.CompiledRefresh(cls)
+        if compiled.is_compilable:
+            count = compiled.execute(queryset)
+            cls.rebuild_leaderboards()  # the database did the work, nothing was tracked
+            return count
+        if getattr(cls.ReportingMeta, 'related_paths', None) is not None:
+            return cls.record_update_values(queryset)
+        if queryset is None:
+            queryset = cls.ReportingMeta.business_model._default_manager.all()
+        return len([fact for fact in cls.record_update_many(queryset.iterator(), force=True) if fact is not None])
+
+    @classmethod
+    def get_row_paths(cls):
+        """
+        Every path on the business model a refresh from `rows.Row`s reads: the fields, string aliases,
+        what a missing dimension is created from, and `ReportingMeta.related_paths` for everything
+        lambdas (`computed`, `dimension_aliases`, `delete_when`) read.
+        """
+        business_model = cls.ReportingMeta.business_model
+        paths = [cls.ReportingMeta.unique_identifier]
+        for field in cls.get_reporting_fields():
+            try:
+                path = sql.source_path(cls, field)
+            except sql.NotCompilable:
+                continue  # a lambda, it has to be covered by `related_paths`
+            dimension = field.related_model if isinstance(field, fields.DimensionForeignKey) else None
+            if dimension is None or not hasattr(dimension, 'ReportingMeta'):
+                paths.append(path)
+            elif sql.resolve_field(business_model, path).is_relation:
+                paths += ['{}__{}'.format(path, dimension_path) for dimension_path in dimension.get_row_paths()]
+        return list(dict.fromkeys(paths + list(getattr(cls.ReportingMeta, 'related_paths', None) or ())))
+
+    @classmethod
+    def get_select_related(cls):
+        """
+        The relations of the business model `get_row_paths` goes through, for select_related()
+        """
+        related = []
+        for path in cls.get_row_paths():
+            model, parts = cls.ReportingMeta.business_model, []
+            for part in path.split('__'):
+                try:
+                    field = model._meta.get_field(part)
+                except FieldDoesNotExist:
+                    break
+                if not field.is_relation or field.many_to_many or field.one_to_many:
+                    break
+                parts.append(part)
+                model = field.related_model
+            if parts:
+                related.append('__'.join(parts))
+        return list(dict.fromkeys(related))
+
+    @classmethod
+    def iter_rows(cls, queryset=None, chunk_size=2000):
+        """
+        The business records as `rows.Row`s, streamed from values_list() without building model instances
+        """
+        if queryset is None:
+            queryset = cls.ReportingMeta.business_model._default_manager.all()
+        return rows.RowReader(cls.ReportingMeta.business_model, cls.get_row_paths()).read(queryset, chunk_size=chunk_size)
+
+    @classmethod
+    def record_update_values(cls, queryset=None, force=True, batch_size=500):
+        """
+        `record_update_many` over `iter_rows`, for rebuilding millions of facts. Returns the number of facts written.
+        """
+        return sum(1 for fact in cls._update_many(cls.iter_rows(queryset, chunk_size=batch_size), force=force, batch_size=batch_size)
+                   if fact is not None)
+
+    @classmethod
+    def rebuild_leaderboards(cls):
+        for board in leaderboards.get_leaderboards(cls):
+            board.rebuild()
+
+    @classmethod
+    def top(cls, measure, dimension, grain='month', period=None, n=20, date=None):
+        """
+        The `n` dimension rows with the largest `measure` in `period`, see `leaderboards`
+        """
+        return leaderboards.top(cls, measure, dimension, grain=grain, period=period, n=n, date=date)
+
+    @classmethod
+    def get_compile_blockers(cls):
+        """
+        The fields (as `sql.NotCompilable`s) that keep `rebuild` from running in the database
+        """
+        return sql.CompiledRefresh(cls).blockers
+
+    @classmethod
+    def _write_many(cls, facts, using=None, batch_size=500):
+        """
+        One INSERT for the new facts and one UPDATE for the changed ones, per batch
+        """
+        unique = list({id(fact): fact for fact in facts}.values())
+        created = [fact for fact in unique if fact.pk is None]
+        changed = [fact for fact in unique if fact.pk is not None]
+        if created:
+            cls._base_manager.db_manager(using).bulk_create(created, batch_size=batch_size)
+        if changed:
+            now = timezone.now()
+            for fact in changed:
+                fact._updated_on = now  # bulk_update skips auto_now
+            field_names = [field.name for field in cls._meta.concrete_fields
+                           if not field.primary_key and field.name not in ('_is_dirty', '_dirty_since')]
+            cls._base_manager.db_manager(using).bulk_update(changed, field_names, batch_size=batch_size)
+            cls._clear_dirty(changed, using=using)
+
+    @classmethod
+    def _clear_dirty(cls, facts, using=None):
+        """
+        Clears the dirty flag of refreshed facts, unless they were marked dirty again since they were read.
+        `_read_dirty` is the (`_is_dirty`, `_dirty_since`) a fact was read with, clean ones are left alone.
+        """
+        by_dirty_since = {}
+        for fact in facts:
+            is_dirty, dirty_since = fact.__dict__.get('_read_dirty', (False, None))
+            if is_dirty:
+                by_dirty_since.setdefault(dirty_since, []).append(fact.pk)
+        manager = cls._base_manager.db_manager(using)
+        for dirty_since, pks in by_dirty_since.items():
+            manager.filter(pk__in=pks, _dirty_since=dirty_since).update(_is_dirty=False, _dirty_since=None)
+
+    @classmethod
+    def refresh_dirty(cls, batch_size=500):
+        """
+        Refreshes every dirty fact from its business record, returns how many were looked at
+        """
+        count = 0
+        while True:
+            unique_ids = list(cls._base_manager.filter(_is_dirty=True, _is_frozen=False).values_list('_unique_identifier', flat=True)[:batch_size])
+            if not unique_ids:
+                break
+            cls._refresh_unique_ids(unique_ids, batch_size=batch_size)
+            count += len(unique_ids)
+        return count
+
+    @classmethod
+    def _refresh_unique_ids(cls, unique_ids, batch_size=500, force=False):
+        unique_field_name = cls.ReportingMeta.unique_identifier
+        business_manager = cls.ReportingMeta.business_model._default_manager
+        # the facts first, so a record changed after it was read has moved its fact's `_dirty_since`
+        facts = {fact._unique_identifier: fact for fact in cls._base_manager.filter(_unique_identifier__in=unique_ids)}
+        instances = list(business_manager.select_related(*cls.get_select_related()).filter(**{'{}__in'.format(unique_field_name): unique_ids}))
+        list(cls._update_many(instances, force=force, batch_size=batch_size, facts=facts))
+        # the business record is gone, so the fact can't be refreshed, don't keep trying
+        found = set(cls.get_reporting_fact_id(instance) for instance in instances)
+        missing = [unique_id for unique_id in unique_ids if unique_id not in found]
+        if missing:
+            cls._base_manager.filter(_unique_identifier__in=missing).update(_is_dirty=False)
+
+    @classmethod
+    def claim_dirty(cls, batch_size=500, lease=300):
+        """
+        Claims up to `batch_size` dirty facts for one worker, so several workers never refresh the same fact.
+        Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED where the database has it, and on every
+        database the claim is a lease that other workers can take over after `lease` seconds.
+        Returns the claim's token and the `_unique_identifier`s claimed, release it with `release_claim`.
+        """
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        using = router.db_for_write(cls)
+        manager = cls._base_manager.db_manager(using)
+        claimable = manager.filter(_is_dirty=True, _is_frozen=False).filter(
+            models.Q(_leased_until__isnull=True) | models.Q(_leased_until__lt=now))
+        with transaction.atomic(using=using):
+            if connections[using].features.has_select_for_update_skip_locked:
+                pks = list(claimable.select_for_update(skip_locked=True).values_list('pk', flat=True)[:batch_size])
+            else:
+                pks = list(claimable.values_list('pk', flat=True)[:batch_size])
+            # re-checks the lease, so of two workers that read the same rows only one gets each
+            claimable.filter(pk__in=pks).update(_lease_token=token, _leased_until=now + datetime.timedelta(seconds=lease))
+        unique_ids = list(manager.filter(_lease_token=token).values_list('_unique_identifier', flat=True))
+        return token, unique_ids
+
+    @classmethod
+    def release_claim(cls, token):
+        return cls._base_manager.filter(_lease_token=token).update(_lease_token=None, _leased_until=None)
+
+    @classmethod
+    def refresh_claimed(cls, batch_size=500, lease=300):
+        """
+        One worker round: claims a batch of dirty facts, refreshes them and releases the claim.
+        Returns how many were claimed, 0 when there is nothing left for this worker.
+        """
+        token, unique_ids = cls.claim_dirty(batch_size=batch_size, lease=lease)
+        try:
+            if unique_ids:
+                cls._refresh_unique_ids(unique_ids, batch_size=batch_size)
+        finally:
+            cls.release_claim(token)
+        return len(unique_ids)
+
+    @classmethod
+    def _apply_update(cls, fact, instance, force=False, pending=None, prepared=None, tracker=None, batch=None):
+        """
+        Refreshes the fact from `instance` and saves it, or leaves it on `pending` (and its leaderboard
+        changes on `tracker`, its stats on `batch`) for the caller to write
+        """
+        if tracker is None:
+            tracker = leaderboards.Tracker(cls)
+            fact = cls._apply_update(fact, instance, force=force, prepared=prepared, tracker=tracker)
+            tracker.flush()
+            return fact
+
         if fact._is_frozen:
+            stats.record(cls, stats.EVENT_FROZEN_SKIP)
             return fact  # refuse to make any changes
 
         if hasattr(cls, 'delete_when') and callable(cls.delete_when):
             if cls.delete_when(instance):
-                if fact.id:  # may not be saved yet
-                    fact.delete()
+                if not fact.id:
+                    return None  # never saved, so there is nothing to delete and nothing to create
+                tracker.remove(fact)
+                if getattr(cls.ReportingMeta, 'soft_delete', False):
+                    if not fact._is_deleted:
+                        fact._is_deleted, fact._is_dirty, fact._dirty_since = True, False, None
+                        cls._base_manager.filter(pk=fact.pk).update(
+                            _is_deleted=True, _is_dirty=False, _dirty_since=None, _updated_on=timezone.now())
+                        stats.record(cls, stats.EVENT_DELETE)
                     return None
+                fact.delete()
+                stats.record(cls, stats.EVENT_DELETE)
+                return None
 
         if fact._is_dirty or force:
-            fact._record_update(instance)
-            fact.save()
+            with (stats.timed_refresh(cls) if batch is None else batch.refresh()) as refresh:
+                tracker.remove(fact)
+                fact._record_update(instance, prepared)
+                if getattr(fact, '_is_deleted', False):
+                    fact._is_deleted = False  # `delete_when` doesn't match anymore, bring it back
+                changed = fact._fingerprint_changed() or not fact.pk
+                fact._read_dirty = (fact._is_dirty, fact._dirty_since)
+                if not changed:
+                    # nothing to write, at most the dirty flag needs clearing
+                    if fact._is_dirty:
+                        cls._clear_dirty([fact])
+                    refresh.update({'event': stats.EVENT_UNCHANGED, 'rows_written': 0})
+                fact._is_dirty = False
+                fact._dirty_since = None
+                tracker.add(fact)
+                if changed and pending is None:
+                    fact.save()
+                elif changed:
+                    pending.append(fact)
+        else:
+            stats.record(cls, stats.EVENT_SKIP)
         return fact
 
+    def _fingerprint_changed(self):
+        """
+        Facts are always written, see `BaseDimension`
+        """
+        return True
+
+    @classmethod
+    def backlog(cls):
+        """
+        How many facts are waiting on a refresh, and how long the oldest has been waiting
+        """
+        if ChangeJournal.is_journaled(cls):
+            return ChangeJournal.backlog(cls)
+        dirty = cls._base_manager.filter(_is_dirty=True, _is_frozen=False)
+        summary = dirty.aggregate(dirty=models.Count('pk'), oldest=models.Min('_dirty_since'))
+        summary['lag'] = (timezone.now() - summary['oldest']).total_seconds() if summary['oldest'] else 0
+        return summary
+
     @classmethod
     @assert_instance
     def get_reporting_fact_id(cls, instance):
@@ -196,55 +615,132 @@ class UpdatingModel(models.Model, metaclass=UpdatingModelMeta):  # NOQA
     def get_reporting_fact(cls, instance):
         unique_id = cls.get_reporting_fact_id(instance)
         try:
-            return cls._default_manager.get(_unique_identifier=unique_id)
+            # including soft deleted facts, so they come back instead of being duplicated
+            return cls._base_manager.get(_unique_identifier=unique_id)
         except cls.DoesNotExist:
-            return cls(_is_dirty=True, _unique_identifier=unique_id)
+            return cls.new_reporting_fact(unique_id)
+
+    @classmethod
+    def new_reporting_fact(cls, unique_id):
+        return cls(_is_dirty=True, _dirty_since=timezone.now(), _unique_identifier=unique_id)
 
     @classmethod
     def needs_update(cls, instance):
         fact = cls.get_reporting_fact(instance)
         return fact._is_dirty
 
+    @classmethod
+    def get_reporting_fields(cls):
+        return [field for field in cls._meta.fields if not field.name.startswith('_') and not field.primary_key]  # ignore my internal fields
+
     @assert_instance
-    def _record_update(self, instance):
+    def _record_update(self, instance, prepared=None):
         if self._is_frozen:
             return
-        for field in self._meta.fields:
-            field_name = field.name
-            if field_name.startswith('_') or field.primary_key:  # ignore my internal fields
-                continue
+        for field in self.get_reporting_fields():
+            if prepared and field.name in prepared:
+                setattr(self, field.name, prepared[field.name])
+            else:
+                self._update_field(field, instance)
 
-            val = getattr(instance, field_name, None)
-
-            if isinstance(field, fields.HandleFieldArgs):
-                val = getattr(self, field_name).value_from_instance(instance)
-                setattr(self, field_name, val)
-
-            elif isinstance(field, fields.DimensionForeignKey):
-
-                # do we need to compute the value
-                computed_lookup = self.ReportingMeta.dimension_aliases.get(field_name, None)
-                if computed_lookup and callable(computed_lookup):
-                    val = computed_lookup(instance)
-                # Store dates and times for reporting in the local tz from setting
-                if issubclass(field.related_model, DateDimension):
-                    with get_date_from_datetime(val) as date:
-                        setattr(self, field_name, field.related_model._default_manager.get(date=date))
-                elif issubclass(field.related_model, HourDimension):
-                    with get_time_from(val) as time:
-                        setattr(self, field_name, field.related_model._default_manager.get(time=time))
-                else:
-                    with get_related_record_from(val, field) as record:
-                        setattr(self, field_name, record)
+    @classmethod
+    def _get_dimension_source(cls, field, instance):
+        """
+        What a dimension field is looked up from, through `dimension_aliases`
+        """
+        computed_lookup = getattr(cls.ReportingMeta, 'dimension_aliases', {}).get(field.name, None)
+        if computed_lookup and callable(computed_lookup):
+            return computed_lookup(instance)
+        elif computed_lookup:  # a path, e.g. 'order__created_on'
+            return resolve_path(instance, computed_lookup)
+        return getattr(instance, field.name, None)
+
+    def _update_field(self, field, instance):
+        field_name = field.name
+        val = getattr(instance, field_name, None)
 
+        if isinstance(field, fields.HandleFieldArgs):
+            val = getattr(self, field_name).value_from_instance(instance)
+            setattr(self, field_name, val)
+
+        elif isinstance(field, fields.DimensionForeignKey):
+            val = self._get_dimension_source(field, instance)
+            # Store dates and times for reporting in the local tz from setting
+            if issubclass(field.related_model, DateDimension):
+                with get_date_from_datetime(val) as date:
+                    setattr(self, field_name, field.related_model._default_manager.get(date=date))
+            elif issubclass(field.related_model, HourDimension):
+                with get_time_from(val) as time:
+                    setattr(self, field_name, field.related_model._default_manager.get(time=time))
             else:
-                setattr(self, field_name, val)
+                with get_related_record_from(val, field) as record:
+                    setattr(self, field_name, record)
+
+        else:
+            setattr(self, field_name, val)
 
     class Meta:
         abstract = True
 
 
 class BaseDimension(UpdatingModel):
+    """
+    Dimension rows carry a fingerprint of their `ReportingMeta.fields`, so refreshing a
+    dimension whose business record didn't change (e.g. every order of a customer) doesn't write it.
+    """
+    _fingerprint = models.CharField(max_length=40, default='', blank=True, editable=False)
+
+    def get_fingerprint(self):
+        connection = connections[router.db_for_write(self.__class__)]
+        # prepared for the database, so 5.0 and Decimal('5.00') are the same price
+        values = [field.get_db_prep_save(field.value_from_object(self), connection) for field in self.get_reporting_fields()]
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    def _fingerprint_changed(self):
+        fingerprint = self.get_fingerprint()
+        changed = fingerprint != self._fingerprint
+        self._fingerprint = fingerprint
+        return changed
+
+    @classmethod
+    def sync_dimension(cls, queryset=None, batch_size=500):
+        """
+        Brings the whole dimension (or the records in `queryset`) up to date, reading the existing
+        fingerprints with one SELECT and only writing the rows that are new or changed.
+        Returns the number of rows created, updated and unchanged.
+        """
+        if queryset is None:
+            queryset = cls.ReportingMeta.business_model._default_manager.all()
+        existing = {row[0]: row[1:] for row in cls._default_manager.values_list(
+            '_unique_identifier', 'pk', '_fingerprint', '_is_frozen', '_is_dirty', '_dirty_since')}
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        using = router.db_for_write(cls)
+        instances = queryset.iterator()
+        while True:
+            batch = list(itertools.islice(instances, batch_size))
+            if not batch:
+                break
+            pending = []
+            for instance in batch:
+                unique_id = cls.get_reporting_fact_id(instance)
+                pk, fingerprint, is_frozen, is_dirty, dirty_since = existing.get(unique_id, (None, None, False, False, None))
+                if is_frozen:
+                    continue
+                dimension = cls.new_reporting_fact(unique_id)
+                dimension._record_update(instance)
+                dimension._is_dirty = False
+                dimension._dirty_since = None
+                dimension._fingerprint = dimension.get_fingerprint()
+                if dimension._fingerprint == fingerprint:
+                    counts['unchanged'] += 1
+                    continue
+                dimension.pk = pk
+                dimension._read_dirty = (is_dirty, dirty_since)
+                counts['created' if pk is None else 'updated'] += 1
+                pending.append(dimension)
+            with transaction.atomic(using=using):
+                cls._write_many(pending, using=using, batch_size=batch_size)
+        return counts
 
     @classmethod
     def init_dimension(cls):
@@ -373,7 +869,183 @@ class HourDimension(models.Model):
                 pass
 
 
+class ChangeJournal(models.Model):
+    """
+    Set `ReportingMeta.journal = True` and saves of the business model append a row here instead
+    of writing `_is_dirty` to the fact table. `consume` refreshes the facts from where it last left off.
+
+    NOTE: `id` is the sequence. A consumer reads past ids that are still in uncommitted transactions,
+    so give it a `settle` delay on databases that run writers side by side.
+    """
+    id = models.BigAutoField(primary_key=True)
+    fact = models.CharField(max_length=255, db_index=True)  # label of the fact class, e.g. 'myapp.OrderedFact'
+    unique_identifier = models.CharField(max_length=255)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def is_journaled(cls, fact_class):
+        return getattr(fact_class.ReportingMeta, 'journal', False)
+
+    @classmethod
+    def append(cls, fact_class, instance):
+        return cls.objects.create(fact=fact_class._meta.label, unique_identifier=fact_class.get_reporting_fact_id(instance))
+
+    @classmethod
+    def get_pending(cls, fact_class, sequence):
+        return cls.objects.filter(fact=fact_class._meta.label, id__gt=sequence).order_by('id')
+
+    @classmethod
+    def consume(cls, fact_class, batch_size=500, settle=0):
+        """
+        Refreshes the facts of the next `batch_size` entries, each fact once, and moves the checkpoint past them.
+        Consumers of the same fact take turns on the checkpoint row. Returns how many entries were consumed.
+        """
+        using = router.db_for_write(cls)
+        JournalCheckpoint.objects.db_manager(using).get_or_create(fact=fact_class._meta.label)
+        with transaction.atomic(using=using):
+            checkpoint = JournalCheckpoint.objects.db_manager(using).select_for_update().get(fact=fact_class._meta.label)
+            entries = cls.get_pending(fact_class, checkpoint.sequence)
+            if settle:
+                entries = entries.filter(created_on__lt=timezone.now() - datetime.timedelta(seconds=settle))
+            entries = list(entries.values_list('id', 'unique_identifier')[:batch_size])
+            if not entries:
+                return 0
+            to_python = fact_class._meta.get_field('_unique_identifier').to_python
+            unique_ids = list(dict.fromkeys(to_python(unique_id) for sequence, unique_id in entries))
+            fact_class._refresh_unique_ids(unique_ids, batch_size=batch_size, force=True)
+            checkpoint.sequence = entries[-1][0]
+            checkpoint.save()
+        return len(entries)
+
+    @classmethod
+    def rewind(cls, fact_class, sequence=0):
+        """
+        Replays the journal from `sequence` on the next `consume`
+        """
+        JournalCheckpoint.objects.update_or_create(fact=fact_class._meta.label, defaults={'sequence': sequence})
+
+    @classmethod
+    def backlog(cls, fact_class):
+        """
+        Entries not consumed yet, in the same shape as `UpdatingModel.backlog`
+        """
+        checkpoint = JournalCheckpoint.objects.filter(fact=fact_class._meta.label).first()
+        pending = cls.get_pending(fact_class, checkpoint.sequence if checkpoint else 0)
+        summary = pending.aggregate(dirty=models.Count('pk'), oldest=models.Min('created_on'))
+        summary['lag'] = (timezone.now() - summary['oldest']).total_seconds() if summary['oldest'] else 0
+        return summary
+
+    @classmethod
+    def trim(cls, fact_class):
+        """
+        Deletes the entries that have been consumed, they can't be replayed after this
+        """
+        checkpoint = JournalCheckpoint.objects.filter(fact=fact_class._meta.label).first()
+        if checkpoint is None:
+            return 0
+        return cls.objects.filter(fact=fact_class._meta.label, id__lte=checkpoint.sequence).delete()[0]
+
+
+class LeaderboardEntry(models.Model):
+    """
+    The sum of a measure for one member of a dimension in one period, see `leaderboards`
+    """
+    fact = models.CharField(max_length=255)
+    measure = models.CharField(max_length=100)
+    dimension = models.CharField(max_length=100)
+    date = models.CharField(max_length=100)
+    grain = models.CharField(max_length=10)
+    period = models.CharField(max_length=10)  # '2018-09-01', '2018-09', '2018-Q3', '2018', or '' for all time
+    member = models.BigIntegerField()  # pk of the dimension row
+    value = models.DecimalField(max_digits=24, decimal_places=6, default=0)
+
+    class Meta:
+        unique_together = (('fact', 'measure', 'dimension', 'date', 'grain', 'period', 'member'),)
+        index_together = (('fact', 'measure', 'dimension', 'date', 'grain', 'period', 'value'),)
+
+
+class JournalCheckpoint(models.Model):
+    fact = models.CharField(max_length=255, unique=True)
+    sequence = models.BigIntegerField(default=0)  # the last `ChangeJournal.id` consumed
+    updated_on = models.DateTimeField(auto_now=True)
+
+
+class FactManager(models.Manager):
+    """
+    Leaves out facts soft deleted by `delete_when`, `_base_manager` still has them
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(_is_deleted=False)
+
+
 class BaseFact(UpdatingModel):
+    """
+    Set `ReportingMeta.soft_delete = True` to have `delete_when` mark facts `_is_deleted`
+    with an UPDATE instead of deleting them, `purge_deleted` removes them later in batches.
+    """
+    _is_deleted = models.BooleanField(default=False, db_index=True)
+    _sample_bucket = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True)  # see `sampling`
+
+    objects = FactManager()
+
+    @classmethod
+    def new_reporting_fact(cls, unique_id):
+        fact = super().new_reporting_fact(unique_id)
+        fact._sample_bucket = cls.get_sample_bucket(unique_id)
+        return fact
+
+    @classmethod
+    def has_integer_identifier(cls):
+        return sampling.is_integer_field(cls._meta.get_field('_unique_identifier'))
+
+    @classmethod
+    def get_sample_bucket(cls, unique_id):
+        return sampling.sample_bucket(unique_id, integer=cls.has_integer_identifier())
+
+    @classmethod
+    def assign_sample_buckets(cls, batch_size=5000):
+        """
+        Fills in `_sample_bucket` where it is missing, i.e. facts from before it existed. Returns how many
+        """
+        missing = cls._base_manager.filter(_sample_bucket__isnull=True)
+        if cls.has_integer_identifier():
+            return missing.update(_sample_bucket=sampling.bucket_expression(models.F('_unique_identifier')))
+        count = 0
+        while True:
+            batch = [cls(pk=pk, _sample_bucket=cls.get_sample_bucket(unique_id))
+                     for pk, unique_id in missing.values_list('pk', '_unique_identifier')[:batch_size]]
+            if not batch:
+                break
+            cls._base_manager.bulk_update(batch, ['_sample_bucket'])
+            count += len(batch)
+        return count
+
+    @classmethod
+    def estimate(cls, sample=0.01, measures=(), queryset=None, confidence=0.95):
+        """
+        The count and sums of `measures` scaled up from the same `sample` of the facts every time, see `sampling`
+        """
+        if queryset is None:
+            queryset = cls._default_manager.all()
+        return sampling.estimate(queryset, sample, measures=measures, confidence=confidence)
+
+    @classmethod
+    def purge_deleted(cls, batch_size=5000, older_than=None):
+        """
+        Deletes soft deleted facts `batch_size` at a time (only those deleted before `older_than`), returns how many
+        """
+        deleted = cls._base_manager.filter(_is_deleted=True, _is_frozen=False)
+        if older_than is not None:
+            deleted = deleted.filter(_updated_on__lt=older_than)
+        count = 0
+        while True:
+            pks = list(deleted.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            cls._base_manager.filter(pk__in=pks).delete()
+            count += len(pks)
+        return count
 
     @classmethod
     def delete_when(self, instance):
@@ -385,3 +1057,52 @@ class BaseFact(UpdatingModel):
 
     class Meta:
         abstract = True
+
+
+class BaseSnapshotFact(models.Model, metaclass=UpdatingModelMeta):
+    """
+    A fact per business record per day, e.g. the price of every product every day.
+    These aren't driven by saves on the business model, a whole day is taken at once
+    with a single INSERT ... SELECT, see `take_snapshot`.
+
+    Fields are the same as an `UpdatingModel`, except `computed` and `dimension_aliases`
+    have to be paths (e.g. 'order__created_on') rather than callables.
+    Subclasses should inherit `Meta` to keep one row per record per day:
+        class Meta(BaseSnapshotFact.Meta):
+            app_label = 'myapp'
+    """
+    snapshot_on = models.ForeignKey(DateDimension, on_delete=models.PROTECT, related_name='%(app_label)s_%(class)s_set')
+
+    @classmethod
+    def get_reporting_fields(cls):
+        return [field for field in cls._meta.concrete_fields
+                if not field.name.startswith('_') and not field.primary_key and field.name != 'snapshot_on']
+
+    @classmethod
+    def get_snapshot_columns(cls, snapshot_on):
+        columns = [
+            ('_unique_identifier', sql.annotation(models.F(cls.ReportingMeta.unique_identifier))),
+            ('snapshot_on', sql.annotation(models.Value(snapshot_on.pk, output_field=models.IntegerField()))),
+        ]
+        for field in cls.get_reporting_fields():
+            columns.append((field.name, sql.compile_field(cls, field)))
+        return columns
+
+    @classmethod
+    def take_snapshot(cls, date=None, queryset=None):
+        """
+        Snapshots every business record (or just `queryset`) for `date`, today by default.
+        Taking the same day again replaces it. Returns the number of records snapshotted.
+        """
+        date = date or timezone.localdate()
+        snapshot_on = DateDimension._default_manager.get(date=date)
+        if queryset is None:
+            queryset = cls.ReportingMeta.business_model._default_manager.all()
+        columns = cls.get_snapshot_columns(snapshot_on)
+        with transaction.atomic(using=router.db_for_write(cls)):
+            cls._default_manager.filter(snapshot_on=snapshot_on).delete()
+            return sql.insert_from_select(cls, columns, queryset)
+
+    class Meta:
+        abstract = True
+        unique_together = (('_unique_identifier', 'snapshot_on'),)
@@ -0,0 +1,172 @@
+"""
+Find out which fact fields and `dimension_aliases` are responsible for the queries
+a refresh runs, and keep them from creeping up in the test suite.
+
+Usage:
+    profile = profile_refresh(OrderedProductFact, sample=100)
+    print(profile.report())
+
+    with assert_max_queries(3000):
+        OrderedProductFact.record_update_many(items, force=True)
+"""
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from django.db import connections, router, transaction
+from . import fields
+
+WHITESPACE = re.compile(r'\s+')
+PLACEHOLDERS = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+
+
+def normalize(sql):
+    """
+    Statements that only differ by their parameters, or by the length of an IN (...), are the same statement
+    """
+    return PLACEHOLDERS.sub('(%s, ...)', WHITESPACE.sub(' ', sql).strip())
+
+
+class Statement(object):
+
+    def __init__(self, sql, params, label, row):
+        self.sql = sql
+        self.params = params
+        self.label = label
+        self.row = row
+
+
+class Pattern(object):
+
+    def __init__(self, label, sql):
+        self.label = label
+        self.sql = sql
+        self.count = 0
+        self.rows = set()
+
+    @property
+    def is_n_plus_one(self):
+        # runs again for every business row instead of once per batch
+        return len(self.rows) > 1
+
+    def __repr__(self):
+        return '{}: {}x {}'.format(self.label, self.count, self.sql)
+
+
+class QueryRecorder(object):
+    """
+    Records every statement run on any connection, tagged with the current `label` and `row`
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.label = None
+        self.row = None
+        self._wrappers = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(Statement(sql, params, self.label, self.row))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrappers = [connection.execute_wrapper(self) for connection in connections.all()]
+        for wrapper in self._wrappers:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(*exc_info)
+        self._wrappers = []
+
+    @contextmanager
+    def labelled(self, label):
+        previous, self.label = self.label, label
+        try:
+            yield
+        finally:
+            self.label = previous
+
+    def patterns(self):
+        patterns = OrderedDict()
+        for statement in self.statements:
+            key = (statement.label, normalize(statement.sql))
+            if key not in patterns:
+                patterns[key] = Pattern(*key)
+            patterns[key].count += 1
+            patterns[key].rows.add(statement.row)
+        return sorted(patterns.values(), key=lambda pattern: -pattern.count)
+
+    def n_plus_one(self):
+        return [pattern for pattern in self.patterns() if pattern.is_n_plus_one]
+
+    def report(self, limit=20):
+        lines = ['{} queries'.format(len(self.statements))]
+        for pattern in self.patterns()[:limit]:
+            lines.append('{:>7}x {}{}: {}'.format(
+                pattern.count, pattern.label, ' (N+1)' if pattern.is_n_plus_one else '', pattern.sql))
+        return '\n'.join(lines)
+
+
+def field_label(fact_class, field):
+    """
+    Names the field, and what on it is run (an alias lambda, a computed lambda, a dimension lookup)
+    """
+    aliases = getattr(fact_class.ReportingMeta, 'dimension_aliases', {})
+    if isinstance(field, fields.DimensionForeignKey):
+        return '{} (dimension_aliases)'.format(field.name) if field.name in aliases else '{} (dimension)'.format(field.name)
+    elif isinstance(field, fields.HandleFieldArgs) and field.computed:
+        return '{} (computed)'.format(field.name)
+    return field.name
+
+
+def profile_refresh(fact_class, instances=None, sample=100, rollback=True):
+    """
+    Refreshes `sample` business rows one field at a time and returns the QueryRecorder.
+    Nothing is kept unless `rollback` is False.
+    """
+    if instances is None:
+        instances = fact_class.ReportingMeta.business_model._default_manager.order_by('pk')[:sample]
+    instances = list(instances)
+    recorder = QueryRecorder()
+    with transaction.atomic(using=router.db_for_write(fact_class)):
+        with recorder:
+            for row, instance in enumerate(instances):
+                recorder.row = row
+                with recorder.labelled('get_reporting_fact'):
+                    fact = fact_class.get_reporting_fact(instance)
+                if fact._is_frozen:
+                    continue
+                with recorder.labelled('delete_when'):
+                    if callable(getattr(fact_class, 'delete_when', None)):
+                        fact_class.delete_when(instance)
+                for field in fact_class.get_reporting_fields():
+                    with recorder.labelled(field_label(fact_class, field)):
+                        fact._update_field(field, instance)
+                with recorder.labelled('save'):
+                    fact._is_dirty = False
+                    fact._dirty_since = None
+                    fact.save()
+        if rollback:
+            transaction.set_rollback(True, using=router.db_for_write(fact_class))
+    return recorder
+
+
+@contextmanager
+def assert_max_queries(max_queries, message=None):
+    """
+    Fails when the block runs more than `max_queries` statements, showing the worst offenders
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+    if len(recorder.statements) > max_queries:
+        raise AssertionError('{}{} queries were run, {} allowed\n{}'.format(
+            message + ': ' if message else '', len(recorder.statements), max_queries, recorder.report()))
+
+
+def assert_refresh_queries(fact_class, instances, max_queries, force=True):
+    """
+    e.g. refreshing 1000 OrderedProductFacts must take at most N queries
+    """
+    instances = list(instances)
+    with assert_max_queries(max_queries, 'refreshing {} {}'.format(len(instances), fact_class.__name__)):
+        fact_class.record_update_many(instances, force=force)
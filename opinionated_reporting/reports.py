@@ -0,0 +1,114 @@
+"""
+Renders `header_description`/`row_description` reports from values_list() tuples instead of fact instances.
+
+`row_description` is called once with a proxy that records the attributes it reads, so a lambda like
+    row_description = lambda row: [row._unique_identifier, row.customer.name, row.created_on.date]
+becomes values_list('_unique_identifier', 'customer__name', 'created_on__date'). A lambda that does more than
+read attributes (formatting, arithmetic, conditionals) can't be traced and is rendered from instances.
+
+    with open('orders.csv', 'w') as output:
+        write_csv(OrderedProductFact, output)
+"""
+import csv
+from django.core.exceptions import FieldDoesNotExist
+from . import sql
+
+
+class NotTraceable(Exception):
+    pass
+
+
+class PathRecorder(object):
+    """
+    Stands in for a fact, `proxy.customer.name` is a PathRecorder for 'customer__name'
+    """
+    __slots__ = ('_path',)
+
+    def __init__(self, path=()):
+        object.__setattr__(self, '_path', path)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return PathRecorder(self._path + (name,))
+
+    def __setattr__(self, name, value):
+        raise NotTraceable('row_description sets {}'.format(name))
+
+    @property
+    def path(self):
+        return '__'.join(self._path)
+
+
+def trace_row_description(fact_class):
+    """
+    The values_list() paths of every column of `row_description`, raises NotTraceable when it isn't only attribute reads
+    """
+    row_description = getattr(fact_class.ReportingMeta, 'row_description', None)
+    if row_description is None:
+        raise NotTraceable('{} has no row_description'.format(fact_class.__name__))
+    try:
+        columns = list(row_description(PathRecorder()))
+    except NotTraceable:
+        raise
+    except Exception as e:
+        raise NotTraceable('row_description does more than read attributes: {!r}'.format(e))
+    paths = []
+    for column in columns:
+        if not isinstance(column, PathRecorder) or not column._path:
+            raise NotTraceable('row_description returns {!r}, not an attribute'.format(column))
+        try:
+            field = sql.resolve_field(fact_class, column.path)
+        except FieldDoesNotExist:
+            raise NotTraceable('{} is not a field path on {}'.format(column.path, fact_class.__name__))
+        if field.is_relation:
+            raise NotTraceable('{} is a whole related record, not one of its fields'.format(column.path))
+        paths.append(column.path)
+    return paths
+
+
+def render_rows(fact_class, queryset=None, chunk_size=2000):
+    """
+    The report rows as tuples, in `row_description` column order, without building any model instances
+    """
+    if queryset is None:
+        queryset = fact_class._default_manager.order_by('pk')
+    paths = trace_row_description(fact_class)
+    unique_paths = list(dict.fromkeys(paths))
+    if unique_paths == paths:
+        return queryset.values_list(*paths).iterator(chunk_size=chunk_size)
+    positions = [unique_paths.index(path) for path in paths]
+    return (tuple(values[position] for position in positions)
+            for values in queryset.values_list(*unique_paths).iterator(chunk_size=chunk_size))
+
+
+def render_instances(fact_class, queryset=None, chunk_size=2000):
+    """
+    The report rows from fact instances, for a `row_description` that can't be traced
+    """
+    if queryset is None:
+        queryset = fact_class._default_manager.order_by('pk')
+    related = [field.name for field in fact_class._meta.concrete_fields if field.is_relation]
+    row_description = fact_class.ReportingMeta.row_description
+    for fact in queryset.select_related(*related).iterator(chunk_size=chunk_size):
+        yield row_description(fact)
+
+
+def render(fact_class, queryset=None, chunk_size=2000):
+    try:
+        return render_rows(fact_class, queryset, chunk_size=chunk_size)
+    except NotTraceable:
+        return render_instances(fact_class, queryset, chunk_size=chunk_size)
+
+
+def write_csv(fact_class, output, queryset=None, chunk_size=2000):
+    """
+    Writes the header and every row, returns the number of rows
+    """
+    writer = csv.writer(output)
+    writer.writerow(fact_class.ReportingMeta.header_description)
+    count = 0
+    for row in render(fact_class, queryset, chunk_size=chunk_size):
+        writer.writerow(row)
+        count += 1
+    return count
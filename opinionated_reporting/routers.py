@@ -0,0 +1,51 @@
+"""
+Keeps facts and dimensions in their own database, so report scans don't compete with business writes
+
+    DATABASE_ROUTERS = ['opinionated_reporting.routers.ReportingRouter']
+    OPINIONATED_REPORTING_DATABASE = 'reporting'
+"""
+from django.apps import apps
+from django.conf import settings
+
+
+def get_reporting_database():
+    return getattr(settings, 'OPINIONATED_REPORTING_DATABASE', 'default')
+
+
+def is_reporting_model(model):
+    from .models import BaseSnapshotFact, UpdatingModel
+    return model._meta.app_label == 'opinionated_reporting' or issubclass(model, (UpdatingModel, BaseSnapshotFact))
+
+
+class ReportingRouter(object):
+
+    def db_for_read(self, model, **hints):
+        if is_reporting_model(model):
+            return get_reporting_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if is_reporting_model(model):
+            return get_reporting_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # facts only ever point at dimensions, never at business rows
+        if is_reporting_model(obj1.__class__) or is_reporting_model(obj2.__class__):
+            return is_reporting_model(obj1.__class__) == is_reporting_model(obj2.__class__)
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not model_name:
+            return None
+        try:
+            # migrations hand over historical models, which have lost their reporting base classes
+            model = apps.get_model(app_label, model_name)
+        except LookupError:
+            return None
+        reporting = get_reporting_database()
+        if is_reporting_model(model):
+            return db == reporting
+        elif db == reporting and reporting != 'default':
+            return False
+        return None
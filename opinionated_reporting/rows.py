@@ -0,0 +1,105 @@
+"""
+Business records read with values_list() instead of as model instances, for refreshing millions of facts.
+
+A path like 'order__customer__name' becomes `row.order.customer.name`, so aliases, `computed` and
+`delete_when` work on rows the same as on instances, as long as every attribute they touch has a path.
+Every related row's primary key is read too, and a related row whose primary key is None is None,
+like a null foreign key.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+
+class Row(object):
+    __slots__ = ()
+    business_model = None
+
+    def __repr__(self):
+        return '<{}: {}>'.format(self.__class__.__name__, ', '.join(
+            '{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+
+class Node(object):
+
+    def __init__(self, model):
+        self.model = model
+        self.leaves = []  # (attribute, position in the values tuple)
+        self.children = []  # (attribute, Node)
+        self.row_class = None
+        self.pk_position = None  # of a related row, None in the values tuple means there is no row
+
+    def child(self, name, model):
+        for attribute, node in self.children:
+            if attribute == name:
+                return node
+        node = Node(model)
+        self.children.append((name, node))
+        return node
+
+    def compile(self):
+        names = [attribute for attribute, position in self.leaves] + [attribute for attribute, node in self.children]
+        self.row_class = type('{}Row'.format(self.model.__name__), (Row,), {
+            '__slots__': tuple(names),
+            'business_model': self.model,
+        })
+        for attribute, node in self.children:
+            node.compile()
+
+    def build(self, values):
+        row = self.row_class.__new__(self.row_class)
+        for attribute, position in self.leaves:
+            setattr(row, attribute, values[position])
+        for attribute, node in self.children:
+            if values[node.pk_position] is not None:
+                setattr(row, attribute, node.build(values))
+            else:
+                setattr(row, attribute, None)
+        return row
+
+
+class RowReader(object):
+    """
+    Turns values_list(*paths) tuples of `business_model` into Row objects
+    """
+
+    def __init__(self, business_model, paths):
+        self.business_model = business_model
+        self.paths = []
+        self.root = Node(business_model)
+        for path in paths:
+            self.add(path)
+        self.root.compile()
+
+    def add(self, path):
+        node, model = self.root, self.business_model
+        parts = path.split('__')
+        for i, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                raise Exception('{} has no field {} (in {})'.format(model.__name__, part, path))
+            if field.is_relation:
+                model = field.related_model
+                node = node.child(part, model)
+                if node.pk_position is None:
+                    node.pk_position = self.add_leaf(node, '__'.join(parts[:i + 1] + [model._meta.pk.name]), model._meta.pk.name)
+                if i == len(parts) - 1:  # a relation on its own is its primary key
+                    return
+            else:
+                break
+        self.add_leaf(node, path, part)
+
+    def add_leaf(self, node, path, attribute):
+        """
+        Selects `path` as `attribute` of `node`'s rows, returns its position in the values tuple
+        """
+        for name, position in node.leaves:
+            if name == attribute:
+                return position
+        node.leaves.append((attribute, len(self.paths)))
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def read(self, queryset, chunk_size=2000):
+        build = self.root.build
+        for values in queryset.values_list(*self.paths).iterator(chunk_size=chunk_size):
+            yield build(values)
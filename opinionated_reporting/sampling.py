@@ -0,0 +1,114 @@
+"""
+Approximate reports from a fixed sample of facts.
+
+Every fact has a `_sample_bucket` (0 to BUCKETS - 1) hashed from its `_unique_identifier`, so a sample
+of 1% is always the same facts: those in the first 100 buckets, read through the index on the bucket.
+
+    OrderedProductFact.estimate(sample=0.01, measures=('total', 'quantity'))
+    {'count': Estimate(...), 'total': Estimate(...), 'quantity': Estimate(...)}
+
+Sums and counts are scaled up by the sample, with a normal confidence interval
+(each fact is in the sample with probability `sample`, the Horvitz-Thompson estimator).
+"""
+import math
+import zlib
+from django.db import models
+from django.db.models import Count, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Cast
+from . import fields
+
+BUCKETS = 10000
+MULTIPLIER = 2654435761  # Knuth's multiplicative hash, 2^32 / golden ratio
+MODULUS_BITS = 32
+MODULUS = 2 ** MODULUS_BITS
+HALF_BITS = MODULUS_BITS // 2
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.96, 0.98: 2.3263, 0.99: 2.5758}
+
+
+def is_integer_field(field):
+    return isinstance(field, (models.IntegerField, models.AutoField))
+
+
+def sample_bucket(unique_id, integer=True):
+    """
+    The bucket of a `_unique_identifier`, the same as `bucket_expression` computes in the database for integers
+    """
+    if integer:
+        return (int(unique_id) % MODULUS * MULTIPLIER % MODULUS) * BUCKETS // MODULUS
+    return zlib.crc32(str(unique_id).encode('utf-8')) % BUCKETS
+
+
+def bucket_expression(expression):
+    """
+    `sample_bucket` of an integer column, as SQL. The moduli are powers of two, so they're bitwise ANDs
+    and shifts (SQLite's MOD goes through floats), and the product is taken in 16 bit halves:
+    (high * 2^16 + low) * MULTIPLIER mod 2^32 never has an intermediate value past 2^49.
+    """
+    reduced = Cast(expression, models.BigIntegerField()).bitand(MODULUS - 1)
+    high, low = reduced.bitrightshift(HALF_BITS), reduced.bitand(2 ** HALF_BITS - 1)
+    hashed = ((high * Value(MULTIPLIER)).bitand(2 ** HALF_BITS - 1).bitleftshift(HALF_BITS)
+              + low * Value(MULTIPLIER)).bitand(MODULUS - 1)
+    return Cast((hashed * Value(BUCKETS)).bitrightshift(MODULUS_BITS), models.PositiveSmallIntegerField())
+
+
+def get_buckets(sample):
+    if not 0 < sample <= 1:
+        raise Exception('sample must be more than 0 and at most 1, not {}'.format(sample))
+    return max(1, int(round(sample * BUCKETS)))
+
+
+def sampled(queryset, sample):
+    """
+    Only the facts in the sample
+    """
+    return queryset.filter(_sample_bucket__lt=get_buckets(sample))
+
+
+class Estimate(object):
+
+    def __init__(self, value, error, sample_size):
+        self.value = value
+        self.error = error  # half the width of the confidence interval
+        self.sample_size = sample_size
+
+    @property
+    def low(self):
+        return self.value - self.error
+
+    @property
+    def high(self):
+        return self.value + self.error
+
+    def __repr__(self):
+        return 'Estimate({:.6g} +/- {:.3g}, from {} facts)'.format(self.value, self.error, self.sample_size)
+
+
+def estimate(queryset, sample, measures=(), confidence=0.95):
+    """
+    The count and the sums of `measures` over `queryset`, from `sample` of its facts in one query
+    """
+    if confidence not in Z_SCORES:
+        raise Exception('confidence must be one of {}'.format(', '.join(str(key) for key in sorted(Z_SCORES))))
+    buckets = get_buckets(sample)
+    probability = buckets / BUCKETS  # what is actually read, `sample` rounded to whole buckets
+    aggregates = {'count': Count('pk')}
+    units = {}
+    for measure in measures:
+        aggregates['{}_sum'.format(measure)] = Sum(measure)
+        squares = F(measure) * F(measure)
+        field = queryset.model._meta.get_field(measure)
+        if isinstance(field, fields.ScaledDecimalField):  # squared smallest units, scaled back below
+            squares = ExpressionWrapper(squares, output_field=models.FloatField())
+            units[measure] = field.scale
+        aggregates['{}_squares'.format(measure)] = Sum(squares)
+    result = sampled(queryset, sample).aggregate(**aggregates)
+
+    z = Z_SCORES[confidence]
+    scale = (1 - probability) / (probability * probability)
+    count = result['count']
+    estimates = {'count': Estimate(count / probability, z * math.sqrt(scale * count), count)}
+    for measure in measures:
+        total = float(result['{}_sum'.format(measure)] or 0)
+        squares = float(result['{}_squares'.format(measure)] or 0) / units.get(measure, 1) ** 2
+        estimates[measure] = Estimate(total / probability, z * math.sqrt(scale * squares), count)
+    return estimates
@@ -1,25 +1,25 @@
 from django.apps import apps
-from opinionated_reporting import models
-
-all_models = apps.get_models()
+from opinionated_reporting import dependencies, models
 
 
 def _find_reporting_from(model_instance):
     klasses = []
-    for model in all_models:
-        if isinstance(models.BaseFact, model):
+    for model in apps.get_models():
+        if issubclass(model, models.BaseFact):
             reporting_meta = getattr(model, 'ReportingMeta', None)
             if reporting_meta:
-                reporting_model = getattr(reporting_meta, 'model', None)
-                if reporting_model:
-                    klasses.append(reporting_model)
+                reporting_model = getattr(reporting_meta, 'business_model', None)
+                if reporting_model and isinstance(model_instance, reporting_model):
+                    klasses.append(model)
     return klasses
 
 
 def dirty_reporting_on_save(sender, instance, created, *args, **kwargs):
     klasses = _find_reporting_from(instance)
     for klass in klasses:
-        if not created:
+        if models.ChangeJournal.is_journaled(klass):
+            models.ChangeJournal.append(klass, instance)
+        elif not created:
             klass.mark_dirty(instance)
         else:
             fact = klass.get_reporting_fact(instance)
@@ -27,5 +27,12 @@ def dirty_reporting_on_save(sender, instance, created, *args, **kwargs):
 
 
 def update_reporting_on_save(sender, instance, created, *args, **kwargs):
-    klass = _find_reporting_from(instance)
-    klass.record_update(instance, force=True)
+    klasses = _find_reporting_from(instance)
+    for klass in klasses:
+        klass.record_update(instance, force=True)
+
+
+def dirty_dependents_on_save(sender, instance, created, update_fields=None, *args, **kwargs):
+    # nothing can point at a new row yet
+    if not created:
+        dependencies.invalidate(instance, changed=update_fields)
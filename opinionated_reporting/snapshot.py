@@ -0,0 +1,154 @@
+"""
+Persist a cube as a directory of `.npy` files so report workers can map it
+read only instead of loading from the database. Every worker that maps the
+same snapshot shares one copy in the page cache.
+
+Layout:
+    <root>/CURRENT            name of the newest snapshot directory
+    <root>/<version>/meta.json
+    <root>/<version>/*.npy
+"""
+import json
+import os
+import shutil
+import tempfile
+from django.db.models import Count, Max, Sum
+from django.utils.dateparse import parse_datetime
+from .cube import FactCube, assert_numpy, is_measure, np
+
+CURRENT = 'CURRENT'
+META = 'meta.json'
+
+
+def get_checksum_fields(fact_class):
+    """
+    The measures and dimension keys, what a cube reads
+    """
+    return [field for field in fact_class._meta.concrete_fields
+            if not field.primary_key and not field.name.startswith('_') and (field.is_relation or is_measure(field))]
+
+
+def fact_version(fact_class):
+    """
+    Changes whenever a fact is added, saved or removed. The sums of the measures and dimension keys catch
+    `.update()`s that don't set `_updated_on`, except those that leave every sum the same (like swapping two values).
+    """
+    checksums = {'sum_{}'.format(i): Sum(field.attname) for i, field in enumerate(get_checksum_fields(fact_class))}
+    stats = fact_class._default_manager.aggregate(count=Count('pk'), last_pk=Max('pk'), last_updated=Max('_updated_on'), **checksums)
+    last_updated = stats['last_updated'].isoformat() if stats['last_updated'] else ''
+    sums = ','.join(str(stats[name] if stats[name] is not None else '') for name in sorted(checksums, key=lambda name: int(name[4:])))
+    return '{}:{}:{}:{}'.format(stats['count'], stats['last_pk'] or 0, last_updated, sums)
+
+
+def fact_label(fact_class):
+    return fact_class._meta.label
+
+
+def _model_label(model):
+    return model._meta.label_lower
+
+
+def _current(root):
+    try:
+        with open(os.path.join(root, CURRENT)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_snapshot(cube, root):
+    """
+    Brings the cube up to date and writes it out as the new current snapshot
+    """
+    assert_numpy()
+    cube.refresh()
+    version = fact_version(cube.fact_class)
+    os.makedirs(root, exist_ok=True)
+    # write somewhere private then rename, readers never see half a snapshot
+    working = tempfile.mkdtemp(prefix='.snapshot-', dir=root)
+    meta = {
+        'fact': fact_label(cube.fact_class),
+        'version': version,
+        'loaded_until': cube.loaded_until.isoformat() if cube.loaded_until else None,
+        'dimensions': [field.name for field in cube.dimension_fields],
+        'measures': [field.name for field in cube.measure_fields],
+        'lookups': {_model_label(model): lookup.attributes for model, lookup in cube.lookups.items()},
+    }
+    np.save(os.path.join(working, 'pks.npy'), cube.pks)
+    np.save(os.path.join(working, 'alive.npy'), cube.alive)
+    for name, codes in cube.codes.items():
+        np.save(os.path.join(working, 'codes.{}.npy'.format(name)), codes)
+    for name, measure in cube.measures.items():
+        np.save(os.path.join(working, 'measure.{}.npy'.format(name)), measure)
+    for model, lookup in cube.lookups.items():
+        np.save(os.path.join(working, 'lookup.{}.pks.npy'.format(_model_label(model))), lookup.pks)
+        for attribute, column in lookup.columns.items():
+            np.save(os.path.join(working, 'lookup.{}.{}.npy'.format(_model_label(model), attribute)), column)
+    with open(os.path.join(working, META), 'w') as f:
+        json.dump(meta, f)
+
+    previous = _current(root)
+    name = '{:06d}'.format(int(previous) + 1 if previous and previous.isdigit() else 1)
+    os.rename(working, os.path.join(root, name))
+    pointer = os.path.join(root, '.' + CURRENT)
+    with open(pointer, 'w') as f:
+        f.write(name)
+    os.replace(pointer, os.path.join(root, CURRENT))
+    return os.path.join(root, name)
+
+
+def read_meta(root):
+    name = _current(root)
+    if not name:
+        return None
+    with open(os.path.join(root, name, META)) as f:
+        return json.load(f)
+
+
+def is_stale(root, fact_class):
+    meta = read_meta(root)
+    return meta is None or meta['version'] != fact_version(fact_class)
+
+
+def load_snapshot(root, fact_class, allow_stale=False):
+    """
+    Returns a FactCube whose arrays are memory mapped from the current snapshot.
+    A stale snapshot raises unless `allow_stale`, the cube can then be `refresh()`ed.
+    """
+    assert_numpy()
+    name = _current(root)
+    if not name:
+        raise Exception('There is no snapshot in {}'.format(root))
+    directory = os.path.join(root, name)
+    with open(os.path.join(directory, META)) as f:
+        meta = json.load(f)
+    if meta['fact'] != fact_label(fact_class):
+        raise Exception('Snapshot in {} is for {}, not {}'.format(root, meta['fact'], fact_label(fact_class)))
+    if not allow_stale and meta['version'] != fact_version(fact_class):
+        raise Exception('Snapshot in {} is stale for {}'.format(root, fact_label(fact_class)))
+
+    def _load(filename):
+        return np.load(os.path.join(directory, filename), mmap_mode='r')
+
+    cube = FactCube(fact_class, dimensions=meta['dimensions'], measures=meta['measures'])
+    cube.pks = _load('pks.npy')
+    cube.alive = _load('alive.npy')
+    cube.codes = {name: _load('codes.{}.npy'.format(name)) for name in meta['dimensions']}
+    cube.measures = {name: _load('measure.{}.npy'.format(name)) for name in meta['measures']}
+    for model, lookup in cube.lookups.items():
+        label = _model_label(model)
+        lookup.attributes = meta['lookups'][label]
+        lookup.pks = _load('lookup.{}.pks.npy'.format(label))
+        lookup.columns = {attribute: _load('lookup.{}.{}.npy'.format(label, attribute)) for attribute in lookup.attributes}
+    cube.loaded_until = parse_datetime(meta['loaded_until']) if meta['loaded_until'] else None
+    cube.snapshot_version = meta['version']
+    return cube
+
+
+def prune_snapshots(root, keep=2):
+    """
+    Removes all but the newest `keep` snapshots, mapped files stay readable until their workers let go
+    """
+    names = sorted(name for name in os.listdir(root) if name.isdigit())
+    for name in names[:-keep] if keep else names:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,301 @@
+"""
+Compiles the columns of a fact into expressions over its business model, so facts can be
+written with a single INSERT ... SELECT instead of a python round trip per row.
+
+Only what the database can compute is compilable: plain copies, string paths
+(`'order__created_on'`) in `dimension_aliases` or as a description field `alias`,
+and dimension keys. Lambdas raise NotCompilable.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models, router, transaction
+from django.db.models import ExpressionWrapper, F, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Coalesce, ExtractHour, Round, TruncDate
+from django.utils import timezone
+from . import fields, sampling
+
+PREFIX = '_opr_'
+
+
+class NotCompilable(Exception):
+
+    def __init__(self, field_name, reason):
+        self.field_name = field_name
+        self.reason = reason
+        super().__init__('{}: {}'.format(field_name, reason))
+
+
+def resolve_field(model, path):
+    """
+    The model field at the end of an ORM path, i.e. ('order__created_on') on TestOrderItem is TestOrder.created_on
+    """
+    field = None
+    for part in path.split('__'):
+        field = model._meta.get_field(part)
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+def source_path(fact_class, field):
+    """
+    Where on the business model a fact field reads from
+    """
+    if isinstance(field, fields.HandleFieldArgs):
+        if field.computed:
+            raise NotCompilable(field.name, '`computed` is a callable')
+        return field.alias or field.name
+    if isinstance(field, fields.DimensionForeignKey):
+        alias = getattr(fact_class.ReportingMeta, 'dimension_aliases', {}).get(field.name)
+        if alias is None:
+            return field.name
+        if not isinstance(alias, str):
+            raise NotCompilable(field.name, '`dimension_aliases` entry is a callable, use a path like "order__created_on"')
+        return alias
+    return field.name
+
+
+def annotation(expression):
+    """
+    Wraps a plain expression like the compiled fields, a function that annotates a queryset with it as `name`
+    """
+    return lambda queryset, name: queryset.annotate(**{name: expression})
+
+
+def empty_dimension_key(dimension):
+    return Subquery(dimension._default_manager.filter(_unique_identifier=0).values('pk')[:1])
+
+
+def dimension_key(fact_class, field):
+    """
+    Compiles the pk of the dimension row `field` points at
+    """
+    from .models import DateDimension, HourDimension, local_tz
+    path = source_path(fact_class, field)
+    source = _resolve_source(fact_class, field, path)
+    dimension = field.related_model
+
+    if issubclass(dimension, DateDimension):
+        # dates are bucketed in the local timezone, just like `get_date_from_datetime`. TruncDate has no tzinfo,
+        # it uses the active timezone, which `insert_from_select` sets to settings.TIME_ZONE
+        value = TruncDate(path) if isinstance(source, models.DateTimeField) else F(path)
+        lookup = 'date'
+    elif issubclass(dimension, HourDimension):
+        if not isinstance(source, (models.DateTimeField, models.TimeField)):
+            raise NotCompilable(field.name, '{} is not a datetime or time'.format(path))
+        value = ExtractHour(path, tzinfo=local_tz)
+        lookup = 'time__hour'
+    else:
+        if source.is_relation:
+            path = '{}__{}'.format(path, dimension.ReportingMeta.unique_identifier)
+        # no source, or no dimension row for it, falls back to the empty dimension like `get_related_record_from`
+        key = Subquery(dimension._default_manager.filter(_unique_identifier=OuterRef(path)).values('pk')[:1])
+        return annotation(Coalesce(key, empty_dimension_key(dimension)))
+
+    def _annotate(queryset, name):
+        # OuterRef() can't be wrapped in a function, so the bucketed value is annotated first
+        source_name = name + '_source'
+        queryset = queryset.annotate(**{source_name: value})
+        key = Subquery(dimension._default_manager.filter(**{lookup: OuterRef(source_name)}).values('pk')[:1])
+        return queryset.annotate(**{name: key})
+    return _annotate
+
+
+def _resolve_source(fact_class, field, path):
+    business_model = fact_class.ReportingMeta.business_model
+    try:
+        return resolve_field(business_model, path)
+    except FieldDoesNotExist:
+        raise NotCompilable(field.name, '{} has no field {}'.format(business_model.__name__, path))
+
+
+def compile_field(fact_class, field):
+    """
+    Compiles the value of a fact field, raises NotCompilable when only python can work it out
+    """
+    if isinstance(field, fields.DimensionForeignKey):
+        return dimension_key(fact_class, field)
+    path = source_path(fact_class, field)
+    _resolve_source(fact_class, field, path)
+    if isinstance(field, fields.ScaledDecimalField):
+        scaled = ExpressionWrapper(F(path) * Value(field.scale), output_field=models.DecimalField())
+        return annotation(Cast(Round(scaled), models.BigIntegerField()))
+    return annotation(F(path))
+
+
+def build_select(queryset, columns):
+    """
+    `columns` is a list of (column name, compiled field). Returns a values() queryset
+    selecting exactly those columns, in that order.
+    """
+    queryset = queryset.order_by()
+    names = []
+    for i, (column, compiled) in enumerate(columns):
+        name = '{}{}'.format(PREFIX, i)
+        queryset = compiled(queryset, name)
+        names.append(name)
+    return queryset.values(*names)
+
+
+def assert_same_database(model, queryset):
+    using = router.db_for_write(model)
+    if queryset.db != using:
+        raise Exception('{} is in the {} database and {} is in {}, an INSERT ... SELECT needs them together'.format(
+            model.__name__, using, queryset.model.__name__, queryset.db))
+    return using
+
+
+def insert_from_select(model, columns, queryset):
+    """
+    INSERT INTO model (columns) SELECT ... FROM the queryset, returns the number of rows inserted.
+    Compiled and run in settings.TIME_ZONE, whatever timezone the request activated.
+    """
+    using = assert_same_database(model, queryset)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with timezone.override(settings.TIME_ZONE):
+        select, params = build_select(queryset, columns).query.get_compiler(using=using).as_sql()
+        sql = 'INSERT INTO {} ({}) {}'.format(
+            qn(model._meta.db_table),
+            ', '.join(qn(model._meta.get_field(column).column) for column, compiled in columns),
+            select)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+def overrides_delete_when(fact_class):
+    from .models import BaseFact
+    delete_when = getattr(fact_class, 'delete_when', None)
+    return delete_when is not None and getattr(delete_when, '__func__', None) is not BaseFact.delete_when.__func__
+
+
+class CompiledRefresh(object):
+    """
+    A whole fact (or dimension) refresh as one INSERT ... SELECT from its business model,
+    with the dimensions it points at created first the same way.
+
+    `blockers` lists a NotCompilable for every field that only python can refresh,
+    a fact with any blockers has to be refreshed with `record_update_many` instead.
+    """
+
+    def __init__(self, fact_class):
+        self.fact_class = fact_class
+        self.columns = []
+        self.blockers = []
+        self.dimensions = []
+        self.assign_sample_buckets = False
+        meta = fact_class.ReportingMeta
+        self.delete_filter = getattr(meta, 'delete_filter', None)
+        if overrides_delete_when(fact_class) and self.delete_filter is None:
+            self.blockers.append(NotCompilable('delete_when', 'set `ReportingMeta.delete_filter` to a Q() that matches it'))
+
+        reporting_fields = fact_class.get_reporting_fields()
+        for field in reporting_fields:
+            try:
+                self.columns.append((field.name, compile_field(fact_class, field)))
+            except NotCompilable as e:
+                self.blockers.append(e)
+                continue
+            if isinstance(field, fields.DimensionForeignKey) and hasattr(field.related_model, 'ReportingMeta'):
+                if field.related_model not in [dimension.fact_class for dimension in self.dimensions]:
+                    dimension = CompiledRefresh(field.related_model)
+                    self.blockers += [NotCompilable(field.name, '{} {}'.format(field.related_model.__name__, blocker))
+                                      for blocker in dimension.blockers]
+                    self.dimensions.append(dimension)
+
+        # everything that isn't refreshed from the business model gets what a fresh, clean fact would have
+        self.refreshed = [column for column, compiled in self.columns]
+        self.resets = {}  # what an existing fact's other columns are set to, `auto_now_add` ones are kept
+        now = timezone.now()
+        for field in fact_class._meta.concrete_fields:
+            if field.primary_key or field in reporting_fields:
+                continue
+            elif field.name == '_unique_identifier':
+                self.columns.append((field.name, annotation(F(meta.unique_identifier))))
+            elif field.name == '_sample_bucket':
+                if sampling.is_integer_field(fact_class._meta.get_field('_unique_identifier')):
+                    self.columns.append((field.name, annotation(sampling.bucket_expression(F(meta.unique_identifier)))))
+                else:
+                    self.assign_sample_buckets = True  # hashed in python after the insert
+            elif field.name == '_is_dirty':
+                self.columns.append((field.name, annotation(Value(False, output_field=field))))
+                self.resets[field.name] = Value(False, output_field=field)
+            elif getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                self.columns.append((field.name, annotation(Value(now, output_field=field))))
+                if getattr(field, 'auto_now', False):
+                    self.resets[field.name] = Value(now, output_field=field)
+            elif field.has_default():
+                self.columns.append((field.name, annotation(Value(field.get_default(), output_field=field))))
+                self.resets[field.name] = Value(field.get_default(), output_field=field)
+            elif field.null:  # `_dirty_since` and the lease are cleared too
+                self.columns.append((field.name, annotation(Value(None, output_field=field))))
+                self.resets[field.name] = Value(None, output_field=field)
+            else:
+                self.blockers.append(NotCompilable(field.name, 'has no default'))
+
+    @property
+    def is_compilable(self):
+        return not self.blockers
+
+    def get_queryset(self, queryset=None):
+        if queryset is None:
+            queryset = self.fact_class.ReportingMeta.business_model._default_manager.all()
+        return queryset
+
+    def insert_missing(self, queryset=None):
+        """
+        Only creates the records that don't have one yet, i.e. new dimension rows
+        """
+        unique_field_name = self.fact_class.ReportingMeta.unique_identifier
+        existing = self.fact_class._default_manager.values('_unique_identifier')
+        queryset = self.get_queryset(queryset).exclude(**{'{}__in'.format(unique_field_name): existing})
+        return insert_from_select(self.fact_class, self.columns, queryset)
+
+    def execute(self, queryset=None):
+        """
+        Refreshes every fact that isn't frozen in place, so facts keep their pks (cubes and snapshots
+        key on them), inserts the missing ones and deletes those whose business record is gone or
+        matches `delete_filter`, or only marks them `_is_deleted` with `ReportingMeta.soft_delete`.
+        Returns the number of facts written.
+        """
+        if not self.is_compilable:
+            raise Exception('{} can not be compiled: {}'.format(self.fact_class.__name__, ', '.join(str(blocker) for blocker in self.blockers)))
+        unique_field_name = self.fact_class.ReportingMeta.unique_identifier
+        queryset = self.get_queryset(queryset)
+        using = assert_same_database(self.fact_class, queryset)
+        manager = self.fact_class._base_manager  # soft deleted facts are rebuilt too
+        with transaction.atomic(using=using):
+            for dimension in self.dimensions:
+                dimension.insert_missing()
+            facts = manager.filter(_is_frozen=False)
+            if queryset.query.has_filters():
+                facts = facts.filter(_unique_identifier__in=queryset.values(unique_field_name))
+            if self.delete_filter is not None:
+                queryset = queryset.exclude(self.delete_filter)
+            reported = queryset.values(unique_field_name)
+            if getattr(self.fact_class.ReportingMeta, 'soft_delete', False):
+                facts.exclude(_unique_identifier__in=reported).filter(_is_deleted=False).update(
+                    _is_deleted=True, _is_dirty=False, _dirty_since=None, _updated_on=timezone.now())
+            else:
+                facts.exclude(_unique_identifier__in=reported).delete()
+            count = self.update_existing(facts.filter(_unique_identifier__in=reported), queryset)
+            queryset = queryset.exclude(**{'{}__in'.format(unique_field_name): manager.values('_unique_identifier')})
+            count += insert_from_select(self.fact_class, self.columns, queryset)
+            if self.assign_sample_buckets:
+                self.fact_class.assign_sample_buckets()
+            return count
+
+    def update_existing(self, facts, queryset):
+        """
+        One UPDATE of `facts`, each refreshed column a subquery on the fact's business record.
+        The others are reset, which brings soft deleted facts back (`_is_deleted` defaults to False).
+        """
+        unique_field_name = self.fact_class.ReportingMeta.unique_identifier
+        source = queryset.order_by().filter(**{unique_field_name: OuterRef('_unique_identifier')})
+        values = dict(self.resets)
+        for column, compiled in self.columns:
+            if column in self.refreshed:
+                values[column] = Subquery(compiled(source, PREFIX + column).values(PREFIX + column)[:1])
+        with timezone.override(settings.TIME_ZONE):  # see `insert_from_select`
+            return facts.update(**values)
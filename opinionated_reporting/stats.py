@@ -0,0 +1,222 @@
+"""
+In-process counters for fact refreshes, and hooks to ship them to a metrics pipeline
+
+Hooks are called as `hook(event, model, **values)` and can be registered with
+`add_hook`, or listed as dotted paths in `settings.OPINIONATED_REPORTING_STATS_HOOKS`.
+A hook that raises is logged, it never fails the refresh.
+
+Queries are only counted while a hook is registered or `settings.OPINIONATED_REPORTING_STATS_QUERIES` is on,
+counting wraps every connection for each refresh.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+EVENT_REFRESH = 'refresh'
+EVENT_SKIP = 'skip'  # not dirty, not forced
+EVENT_UNCHANGED = 'unchanged'  # refreshed, but nothing changed so nothing was written
+EVENT_DELETE = 'delete'  # removed by `delete_when`
+EVENT_FROZEN_SKIP = 'frozen_skip'
+EVENT_DIMENSION_CREATED = 'dimension_created'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_lock = threading.Lock()
+_stats = {}
+_hooks = []
+_settings_hooks = None
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def as_dict(self):
+        return {
+            'buckets': list(self.buckets) + ['+Inf'],
+            'counts': list(self.counts),
+            'count': self.count,
+            'sum': self.total,
+        }
+
+
+class ModelStats(object):
+    COUNTERS = (EVENT_REFRESH, EVENT_SKIP, EVENT_UNCHANGED, EVENT_DELETE, EVENT_FROZEN_SKIP, EVENT_DIMENSION_CREATED)
+
+    def __init__(self, label):
+        self.label = label
+        self.counters = {counter: 0 for counter in self.COUNTERS}
+        self.queries = 0
+        self.rows_written = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.query_counts = Histogram(QUERY_BUCKETS)
+
+    def as_dict(self):
+        return {
+            'model': self.label,
+            'counters': dict(self.counters),
+            'queries': self.queries,
+            'rows_written': self.rows_written,
+            'latency': self.latency.as_dict(),
+            'queries_per_refresh': self.query_counts.as_dict(),
+        }
+
+
+def add_hook(hook):
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def get_hooks():
+    global _settings_hooks
+    if _settings_hooks is None:
+        _settings_hooks = [import_string(path) for path in getattr(settings, 'OPINIONATED_REPORTING_STATS_HOOKS', [])]
+    return _settings_hooks + _hooks
+
+
+def get_stats(model):
+    label = model._meta.label
+    with _lock:
+        if label not in _stats:
+            _stats[label] = ModelStats(label)
+        return _stats[label]
+
+
+def all_stats():
+    with _lock:
+        return [stats.as_dict() for stats in _stats.values()]
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def record(model, event, seconds=None, queries=None, rows_written=0):
+    stats = get_stats(model)
+    with _lock:
+        stats.counters[event] = stats.counters.get(event, 0) + 1
+        stats.rows_written += rows_written
+        if seconds is not None:
+            stats.latency.observe(seconds)
+        if queries is not None:
+            stats.queries += queries
+            stats.query_counts.observe(queries)
+    values = {key: value for key, value in (('seconds', seconds), ('queries', queries), ('rows_written', rows_written)) if value}
+    for hook in get_hooks():
+        try:
+            hook(event, model, **values)
+        except Exception:
+            logger.exception('stats hook %r failed on %s for %s', hook, event, model._meta.label)
+
+
+def counts_queries():
+    return bool(getattr(settings, 'OPINIONATED_REPORTING_STATS_QUERIES', False) or get_hooks())
+
+
+@contextmanager
+def count_queries():
+    """
+    Yields a dict whose `queries` is the number of statements run on any connection inside the block
+    """
+    result = {'queries': 0}
+
+    def _count(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    wrappers = [connection.execute_wrapper(_count) for connection in connections.all()]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        yield result
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+
+@contextmanager
+def measure():
+    """
+    Yields a dict that has the block's `seconds` and `queries` (None unless `counts_queries`) once it is done
+    """
+    measured = {}
+    start = time.perf_counter()
+    if counts_queries():
+        with count_queries() as counted:
+            yield measured
+        measured['queries'] = counted['queries']
+    else:
+        yield measured
+        measured['queries'] = None
+    measured['seconds'] = time.perf_counter() - start
+
+
+@contextmanager
+def timed_refresh(model, rows_written=1):
+    """
+    Records a refresh, with its latency and query count (see `counts_queries`), when the block succeeds.
+    The block can change the `event` and `rows_written` of the dict it is given.
+    """
+    refresh = {'event': EVENT_REFRESH, 'rows_written': rows_written}
+    with measure() as measured:
+        yield refresh
+    record(model, refresh['event'], seconds=measured['seconds'], queries=measured['queries'], rows_written=refresh['rows_written'])
+
+
+class Batch(object):
+    """
+    The refreshes of a batch that is written at once, see `timed_batch`
+    """
+
+    def __init__(self):
+        self.refreshes = []
+
+    @contextmanager
+    def refresh(self, rows_written=1):
+        """
+        Like `timed_refresh`, only kept until the batch is recorded
+        """
+        refresh = {'event': EVENT_REFRESH, 'rows_written': rows_written}
+        yield refresh
+        self.refreshes.append(refresh)
+
+
+@contextmanager
+def timed_batch(model):
+    """
+    Records the refreshes of the Batch it yields when the block (the refreshes and the bulk write) succeeds,
+    each with an even share of the block's latency and queries
+    """
+    batch = Batch()
+    with measure() as measured:
+        yield batch
+    if not batch.refreshes:
+        return
+    share = len(batch.refreshes)
+    queries = None if measured['queries'] is None else measured['queries'] / share
+    for refresh in batch.refreshes:
+        record(model, refresh['event'], seconds=measured['seconds'] / share, queries=queries, rows_written=refresh['rows_written'])
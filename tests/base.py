@@ -0,0 +1,71 @@
+import datetime
+from django.test import TestCase, TransactionTestCase
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from opinionated_reporting import models as opr_models
+from opinionated_reporting import signals
+from . import models
+
+PRICE = 5.00
+QTY = 2
+TAX = 0.50
+TOTAL = (PRICE * QTY)  # omitting tax for test below
+SIGNAL_SENDERS = (models.TestOrder, models.TestOrderItem)
+
+
+class ReportingFixtures(object):
+
+    def setUp(self):
+        for sender in SIGNAL_SENDERS:
+            post_save.connect(signals.dirty_reporting_on_save, sender=sender)
+        opr_models.HourDimension.objects.all().delete()
+        with transaction.atomic():
+            opr_models.HourDimension.init_dimension()
+
+        opr_models.DateDimension.objects.all().delete()
+        with transaction.atomic():
+            opr_models.DateDimension.init_dimension_by_range(datetime.date.today() - datetime.timedelta(days=3), datetime.date.today() + datetime.timedelta(days=3))
+
+        with transaction.atomic():
+            models.CustomerDimension.init_dimension()
+        with transaction.atomic():
+            models.ProductDimension.init_dimension()
+
+        self.product = models.TestProduct.objects.create(**{
+            'name': 'Widget',
+            'price': PRICE
+        })
+        self.customer = models.TestCustomer.objects.create(**{
+            'email': 'foo@bar.com',
+            'name': 'Foo Bar'
+        })
+        self.order = models.TestOrder.objects.create(**{
+            'customer': self.customer,
+            'total': PRICE * QTY,
+            'ordered_on': timezone.now()
+        })
+        assert self.order.created_on
+        self.order_item = models.TestOrderItem.objects.create(**{
+            'order': self.order,
+            'product': self.product,
+            'quantity': QTY,
+            'total': TOTAL,
+        })
+
+    def tearDown(self):
+        self.order.delete()
+        self.product.delete()
+        self.customer.delete()
+        for sender in SIGNAL_SENDERS:
+            post_save.disconnect(signals.dirty_reporting_on_save, sender=sender)
+
+
+class ReportingTestCase(ReportingFixtures, TestCase):
+    pass
+
+
+class ReportingTransactionTestCase(ReportingFixtures, TransactionTestCase):
+    """
+    For tests whose ORM work runs in other threads, which can't see a TestCase's transaction
+    """
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0004_auto_20180917_0820'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdimension',
+            name='_updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdimension',
+            name='_updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0005_auto_20261019_0240'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdimension',
+            name='_dirty_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_dirty_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_dirty_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdimension',
+            name='_dirty_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
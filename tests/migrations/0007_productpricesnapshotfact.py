@@ -0,0 +1,30 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import opinionated_reporting.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('opinionated_reporting', '__first__'),
+        ('tests', '0006_auto_20261019_0247'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPriceSnapshotFact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('_unique_identifier', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('product', opinionated_reporting.fields.DimensionForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='price_snapshots', to='tests.ProductDimension')),
+                ('snapshot_on', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tests_productpricesnapshotfact_set', to='opinionated_reporting.DateDimension')),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('_unique_identifier', 'snapshot_on')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0007_productpricesnapshotfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdimension',
+            name='_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='productdimension',
+            name='_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=40),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0008_auto_20261019_0252'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_is_deleted',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_is_deleted',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-19 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0009_auto_20261019_0255'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customerdimension',
+            name='_lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerdimension',
+            name='_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdimension',
+            name='_lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='productdimension',
+            name='_leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-19 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0010_auto_20261019_0255'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderedfact',
+            name='_sample_bucket',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderedproductfact',
+            name='_sample_bucket',
+            field=models.PositiveSmallIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
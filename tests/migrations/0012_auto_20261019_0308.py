@@ -0,0 +1,53 @@
+# Generated by Django 2.2.28 on 2026-10-19 07:08
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Round
+import opinionated_reporting.fields
+
+SCALE = 100  # decimal_places=2
+
+
+def to_cents(apps, schema_editor):
+    # an ALTER of the column would truncate (or keep) the decimals instead of scaling them
+    OrderedFact = apps.get_model('tests', 'OrderedFact')
+    cents = ExpressionWrapper(F('total') * Value(SCALE), output_field=models.DecimalField())
+    OrderedFact._base_manager.using(schema_editor.connection.alias).update(
+        total_cents=Cast(Round(cents), models.BigIntegerField()))
+
+
+def from_cents(apps, schema_editor):
+    OrderedFact = apps.get_model('tests', 'OrderedFact')
+    OrderedFact._base_manager.using(schema_editor.connection.alias).update(
+        total=ExpressionWrapper(F('total_cents') * Value(Decimal(1) / SCALE), output_field=models.DecimalField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0011_auto_20261019_0307'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderedfact',
+            name='total_cents',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(to_cents, from_cents),
+        migrations.RemoveField(
+            model_name='orderedfact',
+            name='total',
+        ),
+        migrations.RenameField(
+            model_name='orderedfact',
+            old_name='total_cents',
+            new_name='total',
+        ),
+        migrations.AlterField(
+            model_name='orderedfact',
+            name='total',
+            field=opinionated_reporting.fields.ScaledDecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
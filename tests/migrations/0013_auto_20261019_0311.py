@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0012_auto_20261019_0308'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderedfact',
+            index=models.Index(fields=['_is_deleted', '_is_dirty', '_is_frozen'], name='tests_order__is_del_0b04f4_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-19 07:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tests', '0013_auto_20261019_0311'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderedfact',
+            name='tests_order__is_del_0b04f4_idx',
+        ),
+        migrations.AddIndex(
+            model_name='orderedfact',
+            index=models.Index(fields=['_is_dirty', '_is_frozen'], name='tests_order__is_dir_d63040_idx'),
+        ),
+    ]
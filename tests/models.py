@@ -1,6 +1,7 @@
 from django.db import models
-from opinionated_reporting.models import BaseDimension, BaseFact, DateDimension, HourDimension
+from opinionated_reporting.models import BaseDimension, BaseFact, BaseSnapshotFact, DateDimension, HourDimension
 from opinionated_reporting.fields import DimensionForeignKey, IntegerDescriptionField
+from opinionated_reporting.leaderboards import Leaderboard
 
 
 class TestProduct(models.Model):
@@ -92,6 +93,14 @@ class OrderedProductFact(BaseFact):
             'hour_ordered_on': lambda instance: instance.order.ordered_on,
             'customer': lambda instance: instance.order.customer,
         }
+        # what the lambdas read, for refreshing from rows
+        related_paths = ('order__id', 'order__created_on', 'order__ordered_on', 'order__cancelled',
+                         'order__customer__id', 'order__customer__name', 'order__customer__email')
+        total = {'total': models.Sum('total'), 'quantity': models.Sum('quantity')}
+        leaderboards = (
+            Leaderboard('total', 'customer', date='ordered_on', grain='quarter'),
+            Leaderboard('quantity', 'product', date='ordered_on', grain='month'),
+        )
         header_description = ['ID', 'Product', 'Qty', 'Total', 'Order ID''Created Date', 'Created Time', 'Customer', 'Ordered Date', 'Ordered Time']
         row_description = lambda row: [
             row._unique_identifier,
@@ -127,10 +136,13 @@ class OrderedFact(BaseFact):
         business_model = TestOrder
         unique_identifier = 'id'
         fields = ('total',)
+        scaled_decimals = True  # `total` is stored in cents
+        indexes = (('_is_dirty', '_is_frozen'),)  # the refresh queue, see `reporting_explain`
         dimension_aliases = {
-            'hour_created_on': lambda instance: instance.created_on,
-            'hour_ordered_on': lambda instance: instance.ordered_on
+            'hour_created_on': 'created_on',
+            'hour_ordered_on': 'ordered_on',
         }
+        delete_filter = models.Q(ordered_on__isnull=False, cancelled=True)  # `delete_when`, for `rebuild`
         header_description = ['ID', 'Created Date', 'Created Time', 'Customer', 'Ordered Date', 'Ordered Time']
         row_description = lambda row: [
             row._unique_identifier,
@@ -144,3 +156,18 @@ class OrderedFact(BaseFact):
 
     class Meta:
         app_label = 'tests'
+
+
+class ProductPriceSnapshotFact(BaseSnapshotFact):
+    product = DimensionForeignKey(ProductDimension, null=True, related_name="price_snapshots", on_delete=models.PROTECT)
+
+    class ReportingMeta:
+        business_model = TestProduct
+        unique_identifier = 'id'
+        fields = ('price',)
+        dimension_aliases = {
+            'product': 'id',
+        }
+
+    class Meta(BaseSnapshotFact.Meta):
+        app_label = 'tests'
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from django.db import connection
+from opinionated_reporting import aio
+from .base import ReportingTransactionTestCase
+from . import models
+
+
+class TestAsync(ReportingTransactionTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # sqlite allows one writer at a time
+        self.previous = aio.set_executor(aio.RefreshExecutor(max_workers=1, max_pending=3))
+
+    def tearDown(self):
+        aio.set_executor(self.previous).shutdown()
+        super().tearDown()
+
+    def run_async(self, coroutine):
+        return asyncio.new_event_loop().run_until_complete(coroutine)
+
+    def test_arecord_update(self):
+        fact = self.run_async(models.OrderedFact.arecord_update(self.order))
+        self.assertEquals(fact.total, self.order.total)
+        self.assertFalse(models.OrderedFact.get_reporting_fact(self.order)._is_dirty)
+        self.order.save()
+        self.run_async(models.OrderedFact.amark_dirty(self.order))
+        self.assertTrue(models.OrderedFact.get_reporting_fact(self.order)._is_dirty)
+        facts = self.run_async(models.OrderedFact.arecord_update_many([self.order, self.order]))
+        self.assertEquals(len(facts), 1)
+
+    def test_coalescing_and_backpressure(self):
+        executor = aio.get_executor()
+        release = threading.Event()
+        ran = []
+
+        def job(value):
+            if value == 1:
+                release.wait(5)
+            ran.append(value)
+            return value
+
+        async def burst():
+            # the first job occupies the only thread, the next ones queue behind it
+            first = asyncio.ensure_future(executor.submit('a', job, 1))
+            await asyncio.sleep(0.01)
+            second = asyncio.ensure_future(executor.submit('b', job, 2))
+            await asyncio.sleep(0.01)
+            third = asyncio.ensure_future(executor.submit('b', job, 3))
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(first, second, third)
+
+        results = self.run_async(burst())
+        self.assertEquals(results, [1, 3, 3])  # the third joined the queued second job, with its newer arguments
+        self.assertEquals(ran, [1, 3])
+
+        self.assertEquals(executor.pending, 0)
+        executor.pending = executor.max_pending
+        with self.assertRaises(aio.QueueFull):
+            self.run_async(models.OrderedFact.arecord_update(self.order))
+        executor.pending = 0
+
+    def test_coalesced_force(self):
+        models.OrderedFact.record_update(self.order)
+        models.TestOrder.objects.filter(pk=self.order.pk).update(total=self.order.total + 1)  # no signal, the fact stays clean
+        order = models.TestOrder.objects.get(pk=self.order.pk)
+        executor = aio.get_executor()
+        release = threading.Event()
+
+        async def burst():
+            blocker = asyncio.ensure_future(executor.submit('a', release.wait, 5))
+            await asyncio.sleep(0.01)
+            forced = asyncio.ensure_future(models.OrderedFact.arecord_update(order, force=True))
+            await asyncio.sleep(0.01)
+            joined = asyncio.ensure_future(models.OrderedFact.arecord_update(order))
+            await asyncio.sleep(0.01)
+            release.set()
+            return await asyncio.gather(blocker, forced, joined)
+
+        blocker, forced, joined = self.run_async(burst())
+        self.assertIs(forced, joined)
+        self.assertEquals(models.OrderedFact.get_reporting_fact(order).total, order.total)
+
+    def test_arecord_update_many_queryset(self):
+        threads = set()
+
+        def record_thread(execute, sql, params, many, context):
+            threads.add(threading.get_ident())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_thread):
+            facts = self.run_async(models.OrderedFact.arecord_update_many(models.TestOrder.objects.all(), force=True))
+        self.assertEquals(len(facts), 1)
+        self.assertNotIn(threading.get_ident(), threads)  # the queryset was read on the pool
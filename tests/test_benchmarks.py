@@ -0,0 +1,23 @@
+import argparse
+from django.test import TestCase
+from benchmarks import generator, scenarios
+from . import models
+
+
+class TestBenchmarks(TestCase):
+
+    def test_generator_is_deterministic(self):
+        counts = generator.generate(30, seed=1)
+        self.assertEquals(models.TestOrderItem.objects.count(), counts['order_items'])
+        first = list(models.TestOrderItem.objects.order_by('pk').values_list('quantity', 'total'))
+        models.TestCustomer.objects.all().delete()
+        models.TestProduct.objects.all().delete()
+        generator.generate(30, seed=1)
+        self.assertEquals(list(models.TestOrderItem.objects.order_by('pk').values_list('quantity', 'total')), first)
+
+    def test_scenarios(self):
+        options = argparse.Namespace(scale=30, seed=0, sample=5, scenarios=None, trace_memory=False)
+        results = scenarios.run(options)
+        self.assertEquals([result['name'] for result in results], [name for name, scenario in scenarios.SCENARIOS])
+        self.assertTrue(all(result['queries'] for result in results))
+        self.assertEquals(models.OrderedProductFact.objects.filter(_is_dirty=True).count(), 0)
@@ -0,0 +1,51 @@
+from opinionated_reporting.bitmap import BitmapIndex, cube_mask, count
+from opinionated_reporting.cube import FactCube
+from . import models
+from .base import ReportingTestCase, QTY
+
+
+class TestBitmap(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        models.OrderedProductFact.record_update(self.order_item)
+        self.fact = models.OrderedProductFact.get_reporting_fact(self.order_item)
+        self.cube = FactCube(models.OrderedProductFact, measures=('quantity', 'total')).load()
+        self.weekday = BitmapIndex(self.cube, 'created_on', 'day_of_week')
+        self.quarter = BitmapIndex(self.cube, 'created_on', 'quarter_format')
+        self.customers = BitmapIndex(self.cube, 'customer')
+
+    def test_filter(self):
+        self.assertEquals(self.weekday.values(), [self.fact.created_on.day_of_week])
+        bits = self.weekday.get(self.fact.created_on.day_of_week) & self.quarter.get(self.fact.created_on.quarter_format)
+        self.assertEquals(count(bits), 1)
+        self.assertEquals(self.cube.total('quantity', mask=cube_mask(self.cube, bits)), QTY)
+        empty_customer = models.CustomerDimension.objects.get(_unique_identifier=0)
+        self.assertEquals(count(bits & self.customers.any_of([empty_customer.pk])), 0)  # keyed by dimension pk
+        self.assertEquals(count(bits & self.customers.any_of([empty_customer.pk, self.fact.customer.pk])), 1)
+
+    def test_refresh(self):
+        other_product = models.TestProduct.objects.create(name='Gadget', price=1)
+        item = models.TestOrderItem.objects.create(order=self.order, product=other_product, quantity=1, total=1)
+        models.OrderedProductFact.record_update(item)
+        self.cube.refresh()
+        product = BitmapIndex(self.cube, 'product', 'name')
+        self.assertEquals(count(self.customers.get(self.fact.customer.pk)), 2)
+        self.assertEquals(count(product.get('Gadget')), 1)
+        models.OrderedProductFact.objects.filter(_unique_identifier=item.id).delete()
+        self.cube.refresh()
+        self.assertEquals(count(self.customers.get(self.fact.customer.pk)), 1)
+        self.assertNotIn('Gadget', product)
+
+    def test_dimension_attribute_changes(self):
+        other_customer = models.TestCustomer.objects.create(email='baz@bar.com', name='Baz')
+        order = models.TestOrder.objects.create(customer=other_customer, ordered_on=self.order.ordered_on)
+        models.OrderedProductFact.record_update(models.TestOrderItem.objects.create(order=order, product=self.product, quantity=1, total=1))
+        self.cube.load()  # the later fact is re-read by every refresh, the first one isn't
+        names = BitmapIndex(self.cube, 'customer', 'name')
+        models.CustomerDimension.objects.filter(pk=self.fact.customer.pk).update(name='Renamed')
+        self.cube.refresh()  # the fact itself didn't change
+        self.assertNotIn(self.customer.name, names)
+        self.assertEquals(count(names.get('Renamed')), 1)
+        self.assertEquals(count(names.get('Baz')), 1)
+        other_customer.delete()
@@ -0,0 +1,51 @@
+import datetime
+from unittest import mock
+import pytz
+from django.test import SimpleTestCase
+from opinionated_reporting import buckets
+from opinionated_reporting.models import get_date_from_datetime, get_time_from
+from .base import ReportingTestCase
+from . import models
+
+
+class TestBuckets(SimpleTestCase):
+
+    def scalar(self, values, tz):
+        local = [value.astimezone(tz) for value in values]
+        return [value.date() for value in local], [value.hour for value in local]
+
+    def around(self, *moments):
+        # every 15 minutes for a day either side
+        start = pytz.utc.localize(datetime.datetime(*moments))
+        return [start + datetime.timedelta(minutes=15 * i) for i in range(-96, 96)]
+
+    def test_dst_transitions(self):
+        values = (self.around(2018, 3, 11, 7) + self.around(2018, 11, 4, 6) + self.around(2018, 3, 25, 1) +
+                  self.around(1970, 1, 1) + self.around(2038, 6, 1))
+        for name in ('US/Eastern', 'Europe/London', 'Asia/Kolkata', 'Australia/Lord_Howe', 'UTC', 'EST'):
+            tz = pytz.timezone(name)
+            self.assertEquals(buckets.local_buckets(values, tz), self.scalar(values, tz), name)
+            with mock.patch.object(buckets, 'np', None):
+                self.assertEquals(buckets.local_buckets(values, tz), self.scalar(values, tz), name)
+
+    def test_other_timezones(self):
+        values = self.around(2018, 3, 11, 7)
+        eastern = pytz.timezone('US/Eastern')
+        mixed = [value.astimezone(eastern) for value in values]  # aware in any zone, not just UTC
+        self.assertEquals(buckets.local_buckets(mixed, pytz.timezone('Europe/London')), self.scalar(values, pytz.timezone('Europe/London')))
+        self.assertEquals(buckets.local_buckets(values, datetime.timezone(datetime.timedelta(hours=-3))),
+                          self.scalar(values, datetime.timezone(datetime.timedelta(hours=-3))))
+
+
+class TestBatchBuckets(ReportingTestCase):
+
+    def test_record_update_many(self):
+        items = [self.order_item] + [models.TestOrderItem.objects.create(order=self.order, product=self.product) for i in range(5)]
+        facts = models.OrderedProductFact.record_update_many(items, force=True)
+        with get_date_from_datetime(self.order.created_on) as date, get_time_from(self.order.ordered_on) as time:
+            for fact in facts:
+                self.assertEquals(fact.created_on.date, date)
+                self.assertEquals(fact.hour_ordered_on.time, time)
+        # one query per dimension field, not per item
+        with self.assertNumQueries(6):
+            models.OrderedProductFact._prepare_batch(items)
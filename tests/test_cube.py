@@ -0,0 +1,53 @@
+from opinionated_reporting.cube import FactCube
+from . import models
+from .base import ReportingTestCase, QTY, TOTAL
+
+
+class TestCube(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        models.OrderedProductFact.record_update(self.order_item)
+        self.cube = FactCube(models.OrderedProductFact, measures=('quantity', 'total')).load()
+
+    def test_load(self):
+        self.assertEquals(len(self.cube), 1)
+        self.assertEquals(self.cube.codes['customer'].dtype.name, 'int32')
+        self.assertEquals(self.cube.measures['quantity'].dtype.name, 'int64')
+        self.assertEquals(self.cube.measures['total'].dtype.name, 'float64')
+        self.assertEquals(self.cube.total('total'), TOTAL)
+
+    def test_group_by(self):
+        by_name = self.cube.group_by('customer', attribute='name', measure='quantity')
+        self.assertEquals(by_name, {self.customer.name: QTY})
+        self.assertEquals(self.cube.mask(customer__name=self.customer.name).sum(), 1)
+        self.assertEquals(self.cube.mask(customer__name__in=[self.customer.name + ' Jr']).sum(), 0)  # longer than any name
+        fact = models.OrderedProductFact.get_reporting_fact(self.order_item)
+        weekday = fact.created_on.day_of_week
+        mask = self.cube.mask(created_on__day_of_week=weekday)
+        self.assertEquals(self.cube.group_by('product', measure='total', mask=mask), {fact.product.pk: TOTAL})
+        mask = self.cube.mask(created_on__day_of_week__in=[d for d in range(7) if d != weekday])
+        self.assertEquals(self.cube.group_by('product', measure='total', mask=mask), {})
+
+    def test_refresh(self):
+        self.order_item.quantity = QTY + 1
+        self.order_item.save()
+        models.OrderedProductFact.record_update(self.order_item, force=True)
+        changed = self.cube.refresh()
+        self.assertEquals(len(changed), 1)
+        self.assertEquals(self.cube.total('quantity'), QTY + 1)
+        models.OrderedProductFact.objects.all().delete()
+        self.cube.refresh()
+        self.assertEquals(len(self.cube), 0)
+        self.assertEquals(self.cube.total('quantity'), 0)
+
+    def test_refresh_after_dimension_rows_move(self):
+        item = models.TestOrderItem.objects.create(order=self.order, product=self.product, quantity=1, total=1)
+        models.OrderedProductFact.record_update(item)
+        self.cube.load()
+        customer_pk = models.OrderedProductFact.get_reporting_fact(self.order_item).customer_id
+        # the empty customer comes before the facts', without it every later row moves up a position
+        models.CustomerDimension.objects.filter(_unique_identifier=0).delete()
+        self.cube.refresh()
+        self.assertEquals(self.cube.group_by('customer', measure='quantity'), {customer_pk: QTY + 1})
+        self.assertEquals(self.cube.group_by('customer', attribute='name', measure='quantity'), {self.customer.name: QTY + 1})
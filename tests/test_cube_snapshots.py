@@ -0,0 +1,51 @@
+import shutil
+import tempfile
+from opinionated_reporting.cube import FactCube
+from opinionated_reporting import snapshot
+from . import models
+from .base import ReportingTestCase, QTY
+
+
+class TestSnapshot(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        models.OrderedProductFact.record_update(self.order_item)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super().tearDown()
+
+    def test_round_trip(self):
+        cube = FactCube(models.OrderedProductFact, measures=('quantity', 'total')).load()
+        snapshot.write_snapshot(cube, self.root)
+        self.assertFalse(snapshot.is_stale(self.root, models.OrderedProductFact))
+        mapped = snapshot.load_snapshot(self.root, models.OrderedProductFact)
+        self.assertFalse(mapped.pks.flags.writeable)
+        self.assertEquals(mapped.total('quantity'), QTY)
+        self.assertEquals(mapped.group_by('customer', attribute='name', measure='quantity'),
+                          cube.group_by('customer', attribute='name', measure='quantity'))
+
+    def test_stale(self):
+        cube = FactCube(models.OrderedProductFact).load()
+        snapshot.write_snapshot(cube, self.root)
+        self.order_item.quantity = QTY + 1
+        self.order_item.save()
+        models.OrderedProductFact.record_update(self.order_item, force=True)
+        self.assertTrue(snapshot.is_stale(self.root, models.OrderedProductFact))
+        with self.assertRaises(Exception):
+            snapshot.load_snapshot(self.root, models.OrderedProductFact)
+        mapped = snapshot.load_snapshot(self.root, models.OrderedProductFact, allow_stale=True)
+        mapped.refresh()
+        self.assertEquals(mapped.total('quantity'), QTY + 1)
+        snapshot.write_snapshot(mapped, self.root)
+        self.assertFalse(snapshot.is_stale(self.root, models.OrderedProductFact))
+        snapshot.prune_snapshots(self.root, keep=1)
+        self.assertEquals(snapshot.load_snapshot(self.root, models.OrderedProductFact).total('quantity'), QTY + 1)
+
+    def test_stale_after_update(self):
+        snapshot.write_snapshot(FactCube(models.OrderedProductFact).load(), self.root)
+        # an .update() doesn't bump `_updated_on`, the measure's sum still changes
+        models.OrderedProductFact.objects.update(quantity=QTY + 1)
+        self.assertTrue(snapshot.is_stale(self.root, models.OrderedProductFact))
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_save
+from django.utils import timezone
+from opinionated_reporting import dependencies, signals
+from .base import ReportingTestCase
+from . import models
+
+
+class TestDependencies(ReportingTestCase):
+
+    def test_dependency_map(self):
+        self.assertEquals(dependencies.get_dependents(models.TestOrder),
+                          [(models.OrderedProductFact, 'order', frozenset(['customer', 'created_on', 'ordered_on', 'cancelled']))])
+        # the customer and product dimensions copy everything the facts read from those rows
+        self.assertEquals(dependencies.get_dependents(models.TestCustomer), [])
+        self.assertEquals(dependencies.get_dependents(models.TestProduct), [])
+        self.assertEquals(dependencies.get_dependents(models.TestOrderItem), [])
+
+    def test_invalidate(self):
+        other_customer = models.TestCustomer.objects.create(email='baz@bar.com', name='Baz')
+        other_order = models.TestOrder.objects.create(customer=other_customer, ordered_on=timezone.now())
+        other_item = models.TestOrderItem.objects.create(order=other_order, product=self.product)
+        models.OrderedProductFact.record_update_many([self.order_item, other_item], force=True)
+        models.OrderedFact.record_update_many([self.order, other_order], force=True)
+
+        with self.assertNumQueries(0):
+            self.assertEquals(dependencies.invalidate(self.order, changed=['tax']), {})  # no fact copies it
+        with self.assertNumQueries(1):
+            marked = dependencies.invalidate(self.order, changed=['ordered_on'])
+        self.assertEquals(marked, {models.OrderedProductFact: 1})
+        self.assertEquals(list(models.OrderedProductFact.objects.filter(_is_dirty=True).values_list('_unique_identifier', flat=True)),
+                          [self.order_item.pk])
+        self.assertFalse(models.OrderedFact.objects.filter(_is_dirty=True).exists())
+        other_customer.delete()
+
+    def test_signal(self):
+        models.OrderedFact.record_update(self.order)
+        post_save.connect(signals.dirty_dependents_on_save, sender=models.TestCustomer)
+        try:
+            self.customer.name = 'Bar Foo'
+            self.customer.save()
+        finally:
+            post_save.disconnect(signals.dirty_dependents_on_save, sender=models.TestCustomer)
+        fact = models.OrderedFact.get_reporting_fact(self.order)
+        self.assertFalse(fact._is_dirty)  # it only stores the dimension key
+        self.assertEquals(fact.customer.name, 'Bar Foo')
@@ -0,0 +1,38 @@
+from opinionated_reporting import stats
+from .base import ReportingTestCase
+from . import models
+
+
+class TestDimensionFingerprints(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stats.reset()
+
+    def test_unchanged_dimension_is_not_written(self):
+        dimension = models.CustomerDimension.record_update(self.customer, force=True)
+        updated_on = dimension._updated_on
+        self.assertTrue(dimension._fingerprint)
+
+        dimension = models.CustomerDimension.record_update(self.customer, force=True)
+        self.assertEqual(models.CustomerDimension.objects.get(pk=dimension.pk)._updated_on, updated_on)
+        self.assertEqual(stats.get_stats(models.CustomerDimension).counters[stats.EVENT_UNCHANGED], 1)
+
+        self.customer.name = 'Bar Foo'
+        self.customer.save()
+        models.CustomerDimension.mark_dirty(self.customer)
+        dimension = models.CustomerDimension.record_update(self.customer)
+        self.assertEqual(models.CustomerDimension.objects.get(pk=dimension.pk).name, 'Bar Foo')
+        self.assertFalse(models.CustomerDimension.objects.get(pk=dimension.pk)._is_dirty)
+
+    def test_sync_dimension(self):
+        other = models.TestCustomer.objects.create(email='baz@bar.com', name='Baz')
+        models.CustomerDimension.objects.exclude(_unique_identifier=0).delete()
+        self.assertEqual(models.CustomerDimension.sync_dimension(), {'created': 2, 'updated': 0, 'unchanged': 0})
+
+        other.name = 'Baz Bar'
+        other.save()
+        with self.assertNumQueries(5):  # fingerprints, the customers, one UPDATE, and the savepoint around it
+            self.assertEqual(models.CustomerDimension.sync_dimension(), {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(models.CustomerDimension.objects.get(_unique_identifier=other.pk).name, 'Baz Bar')
+        other.delete()
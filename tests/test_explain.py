@@ -0,0 +1,44 @@
+import io
+from django.core.management import call_command
+from opinionated_reporting import explain
+from .base import ReportingTestCase
+from . import models
+
+
+class TestExplain(ReportingTestCase):
+
+    def test_plans(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        plans = {plan.label: plan for plan in explain.explain_fact(models.OrderedProductFact)}
+        for label in ('listing', 'totals', 'listing by customer', 'listing by created_on range and product', 'sampled totals',
+                      'leaderboard total by customer per quarter top', 'export', 'dirty facts', 'soft deleted facts'):
+            self.assertTrue(plans[label].lines)
+        # by the primary key, not sorted like the co-routine of the page's window aggregates
+        self.assertEquals(plans['listing'].temp_btrees, [])
+
+        # summing per date and customer sorts every fact into a temporary B-tree
+        rebuild = plans['leaderboard total by customer per quarter rebuild']
+        self.assertTrue(rebuild.temp_btrees)
+        self.assertEquals(rebuild.suggestion, ('_is_deleted', 'customer', 'ordered_on'))
+        self.assertGreater(rebuild.size, 0)
+        suggestions = explain.get_suggestions(plans.values(), models.OrderedProductFact)
+        self.assertIn(('_is_deleted', 'customer', 'ordered_on'), suggestions)
+        self.assertNotIn(plans['leaderboard total by customer per quarter top'].suggestion, suggestions)  # not the fact's table
+
+    def test_problems_and_suggestions(self):
+        lines = ['SCAN TABLE tests_orderedfact', 'SEARCH tests_customerdimension USING INTEGER PRIMARY KEY (rowid=?)',
+                 'SCAN tests_productdimension USING COVERING INDEX foo', 'USE TEMP B-TREE FOR ORDER BY']
+        self.assertEquals(explain.find_problems('sqlite', lines), (['tests_orderedfact'], ['USE TEMP B-TREE FOR ORDER BY']))
+        lines = ['Sort  (cost=1.02..1.03 rows=1 width=4)', '  ->  Seq Scan on tests_orderedfact  (cost=0.00..1.01 rows=1 width=4)']
+        self.assertEquals(explain.find_problems('postgresql', lines), (['tests_orderedfact'], [lines[0]]))
+
+        dirty = models.OrderedFact._base_manager.filter(_is_dirty=True, _is_frozen=False)
+        self.assertIn(['_is_dirty', '_is_frozen'], explain.get_index_columns(models.OrderedFact))
+        self.assertIsNone(explain.suggest_index(explain.ReportQuery('dirty facts', dirty)))  # `ReportingMeta.indexes`
+        by_customer = models.OrderedProductFact._default_manager.filter(_is_dirty=True, order_id__gte=2).order_by('customer')
+        self.assertEquals(explain.suggest_index(explain.ReportQuery('custom', by_customer)), ('_is_deleted', '_is_dirty', 'customer', 'order_id'))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('reporting_explain', model=['tests.OrderedProductFact'], stdout=out)
+        self.assertIn("('_is_deleted', 'customer', 'ordered_on'),  # ~", out.getvalue())
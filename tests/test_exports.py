@@ -0,0 +1,101 @@
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from opinionated_reporting import exports, models as opr_models, reports
+from .base import ReportingTestCase, ReportingTransactionTestCase
+from . import models
+
+
+class TestExports(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        models.OrderedProductFact.record_update(self.order_item)
+
+    def test_in_memory_matches_sql(self):
+        expected = list(reports.render_rows(models.OrderedProductFact))
+        exporter = exports.FactExporter(models.OrderedProductFact, threshold=30)
+        rows = list(exporter.rows())
+        self.assertEquals(rows, expected)
+        # every dimension is under the threshold here
+        self.assertEquals(sorted(exporter.tables), ['created_on', 'customer', 'hour_created_on', 'hour_ordered_on', 'ordered_on', 'product'])
+
+        exporter = exports.FactExporter(models.OrderedProductFact, threshold=0, in_memory=['hour_created_on'])
+        self.assertEquals(list(exporter.rows()), expected)
+        self.assertEquals(list(exporter.tables), ['hour_created_on'])
+        self.assertEquals(exporter.tables['hour_created_on'][1].model, opr_models.HourDimension)
+
+    def test_queries(self):
+        exporter = exports.FactExporter(models.OrderedProductFact, in_sql=['product', 'customer'])
+        with self.assertNumQueries(2 + 2 + 1):  # a count and a load for the dates and the hours, then the facts
+            exporter.rows().__next__()
+
+
+class TestParallelExport(ReportingTransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        for days in range(5):
+            order = models.TestOrder.objects.create(customer=self.customer, ordered_on=self.order.ordered_on + datetime.timedelta(days=days - 2))
+            for total in range(days % 3 + 1):
+                models.TestOrderItem.objects.create(order=order, product=self.product, quantity=1, total=total)
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+        super().tearDown()
+
+    def test_matches_sequential(self):
+        for partition_by in ('_unique_identifier', 'ordered_on'):
+            exporter = exports.FactExporter(models.OrderedProductFact)
+            self.assertIn(len(exporter.get_ranges(partition_by, partitions=3)), (2, 3))  # a busy day is never split
+            sequential = io.StringIO(newline='')
+            count = exporter.write_csv(sequential, exporter.ordered(partition_by))
+            path = os.path.join(self.directory, 'facts.csv')
+            self.assertEquals(exporter.write_csv_parallel(path, partition_by=partition_by, partitions=3,
+                                                          executor=ThreadPoolExecutor(max_workers=3)), count)
+            with open(path, newline='') as output:
+                self.assertEquals(output.read(), sequential.getvalue())
+            self.assertEquals(os.listdir(self.directory), ['facts.csv'])  # the parts are joined and removed
+
+    def test_one_partition(self):
+        exporter = exports.FactExporter(models.OrderedProductFact)
+        self.assertEquals(exporter.get_ranges(partitions=1), [(None, None)])
+        self.assertEquals(exporter.get_partition('_unique_identifier', None, None).count(), models.OrderedProductFact.objects.count())
+        executor = ThreadPoolExecutor(max_workers=1)
+        for partition_by in ('_unique_identifier', 'ordered_on'):  # the caller's executor is still usable after each
+            path = os.path.join(self.directory, 'facts.csv')
+            self.assertEquals(exporter.write_csv_parallel(path, partition_by=partition_by, partitions=1, executor=executor),
+                              models.OrderedProductFact.objects.count())
+        executor.shutdown()
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == 'fork', 'spawned workers would not see the in-memory test database')
+    def test_process_pool(self):
+        exporter = exports.FactExporter(models.OrderedProductFact)
+        sequential = io.StringIO(newline='')
+        count = exporter.write_csv(sequential, exporter.ordered())
+        path = os.path.join(self.directory, 'facts.csv')
+        self.assertEquals(exporter.write_csv_parallel(path, partitions=2, workers=2), count)
+        with open(path, newline='') as output:
+            self.assertEquals(output.read(), sequential.getvalue())
+
+    def test_manifest(self):
+        exporter = exports.FactExporter(models.OrderedProductFact)
+        path = os.path.join(self.directory, 'facts.json')
+        count = exporter.write_csv_parallel(path, partitions=2, manifest=True, executor=ThreadPoolExecutor(max_workers=2))
+        with open(path) as output:
+            manifest = json.load(output)
+        self.assertEquals(manifest['rows'], count)
+        self.assertEquals(sum(part['rows'] for part in manifest['parts']), models.OrderedProductFact.objects.count())
+        self.assertEquals(len(os.listdir(self.directory)), 3)
+        with self.assertRaises(Exception):
+            exporter.get_partition_key('customer')
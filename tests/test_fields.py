@@ -0,0 +1,80 @@
+from decimal import Decimal
+from unittest import mock
+from django.db import connections, router
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Avg, Sum
+from django.test import TransactionTestCase
+from django.utils import timezone
+from opinionated_reporting import fields
+from opinionated_reporting.filters import FactFilter
+from .base import ReportingTestCase
+from . import models
+
+BEFORE_CENTS = ('tests', '0011_auto_20261019_0307')
+CENTS = ('tests', '0012_auto_20261019_0308')
+
+
+class TestScaledDecimals(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = models.TestOrder.objects.create(customer=self.customer, total=Decimal('2.35'), ordered_on=timezone.now())
+        self.order.refresh_from_db()
+
+    def tearDown(self):
+        self.other.delete()
+        super().tearDown()
+
+    def test_scaled_decimals(self):
+        models.OrderedFact.record_update_many([self.order, self.other])
+        in_python = sorted(models.OrderedFact.objects.values_list('_unique_identifier', 'total'))
+        self.assertEquals(in_python, sorted([(self.order.pk, self.order.total), (self.other.pk, Decimal('2.35'))]))
+        stored = models.OrderedFact.objects.filter(_unique_identifier=self.other.pk).extra(select={'raw': 'total'}).values_list('raw', flat=True)
+        self.assertEquals(list(stored), [235])
+
+        models.OrderedFact.rebuild()
+        self.assertEquals(sorted(models.OrderedFact.objects.values_list('_unique_identifier', 'total')), in_python)
+        self.assertEquals(models.OrderedFact.objects.filter(total=Decimal('2.35')).count(), 1)
+        totals = models.OrderedFact.objects.aggregate(sum=Sum('total'), avg=fields.Avg('total'))
+        self.assertEquals(totals['sum'], self.order.total + Decimal('2.35'))
+        self.assertIsInstance(totals['avg'], Decimal)
+        self.assertEquals(totals['avg'], (self.order.total + Decimal('2.35')) / 2)
+
+    @mock.patch.object(models.OrderedFact.ReportingMeta, 'total', {'total': Sum('total'), 'average': Avg('total')})
+    def test_plain_avg_in_totals(self):
+        models.OrderedFact.record_update_many([self.order, self.other])
+        average = (self.order.total + Decimal('2.35')) / 2
+        self.assertEquals(models.OrderedFact.objects.aggregate(average=Avg('total'))['average'], float(average * 100))  # the trap
+        facts = FactFilter(models.OrderedFact)
+        self.assertEquals(facts.totals()['average'], average)
+        self.assertEquals(facts.page().totals, {'total': self.order.total + Decimal('2.35'), 'average': average})
+
+
+class TestScaledMigration(TransactionTestCase):
+
+    def migrate(self, connection, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([target])
+        return executor.loader.project_state(target).apps
+
+    def test_round_trip(self):
+        connection = connections[router.db_for_write(models.OrderedFact)]
+        latest = MigrationExecutor(connection).loader.graph.leaf_nodes('tests')[0]
+        try:
+            apps = self.migrate(connection, BEFORE_CENTS)
+            totals = [Decimal('12.34'), Decimal('0.05'), Decimal('99999999.99')]
+            for i, total in enumerate(totals):
+                apps.get_model('tests', 'OrderedFact')._base_manager.create(_unique_identifier=i + 1, total=total)
+
+            apps = self.migrate(connection, CENTS)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT total FROM tests_orderedfact ORDER BY _unique_identifier')
+                self.assertEquals([row[0] for row in cursor.fetchall()], [1234, 5, 9999999999])
+            self.assertEquals(list(apps.get_model('tests', 'OrderedFact')._base_manager.order_by('_unique_identifier')
+                                   .values_list('total', flat=True)), totals)
+
+            apps = self.migrate(connection, BEFORE_CENTS)
+            self.assertEquals(list(apps.get_model('tests', 'OrderedFact')._base_manager.order_by('_unique_identifier')
+                                   .values_list('total', flat=True)), totals)
+        finally:
+            self.migrate(connection, latest)
@@ -0,0 +1,73 @@
+import datetime
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.http import QueryDict
+from django.utils import timezone
+from opinionated_reporting import filters
+from opinionated_reporting.models import DateDimension
+from .base import ReportingTestCase, QTY
+from . import models
+
+
+class TestFactFilter(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_customer = models.TestCustomer.objects.create(email='baz@bar.com', name='Baz')
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        self.other_order = models.TestOrder.objects.create(customer=self.other_customer, ordered_on=yesterday)
+        models.TestOrder.objects.filter(pk=self.other_order.pk).update(created_on=yesterday)
+        self.other_order.refresh_from_db()
+        self.other_items = [models.TestOrderItem.objects.create(order=self.other_order, product=self.product, quantity=1, total=i)
+                            for i in range(1, 4)]
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+
+    def tearDown(self):
+        self.other_customer.delete()
+        super().tearDown()
+
+    def test_filters(self):
+        customer = models.CustomerDimension.objects.get(_unique_identifier=self.other_customer.pk)
+        self.assertEquals(filters.FactFilter(models.OrderedProductFact, {'customer': customer.pk}).qs.count(), 3)
+        self.assertEquals(filters.FactFilter(models.OrderedProductFact, {'customer__name': 'foo'}).qs.count(), 1)
+        today = timezone.localtime(timezone.now()).date()
+        self.assertEquals(filters.FactFilter(models.OrderedProductFact, {'created_on__after': today.isoformat()}).qs.count(), 1)
+        weekday = DateDimension.objects.get(date=today).day_of_week
+        data = QueryDict(mutable=True)
+        data.setlist('ordered_on__day_of_week', [str(weekday)])
+        self.assertEquals(filters.FactFilter(models.OrderedProductFact, data).qs.count(), 1)
+
+    def test_invalid_values(self):
+        facts = filters.FactFilter(models.OrderedProductFact, {'customer': 'abc', 'created_on__after': '2018-13-45', 'customer__name': 'foo'})
+        self.assertFalse(facts.is_valid())
+        self.assertEquals(sorted(facts.errors), ['created_on__after', 'customer'])
+        with self.assertRaises(ValidationError) as raised:
+            facts.qs
+        self.assertEquals(sorted(raised.exception.message_dict), ['created_on__after', 'customer'])
+        self.assertTrue(filters.FactFilter(models.OrderedProductFact, {'customer__name': 'foo'}).is_valid())
+
+    def test_page_in_one_query(self):
+        facts = filters.FactFilter(models.OrderedProductFact)
+        with self.assertNumQueries(1):
+            page = facts.page(offset=0, limit=2)
+        self.assertEquals(len(page.rows), 2)
+        self.assertEquals(page.count, 4)
+        self.assertTrue(page.has_next)
+        self.assertEquals(page.totals, {'total': Decimal(self.order_item.total) + 6, 'quantity': QTY + 3})
+        self.assertEquals(page.rows[0].product.name, self.product.name)
+
+        page = facts.page(offset=2, limit=2, columns=['_unique_identifier', 'customer__name'])
+        self.assertEquals(page.rows, [(item.pk, 'Baz') for item in self.other_items[1:]])
+        self.assertEquals(page.count, 4)
+
+        page = facts.page(offset=10)
+        self.assertEquals((page.rows, page.count, page.totals['quantity']), ([], 4, QTY + 3))
+
+    def test_page_of_annotated_queryset(self):
+        annotated = models.OrderedProductFact._default_manager.annotate(**{filters.TOTAL_PREFIX + 'doubled': F('total') * 2})
+        facts = filters.FactFilter(models.OrderedProductFact, queryset=annotated)
+        totals = {'total': Decimal(self.order_item.total) + 6, 'quantity': QTY + 3}
+        self.assertEquals(facts.page(limit=2).totals, totals)  # only the windows are summed up
+        page = facts.page(limit=2, columns=['_unique_identifier'])
+        self.assertEquals((len(page.rows[0]), page.totals), (1, totals))
@@ -0,0 +1,35 @@
+from unittest import mock
+from opinionated_reporting.models import ChangeJournal
+from .base import ReportingTestCase, TAX
+from . import models
+
+
+@mock.patch.object(models.OrderedFact.ReportingMeta, 'journal', True, create=True)
+class TestChangeJournal(ReportingTestCase):
+
+    def test_consume(self):
+        models.OrderedFact.record_update(self.order)
+        self.order.tax = TAX
+        self.order.total += TAX
+        self.order.save()
+        self.order.save()
+        # the fact table isn't touched on save
+        self.assertFalse(models.OrderedFact.get_reporting_fact(self.order)._is_dirty)
+        self.assertEquals(models.OrderedFact.backlog()['dirty'], 2)
+
+        self.assertEquals(ChangeJournal.consume(models.OrderedFact), 2)
+        self.assertEquals(models.OrderedFact.get_reporting_fact(self.order).total, self.order.total)
+        self.assertEquals(models.OrderedFact.backlog()['dirty'], 0)
+        self.assertEquals(ChangeJournal.consume(models.OrderedFact), 0)
+
+        ChangeJournal.rewind(models.OrderedFact)
+        self.assertEquals(ChangeJournal.consume(models.OrderedFact, batch_size=1), 1)
+        self.assertEquals(ChangeJournal.trim(models.OrderedFact), 1)
+        self.assertEquals(ChangeJournal.objects.count(), 1)
+
+    def test_new_facts(self):
+        order = models.TestOrder.objects.create(customer=self.customer, total=1, ordered_on=self.order.ordered_on)
+        self.assertFalse(models.OrderedFact.objects.filter(_unique_identifier=order.pk).exists())
+        ChangeJournal.consume(models.OrderedFact)
+        self.assertEquals(models.OrderedFact.get_reporting_fact(order).total, 1)
+        order.delete()
@@ -0,0 +1,83 @@
+import datetime
+from unittest import mock
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from opinionated_reporting.leaderboards import period_of
+from opinionated_reporting.models import DateDimension, LeaderboardEntry, local_tz
+from .base import ReportingTestCase
+from . import models
+
+
+class TestLeaderboards(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_customer = models.TestCustomer.objects.create(email='baz@bar.com', name='Baz')
+        self.other_order = models.TestOrder.objects.create(customer=self.other_customer, ordered_on=self.order.ordered_on)
+        for total in (20, 30):
+            models.TestOrderItem.objects.create(order=self.other_order, product=self.product, quantity=1, total=total)
+        self.quarter = period_of(timezone.localdate(), 'quarter')
+
+    def tearDown(self):
+        self.other_customer.delete()
+        super().tearDown()
+
+    def entries(self):
+        return sorted(LeaderboardEntry.objects.values_list('measure', 'period', 'member', 'value'))
+
+    def test_top(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        leaders = models.OrderedProductFact.top('total', 'customer', grain='quarter', n=1)
+        self.assertEquals([(customer.name, value) for customer, value in leaders], [('Baz', 50)])
+        leaders = models.OrderedProductFact.top('total', 'customer', grain='quarter', period=self.quarter)
+        self.assertEquals([customer.name for customer, value in leaders], ['Baz', 'Foo Bar'])
+        with self.assertRaises(Exception):
+            models.OrderedProductFact.top('total', 'product', grain='year')
+
+        # the same as computing it from scratch
+        incremental = self.entries()
+        models.OrderedProductFact.rebuild_leaderboards()
+        self.assertEquals(self.entries(), incremental)
+
+    def test_top_in_another_timezone(self):
+        # late on the last day of a quarter in settings.TIME_ZONE is already the next quarter in Tokyo
+        quarter_end = local_tz.localize(datetime.datetime(2026, 9, 30, 23, 30))
+        DateDimension.init_dimension_by_range(quarter_end.date(), quarter_end.date())
+        models.TestOrder.objects.filter(pk__in=[self.order.pk, self.other_order.pk]).update(ordered_on=quarter_end)
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        with mock.patch.object(timezone, 'now', return_value=quarter_end), timezone.override('Asia/Tokyo'):
+            leaders = models.OrderedProductFact.top('total', 'customer', grain='quarter', n=1)
+        self.assertEquals([(customer.name, value) for customer, value in leaders], [('Baz', 50)])
+
+    def test_moves_and_deletes(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        # back a quarter, and then cancelled
+        earlier = timezone.now() - datetime.timedelta(days=100)
+        with transaction.atomic():
+            DateDimension.init_dimension_by_range(timezone.localtime(earlier).date(), timezone.localtime(earlier).date())
+        self.other_order.ordered_on = earlier
+        self.other_order.save()
+        models.OrderedProductFact.record_update_many(self.other_order.testorderitem_set.all(), force=True)
+        self.assertEquals([customer.name for customer, value in models.OrderedProductFact.top('total', 'customer', grain='quarter')], ['Foo Bar'])
+        earlier_quarter = period_of(timezone.localtime(earlier).date(), 'quarter')
+        self.assertEquals(models.OrderedProductFact.top('total', 'customer', grain='quarter', period=earlier_quarter)[0][1], 50)
+
+        self.other_order.cancelled = True
+        self.other_order.save()
+        for item in self.other_order.testorderitem_set.all():
+            models.OrderedProductFact.record_update(item)
+        self.assertEquals(models.OrderedProductFact.top('total', 'customer', grain='quarter', period=earlier_quarter), [])
+        sums = models.OrderedProductFact.objects.aggregate(quantity=Sum('quantity'))
+        self.assertEquals(LeaderboardEntry.objects.filter(measure='quantity').aggregate(quantity=Sum('value'))['quantity'], sums['quantity'])
+
+    def test_cancelled_before_first_refresh(self):
+        self.other_order.cancelled = True
+        self.other_order.save()
+        models.OrderedProductFact._base_manager.all().delete()  # nothing refreshed yet
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        self.assertEquals(models.OrderedProductFact.objects.count(), 1)
+        self.assertEquals([customer.name for customer, value in models.OrderedProductFact.top('total', 'customer', grain='quarter')], ['Foo Bar'])
+        incremental = self.entries()
+        models.OrderedProductFact.rebuild_leaderboards()
+        self.assertEquals(self.entries(), incremental)
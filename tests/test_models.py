@@ -1,57 +1,15 @@
-import datetime
-from django.test import TestCase
-from django.db import transaction
+import io
+from unittest import mock
+from django.core.management import call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from opinionated_reporting import models as opr_models
+from opinionated_reporting import rows
 from . import models
+from .base import ReportingTestCase, TAX
 
-PRICE = 5.00
-QTY = 2
-TAX = 0.50
-TOTAL = (PRICE * QTY)  # omitting tax for test below
-
-
-class TestModels(TestCase):
-
-    def setUp(self):
-        opr_models.HourDimension.objects.all().delete()
-        with transaction.atomic():
-            opr_models.HourDimension.init_dimension()
-
-        opr_models.DateDimension.objects.all().delete()
-        with transaction.atomic():
-            opr_models.DateDimension.init_dimension_by_range(datetime.date.today() - datetime.timedelta(days=3), datetime.date.today() + datetime.timedelta(days=3))
-
-        with transaction.atomic():
-            models.CustomerDimension.init_dimension()
-        with transaction.atomic():
-            models.ProductDimension.init_dimension()
-
-        self.product = models.TestProduct.objects.create(**{
-            'name': 'Widget',
-            'price': PRICE
-        })
-        self.customer = models.TestCustomer.objects.create(**{
-            'email': 'foo@bar.com',
-            'name': 'Foo Bar'
-        })
-        self.order = models.TestOrder.objects.create(**{
-            'customer': self.customer,
-            'total': PRICE * QTY,
-            'ordered_on': timezone.now()
-        })
-        assert self.order.created_on
-        self.order_item = models.TestOrderItem.objects.create(**{
-            'order': self.order,
-            'product': self.product,
-            'quantity': QTY,
-            'total': TOTAL,
-        })
-
-    def tearDown(self):
-        self.order.delete()
-        self.product.delete()
-        self.customer.delete()
+
+class TestModels(ReportingTestCase):
 
     def test_creation(self):
         fact = models.OrderedFact.get_reporting_fact(self.order)
@@ -96,6 +54,50 @@ class TestModels(TestCase):
         models.OrderedFact.record_update(self.order)
         self.assertEquals(models.OrderedFact.objects.all().count(), 0)
 
+    @mock.patch.object(models.OrderedFact.ReportingMeta, 'soft_delete', True, create=True)
+    def test_soft_delete(self):
+        models.OrderedFact.record_update(self.order)
+        self.order.cancelled = True
+        self.order.save()
+        with self.assertNumQueries(2):  # the fact, one UPDATE
+            models.OrderedFact.record_update(self.order)
+        self.assertEquals(models.OrderedFact.objects.count(), 0)
+        self.assertEquals(models.OrderedFact._base_manager.filter(_is_deleted=True).count(), 1)
+
+        # un-cancelling brings the same fact back
+        self.order.cancelled = False
+        self.order.save()
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(models.OrderedFact.objects.count(), 1)
+        self.assertEquals(models.OrderedFact._base_manager.count(), 1)
+
+        self.order.cancelled = True
+        self.order.save()
+        models.OrderedFact.record_update(self.order)
+        call_command('reporting_purge', stdout=io.StringIO())
+        self.assertEquals(models.OrderedFact._base_manager.count(), 0)
+
+    @mock.patch.object(models.OrderedFact.ReportingMeta, 'soft_delete', True, create=True)
+    def test_soft_delete_revived_when_dirty(self):
+        models.OrderedFact.record_update(self.order)
+        self.order.cancelled = True
+        self.order.save()
+        models.OrderedFact.refresh_dirty()
+        self.assertEquals(models.OrderedFact.objects.count(), 0)
+
+        # the signal marks the tombstone dirty, the queue brings it back
+        for refresh in (models.OrderedFact.refresh_dirty, models.OrderedFact.refresh_claimed):
+            self.order.cancelled = False
+            self.order.save()
+            self.assertEquals(models.OrderedFact.backlog()['dirty'], 1)
+            self.assertEquals(refresh(), 1)
+            fact = models.OrderedFact._base_manager.get()
+            self.assertEquals((fact._is_deleted, fact._is_dirty), (False, False))
+            self.order.cancelled = True
+            self.order.save()
+            self.assertEquals(refresh(), 1)
+            self.assertEquals(models.OrderedFact._base_manager.filter(_is_deleted=True, _is_dirty=False).count(), 1)
+
     def test_freeze(self):
         models.OrderedFact.record_update(self.order)
         self.assertGreater(models.OrderedFact.objects.all().count(), 0)
@@ -105,3 +107,54 @@ class TestModels(TestCase):
         self.order.save()
         models.OrderedFact.record_update(self.order)
         self.assertGreater(models.OrderedFact.objects.all().count(), 0)
+
+    def test_refresh_dirty(self):
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(models.OrderedFact.get_reporting_fact(self.order)._is_dirty, False)
+        self.order.tax = TAX
+        self.order.total += TAX
+        self.order.save()
+        self.assertEquals(models.OrderedFact.refresh_dirty(), 1)
+        fact = models.OrderedFact.get_reporting_fact(self.order)
+        self.assertEquals(fact._is_dirty, False)
+        self.assertEquals(fact.total, self.order.total)
+        self.assertEquals(models.OrderedFact.refresh_dirty(), 0)
+
+    def test_refresh_dirty_queries(self):
+        def queries(items):
+            models.OrderedProductFact.record_update_many(items, force=True)
+            models.OrderedProductFact._base_manager.update(_is_dirty=True)
+            with CaptureQueriesContext(connections['default']) as captured:
+                self.assertEquals(models.OrderedProductFact.refresh_dirty(), len(items))
+            return len(captured)
+        one = queries([self.order_item])
+        items = [self.order_item] + [models.TestOrderItem.objects.create(order=self.order, product=self.product) for i in range(5)]
+        # business rows are read with their relations, dimensions once per batch
+        self.assertEquals(queries(items), one)
+
+    def test_record_update_many(self):
+        facts = models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all())
+        self.assertEquals(len(facts), 1)
+        self.assertEquals(facts[0].order_id, self.order.id)
+        self.assertEquals(models.OrderedProductFact.objects.filter(_is_dirty=True).count(), 0)
+
+    def test_record_update_values(self):
+        models.CustomerDimension.objects.filter(_unique_identifier=self.customer.pk).delete()
+        row = next(models.OrderedProductFact.iter_rows())
+        self.assertEquals(row.order.customer.name, self.customer.name)
+        self.assertFalse(hasattr(row, '__dict__'))
+
+        self.assertEquals(models.OrderedProductFact.record_update_values(), 1)
+        fact = models.OrderedProductFact.get_reporting_fact(self.order_item)
+        self.assertEquals(fact.order_id, self.order.id)
+        self.assertEquals(fact.total, self.order_item.total)
+        self.assertEquals(fact.product.name, self.product.name)
+        self.assertEquals(fact.customer.email, self.customer.email)  # created from the row
+        self.assertEquals(fact.ordered_on.date, timezone.localtime(self.order.ordered_on).date())
+
+    def test_rows_with_null_values(self):
+        models.TestOrder.objects.filter(pk=self.order.pk).update(ordered_on=None)
+        row = next(rows.RowReader(models.TestOrderItem, ['order__ordered_on']).read(models.TestOrderItem.objects.all()))
+        self.assertIsNotNone(row.order)  # the order is there, only its ordered_on is null
+        self.assertIsNone(row.order.ordered_on)
+        self.assertEquals(row.order.id, self.order.pk)
@@ -0,0 +1,32 @@
+from opinionated_reporting.profiling import profile_refresh, assert_max_queries, assert_refresh_queries, normalize
+from . import models
+from .base import ReportingTestCase
+
+
+class TestProfiling(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(2):
+            models.TestOrderItem.objects.create(order=self.order, product=self.product, quantity=1, total=1)
+
+    def test_normalize(self):
+        self.assertEquals(normalize('SELECT  *\n FROM t WHERE id IN (%s, %s,%s)'), 'SELECT * FROM t WHERE id IN (%s, ...)')
+
+    def test_profile(self):
+        recorder = profile_refresh(models.OrderedProductFact)
+        labels = set(pattern.label for pattern in recorder.n_plus_one())
+        # every row loads its order through the aliases and looks up its dimensions
+        self.assertIn('created_on (dimension_aliases)', labels)
+        self.assertIn('hour_created_on (dimension_aliases)', labels)
+        self.assertIn('save', labels)
+        self.assertIn('N+1', recorder.report())
+        # profiling doesn't keep what it refreshed
+        self.assertEquals(models.OrderedProductFact.objects.filter(_is_dirty=False).count(), 0)
+
+    def test_assert_max_queries(self):
+        with self.assertRaises(AssertionError):
+            assert_refresh_queries(models.OrderedProductFact, models.TestOrderItem.objects.all(), 5)
+        with assert_max_queries(100) as recorder:
+            models.OrderedFact.record_update(self.order)
+        self.assertGreater(len(recorder.statements), 0)
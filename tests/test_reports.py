@@ -0,0 +1,39 @@
+import csv
+import io
+from unittest import mock
+from opinionated_reporting import reports
+from .base import ReportingTestCase
+from . import models
+
+
+class TestReports(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        models.OrderedProductFact.record_update(self.order_item)
+
+    def csv(self, rows):
+        output = io.StringIO()
+        csv.writer(output).writerows(rows)
+        return output.getvalue()
+
+    def test_trace_row_description(self):
+        paths = reports.trace_row_description(models.OrderedProductFact)
+        self.assertEquals(paths[:3], ['_unique_identifier', 'product__name', 'quantity'])
+        self.assertIn('hour_ordered_on__time', paths)
+
+    def test_render_rows(self):
+        with self.assertNumQueries(1):
+            rows = list(reports.render_rows(models.OrderedProductFact))
+        self.assertEquals(len(rows), 1)
+        self.assertIsInstance(rows[0], tuple)
+        self.assertEquals(self.csv(rows), self.csv(reports.render_instances(models.OrderedProductFact)))
+
+    def test_untraceable(self):
+        row_description = lambda row: [str(row._unique_identifier)]  # NOQA
+        with mock.patch.object(models.OrderedProductFact.ReportingMeta, 'row_description', row_description):
+            with self.assertRaises(reports.NotTraceable):
+                reports.trace_row_description(models.OrderedProductFact)
+            self.assertEquals(list(reports.render(models.OrderedProductFact)), [[str(self.order_item.pk)]])
+        output = io.StringIO()
+        self.assertEquals(reports.write_csv(models.OrderedProductFact, output), 1)
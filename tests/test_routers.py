@@ -0,0 +1,32 @@
+from django.test import override_settings
+from opinionated_reporting.routers import ReportingRouter
+from . import models
+from .base import ReportingTestCase
+
+
+@override_settings(DATABASE_ROUTERS=['opinionated_reporting.routers.ReportingRouter'], OPINIONATED_REPORTING_DATABASE='reporting')
+class TestRouters(ReportingTestCase):
+    databases = {'default', 'reporting'}
+
+    def test_routing(self):
+        router = ReportingRouter()
+        self.assertEquals(router.db_for_write(models.OrderedFact), 'reporting')
+        self.assertEquals(router.db_for_read(models.CustomerDimension), 'reporting')
+        self.assertIsNone(router.db_for_read(models.TestOrder))
+        self.assertTrue(router.allow_migrate('reporting', 'opinionated_reporting', 'datedimension'))
+        self.assertFalse(router.allow_migrate('default', 'tests', 'orderedfact'))
+        self.assertFalse(router.allow_migrate('reporting', 'tests', 'testorder'))
+
+    def test_refresh_across_databases(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all())
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(models.OrderedProductFact.objects.using('reporting').count(), 1)
+        self.assertEquals(models.OrderedProductFact.objects.using('default').count(), 0)
+        self.assertEquals(models.CustomerDimension.objects.using('default').count(), 0)
+        fact = models.OrderedProductFact.objects.get(_unique_identifier=self.order_item.id)
+        self.assertEquals(fact.customer.name, self.customer.name)
+        self.assertEquals(fact.created_on._state.db, 'reporting')
+        self.order.total += 1
+        self.order.save()
+        self.assertEquals(models.OrderedFact.refresh_dirty(), 1)
+        self.assertEquals(models.OrderedFact.objects.get()._is_dirty, False)
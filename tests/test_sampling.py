@@ -0,0 +1,60 @@
+from django.db.models import BigIntegerField, Value
+from opinionated_reporting import sampling
+from opinionated_reporting.filters import FactFilter
+from opinionated_reporting.sql import CompiledRefresh
+from .base import ReportingTestCase
+from . import models
+
+
+class TestSampling(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for total in range(1, 40):
+            models.TestOrderItem.objects.create(order=self.order, product=self.product, quantity=2, total=total)
+
+    def test_buckets_match_the_database(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        in_python = dict(models.OrderedProductFact.objects.values_list('_unique_identifier', '_sample_bucket'))
+        self.assertTrue(all(bucket is not None for bucket in in_python.values()))
+        self.assertEquals(in_python, {unique_id: sampling.sample_bucket(unique_id) for unique_id in in_python})
+        self.assertEquals(sampling.sample_bucket(3), sampling.sample_bucket(3 + sampling.MODULUS))
+
+        models.OrderedProductFact._base_manager.update(_sample_bucket=None)
+        models.OrderedProductFact.assign_sample_buckets()
+        self.assertEquals(dict(models.OrderedProductFact.objects.values_list('_unique_identifier', '_sample_bucket')), in_python)
+
+        for i in range(5):
+            models.TestOrder.objects.create(customer=self.customer, ordered_on=self.order.ordered_on)
+        self.assertTrue(CompiledRefresh(models.OrderedFact).is_compilable)
+        models.OrderedFact.rebuild()
+        compiled = dict(models.OrderedFact.objects.values_list('_unique_identifier', '_sample_bucket'))
+        self.assertEquals(len(compiled), 6)
+        self.assertEquals(compiled, {unique_id: sampling.sample_bucket(unique_id) for unique_id in compiled})
+
+    def test_large_identifiers(self):
+        # near 2^32 the full product would pass 2^63, SQLite falls back to floats and PostgreSQL raises
+        unique_ids = list(range(sampling.MODULUS - 150, sampling.MODULUS + 150)) + [2 ** 62 + 12345, 2 ** 63 - 1, -1, -2 ** 40]
+        orders = models.TestOrder.objects.filter(pk=self.order.pk)
+        buckets = orders.annotate(**{'bucket_{}'.format(i): sampling.bucket_expression(Value(unique_id, output_field=BigIntegerField()))
+                                     for i, unique_id in enumerate(unique_ids)}).values()[0]
+        self.assertEquals([buckets['bucket_{}'.format(i)] for i in range(len(unique_ids))],
+                          [sampling.sample_bucket(unique_id) for unique_id in unique_ids])
+
+    def test_estimate(self):
+        models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        everything = models.OrderedProductFact.estimate(sample=1, measures=('total', 'quantity'))
+        self.assertEquals(everything['count'].value, models.OrderedProductFact.objects.count())
+        self.assertEquals(everything['count'].error, 0)
+        self.assertEquals(everything['quantity'].value, sum(models.OrderedProductFact.objects.values_list('quantity', flat=True)))
+
+        half = FactFilter(models.OrderedProductFact).estimate(sample=0.5)
+        in_sample = models.OrderedProductFact.objects.filter(_sample_bucket__lt=sampling.BUCKETS // 2)
+        self.assertEquals(half['count'].sample_size, in_sample.count())
+        self.assertEquals(half['count'].value, in_sample.count() * 2)
+        self.assertEquals(half['quantity'].value, sum(in_sample.values_list('quantity', flat=True)) * 2)
+        self.assertLess(half['total'].low, half['total'].value)
+        self.assertEquals(FactFilter(models.OrderedProductFact).estimate(sample=0.5)['total'].value, half['total'].value)
+
+        with self.assertRaises(Exception):
+            models.OrderedProductFact.estimate(sample=0)
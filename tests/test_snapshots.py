@@ -0,0 +1,40 @@
+import datetime
+from decimal import Decimal
+from django.utils import timezone
+from opinionated_reporting.profiling import assert_max_queries
+from . import models
+from .base import ReportingTestCase, PRICE
+
+
+class TestSnapshotFacts(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        models.ProductDimension.record_update(self.product, force=True)
+        self.other = models.TestProduct.objects.create(name='Gadget', price=1)  # no dimension yet
+
+    def tearDown(self):
+        models.ProductPriceSnapshotFact.objects.all().delete()
+        super().tearDown()
+
+    def test_take_snapshot(self):
+        with assert_max_queries(5):  # the date, a savepoint around the day's delete and one insert
+            self.assertEquals(models.ProductPriceSnapshotFact.take_snapshot(), 2)
+        today = timezone.localdate()
+        snapshot = models.ProductPriceSnapshotFact.objects.get(_unique_identifier=self.product.id)
+        self.assertEquals(snapshot.snapshot_on.date, today)
+        self.assertEquals(snapshot.price, Decimal(PRICE))
+        self.assertEquals(snapshot.product.name, self.product.name)
+        # without a dimension row it points at the empty one
+        other = models.ProductPriceSnapshotFact.objects.get(_unique_identifier=self.other.id)
+        self.assertEquals(other.product._unique_identifier, 0)
+
+    def test_retake_and_history(self):
+        yesterday = timezone.localdate() - datetime.timedelta(days=1)
+        models.ProductPriceSnapshotFact.take_snapshot(date=yesterday)
+        self.product.price = PRICE * 2
+        self.product.save()
+        models.ProductPriceSnapshotFact.take_snapshot()
+        models.ProductPriceSnapshotFact.take_snapshot()
+        prices = models.ProductPriceSnapshotFact.objects.filter(_unique_identifier=self.product.id).order_by('snapshot_on__date')
+        self.assertEquals([snapshot.price for snapshot in prices], [Decimal(PRICE), Decimal(PRICE * 2)])
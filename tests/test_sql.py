@@ -0,0 +1,111 @@
+import datetime
+from unittest import mock
+from django.utils import timezone
+from opinionated_reporting import sql
+from opinionated_reporting.models import local_tz
+from opinionated_reporting.profiling import assert_max_queries
+from . import models
+from .base import ReportingTestCase, QTY
+
+
+class TestCompiledRefresh(ReportingTestCase):
+
+    def test_blockers(self):
+        self.assertEquals(models.OrderedFact.get_compile_blockers(), [])
+        blockers = set(blocker.field_name for blocker in models.OrderedProductFact.get_compile_blockers())
+        self.assertEquals(blockers, {'delete_when', 'order_id', 'created_on', 'ordered_on', 'hour_created_on', 'hour_ordered_on', 'customer'})
+
+    def test_rebuild_matches_python(self):
+        models.OrderedFact.record_update(self.order)
+        expected = models.OrderedFact.objects.values_list(
+            '_unique_identifier', 'total', 'customer__name', 'created_on__date', 'hour_created_on__time', 'ordered_on__date', 'hour_ordered_on__time')
+        expected = list(expected)
+        models.OrderedFact.objects.all().delete()
+        models.CustomerDimension.objects.exclude(_unique_identifier=0).delete()
+        with assert_max_queries(10):
+            self.assertEquals(models.OrderedFact.rebuild(), 1)
+        rebuilt = models.OrderedFact.objects.values_list(
+            '_unique_identifier', 'total', 'customer__name', 'created_on__date', 'hour_created_on__time', 'ordered_on__date', 'hour_ordered_on__time')
+        self.assertEquals(list(rebuilt), expected)
+        fact = models.OrderedFact.objects.get()
+        self.assertEquals(fact._is_dirty, False)
+        self.assertEquals(fact.customer.email, self.customer.email)
+
+    def test_rebuild_ignores_active_timezone(self):
+        # late in the evening in settings.TIME_ZONE is already tomorrow in Tokyo
+        evening = local_tz.localize(datetime.datetime.combine(timezone.localdate(), datetime.time(hour=20)))
+        models.TestOrder.objects.filter(pk=self.order.pk).update(ordered_on=evening)
+        self.order.refresh_from_db()
+        models.OrderedFact.record_update(self.order)
+        columns = ('ordered_on__date', 'hour_ordered_on__time', 'created_on__date', 'hour_created_on__time')
+        expected = list(models.OrderedFact.objects.values_list(*columns))
+        timezone.activate('Asia/Tokyo')
+        try:
+            models.OrderedFact.rebuild()
+        finally:
+            timezone.deactivate()
+        self.assertEquals(list(models.OrderedFact.objects.values_list(*columns)), expected)
+        self.assertEquals(expected[0][:2], (evening.date(), datetime.time(hour=20)))
+
+    def test_rebuild_respects_frozen_and_delete(self):
+        other = models.TestOrder.objects.create(customer=self.customer, total=1, ordered_on=timezone.now(), cancelled=True)
+        models.OrderedFact.record_update(self.order)
+        models.OrderedFact.freeze(self.order)
+        self.order.total += 1
+        self.order.save()
+        models.OrderedFact.rebuild()
+        self.assertEquals(models.OrderedFact.objects.count(), 1)  # the cancelled order isn't reported
+        self.assertNotEquals(models.OrderedFact.objects.get().total, self.order.total)  # frozen
+        other.delete()
+
+    def test_rebuild_paths_agree(self):
+        cancelled = models.TestOrder.objects.create(customer=self.customer, total=1, ordered_on=timezone.now(), cancelled=True)
+        models.OrderedFact._base_manager.filter(_unique_identifier=cancelled.pk).delete()  # no fact yet
+        columns = ('_unique_identifier', 'total', 'customer__name', 'ordered_on__date')
+        models.OrderedFact.rebuild()
+        compiled = list(models.OrderedFact._base_manager.order_by('_unique_identifier').values_list(*columns))
+        models.OrderedFact._base_manager.all().delete()
+        models.OrderedFact.record_update_many(models.TestOrder.objects.all(), force=True)  # what the fallback runs
+        in_python = list(models.OrderedFact._base_manager.order_by('_unique_identifier').values_list(*columns))
+        self.assertEquals(compiled, in_python)
+        self.assertNotIn(cancelled.pk, [row[0] for row in compiled])
+        cancelled.delete()
+
+    def test_rebuild_keeps_pks(self):
+        fact = models.OrderedFact.record_update(self.order)
+        self.order.total += 1
+        self.order.save()
+        other = models.TestOrder.objects.create(customer=self.customer, total=1, ordered_on=timezone.now())
+        self.assertEquals(models.OrderedFact.rebuild(), 2)
+        self.assertEquals(models.OrderedFact.objects.get(pk=fact.pk).total, self.order.total)
+        self.assertEquals(models.OrderedFact.objects.filter(_unique_identifier=other.pk).count(), 1)
+        other.delete()
+
+    def test_rebuild_clears_dirty(self):
+        models.OrderedFact.record_update(self.order)
+        self.order.total += 1
+        self.order.save()  # marked dirty by the signal
+        models.OrderedFact._base_manager.update(_lease_token='a' * 32, _leased_until=timezone.now())
+        models.OrderedFact.rebuild()
+        fact = models.OrderedFact.objects.get()
+        self.assertEquals((fact._is_dirty, fact._dirty_since, fact._lease_token, fact._leased_until), (False, None, None, None))
+
+    @mock.patch.object(models.OrderedFact.ReportingMeta, 'soft_delete', True, create=True)
+    def test_rebuild_soft_deletes(self):
+        fact = models.OrderedFact.record_update(self.order)
+        self.order.cancelled = True
+        self.order.save()
+        models.OrderedFact.rebuild()
+        self.assertEquals(models.OrderedFact.objects.count(), 0)
+        self.assertEquals(list(models.OrderedFact._base_manager.values_list('pk', '_is_deleted')), [(fact.pk, True)])
+
+        self.order.cancelled = False
+        self.order.save()
+        models.OrderedFact.rebuild()
+        self.assertEquals(list(models.OrderedFact.objects.values_list('pk', 'total')), [(fact.pk, self.order.total)])
+
+    def test_python_fallback(self):
+        self.assertEquals(models.OrderedProductFact.rebuild(), 1)
+        self.assertEquals(models.OrderedProductFact.objects.get().quantity, QTY)
+        with self.assertRaises(Exception):
+            sql.CompiledRefresh(models.OrderedProductFact).execute()
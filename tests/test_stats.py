@@ -0,0 +1,98 @@
+import json
+import time
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from opinionated_reporting import stats
+from . import models
+from .base import ReportingTestCase
+
+
+class TestStats(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stats.reset()
+        self.events = []
+        stats.add_hook(self.hook)
+
+    def tearDown(self):
+        stats.remove_hook(self.hook)
+        super().tearDown()
+
+    def hook(self, event, model, **values):
+        self.events.append((event, model, values))
+
+    def test_counters(self):
+        models.OrderedProductFact.record_update(self.order_item)
+        models.OrderedProductFact.record_update(self.order_item)
+        fact_stats = stats.get_stats(models.OrderedProductFact)
+        self.assertEquals(fact_stats.counters[stats.EVENT_REFRESH], 1)
+        self.assertEquals(fact_stats.counters[stats.EVENT_SKIP], 1)
+        self.assertEquals(fact_stats.rows_written, 1)
+        self.assertGreater(fact_stats.queries, 0)
+        self.assertEquals(fact_stats.latency.count, 1)
+        # the customer and product dimensions didn't exist yet
+        self.assertEquals(stats.get_stats(models.CustomerDimension).counters[stats.EVENT_DIMENSION_CREATED], 1)
+        self.assertIn((stats.EVENT_SKIP, models.OrderedProductFact, {}), self.events)
+
+    def test_failing_hook(self):
+        def broken(event, model, **values):
+            raise ValueError('metrics pipeline is down')
+        stats.add_hook(broken)
+        try:
+            with self.assertLogs('opinionated_reporting.stats', level='ERROR'):
+                models.OrderedProductFact.record_update(self.order_item)
+        finally:
+            stats.remove_hook(broken)
+        self.assertFalse(models.OrderedProductFact.get_reporting_fact(self.order_item)._is_dirty)
+        self.assertIn(stats.EVENT_REFRESH, [event for event, model, values in self.events])
+
+    def test_queries_not_counted_without_hooks(self):
+        stats.remove_hook(self.hook)
+        models.OrderedProductFact.record_update(self.order_item)
+        fact_stats = stats.get_stats(models.OrderedProductFact)
+        self.assertEquals(fact_stats.counters[stats.EVENT_REFRESH], 1)
+        self.assertEquals(fact_stats.queries, 0)
+        with self.settings(OPINIONATED_REPORTING_STATS_QUERIES=True):
+            models.OrderedProductFact.record_update(self.order_item, force=True)
+        self.assertGreater(fact_stats.queries, 0)
+
+    def test_batch_includes_the_write(self):
+        models.TestOrderItem.objects.create(order=self.order, product=self.product, quantity=1, total=1)
+        write_many = models.OrderedProductFact._write_many
+
+        def slow_write(*args, **kwargs):
+            time.sleep(0.05)
+            return write_many(*args, **kwargs)
+        with mock.patch.object(models.OrderedProductFact, '_write_many', side_effect=slow_write):
+            models.OrderedProductFact.record_update_many(models.TestOrderItem.objects.all(), force=True)
+        fact_stats = stats.get_stats(models.OrderedProductFact)
+        self.assertEquals((fact_stats.counters[stats.EVENT_REFRESH], fact_stats.rows_written), (2, 2))
+        self.assertGreaterEqual(fact_stats.latency.total, 0.05)
+        self.assertEquals([event for event, model, values in self.events if model is models.OrderedProductFact],
+                          [stats.EVENT_REFRESH, stats.EVENT_REFRESH])
+
+    def test_delete_and_frozen(self):
+        models.OrderedFact.record_update(self.order)
+        self.order.cancelled = True
+        self.order.save()
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(stats.get_stats(models.OrderedFact).counters[stats.EVENT_DELETE], 1)
+        models.OrderedFact.freeze(self.order)
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(stats.get_stats(models.OrderedFact).counters[stats.EVENT_FROZEN_SKIP], 1)
+
+    def test_backlog(self):
+        models.OrderedFact.record_update(self.order)
+        self.assertEquals(models.OrderedFact.backlog()['dirty'], 0)
+        self.order.save()
+        backlog = models.OrderedFact.backlog()
+        self.assertEquals(backlog['dirty'], 1)
+        self.assertIsNotNone(backlog['oldest'])
+        out = StringIO()
+        call_command('reporting_stats', stdout=out)
+        self.assertIn('tests.OrderedFact', out.getvalue())
+        out = StringIO()
+        call_command('reporting_stats', json=True, stdout=out)
+        self.assertEquals(list(json.loads(out.getvalue())), ['backlog'])
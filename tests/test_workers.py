@@ -0,0 +1,60 @@
+import datetime
+import io
+from unittest import mock
+from django.core.management import call_command
+from django.utils import timezone
+from .base import ReportingTestCase
+from . import models
+
+
+class TestDirtyQueue(ReportingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.order] + [models.TestOrder.objects.create(customer=self.customer, total=i, ordered_on=timezone.now()) for i in range(4)]
+
+    def tearDown(self):
+        for order in self.orders[1:]:
+            order.delete()
+        super().tearDown()
+
+    def test_claims_do_not_overlap(self):
+        first_token, first = models.OrderedFact.claim_dirty(batch_size=3)
+        second_token, second = models.OrderedFact.claim_dirty(batch_size=3)
+        self.assertEquals(len(first), 3)
+        self.assertEquals(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertEquals(models.OrderedFact.claim_dirty()[1], [])
+
+        models.OrderedFact.release_claim(first_token)
+        self.assertEquals(sorted(models.OrderedFact.claim_dirty()[1]), sorted(first))
+
+    def test_expired_lease_is_taken_over(self):
+        token, claimed = models.OrderedFact.claim_dirty()
+        models.OrderedFact.objects.filter(_lease_token=token).update(_leased_until=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEquals(sorted(models.OrderedFact.claim_dirty()[1]), sorted(claimed))
+
+    def test_refresh_claimed(self):
+        self.assertEquals(models.OrderedFact.refresh_claimed(batch_size=2), 2)
+        self.assertEquals(models.OrderedFact.objects.filter(_is_dirty=True).count(), 3)
+        self.assertFalse(models.OrderedFact.objects.filter(_lease_token__isnull=False).exists())
+        call_command('reporting_worker', once=True, stdout=io.StringIO())
+        self.assertFalse(models.OrderedFact.objects.filter(_is_dirty=True).exists())
+        self.assertEquals(models.OrderedFact.get_reporting_fact(self.orders[2]).total, self.orders[2].total)
+
+    def test_marked_during_refresh(self):
+        prepare_batch = models.OrderedFact._prepare_batch
+
+        def change_order(instances):
+            # the order was read already, so this change is not in the refresh
+            self.order.total += 1
+            self.order.save()
+            return prepare_batch(instances)
+        with mock.patch.object(models.OrderedFact, '_prepare_batch', side_effect=change_order):
+            self.assertEquals(models.OrderedFact.refresh_claimed(), 5)
+        self.assertEquals(list(models.OrderedFact.objects.filter(_is_dirty=True).values_list('_unique_identifier', flat=True)), [self.order.pk])
+        self.assertNotEquals(models.OrderedFact.get_reporting_fact(self.order).total, self.order.total)
+        self.assertEquals(models.OrderedFact.refresh_claimed(), 1)
+        fact = models.OrderedFact.get_reporting_fact(self.order)
+        self.assertFalse(fact._is_dirty)
+        self.assertEquals(fact.total, self.order.total)